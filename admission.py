@@ -0,0 +1,114 @@
+"""
+Admission control and graceful degradation for /predict
+
+The controller tracks how many predict requests are in flight and their
+recent latency. Pressure is the larger of in-flight / max_in_flight and
+recent latency / target_latency. As pressure rises past each threshold,
+new requests are served at the next degradation level, each including the
+ones before it, and above 1.0 they are shed:
+
+    0 normal
+    1 reduced_resolution  inference at a smaller input size
+    2 skip_annotation     no boxes drawn; the plain image is returned
+    3 skip_extra_passes   no optional passes (shadow evaluation)
+    4 shed                rejected with 503 and Retry-After
+
+A request arriving at an otherwise idle server is never shed, however
+slow the model is. Only /predict goes through the controller; capping
+in-flight predictions below the server's thread count keeps threads free
+for the dashboard and alert APIs.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+LEVELS = ('normal', 'reduced_resolution', 'skip_annotation', 'skip_extra_passes', 'shed')
+NORMAL, REDUCED_RESOLUTION, SKIP_ANNOTATION, SKIP_EXTRA_PASSES, SHED = range(len(LEVELS))
+
+# Pressure at which reduced_resolution, skip_annotation and skip_extra_passes start
+DEFAULT_THRESHOLDS = (0.5, 0.75, 0.9)
+
+
+class Ticket:
+    """Admission decision for one request"""
+
+    def __init__(self, level, retry_after=None):
+        self.level = level
+        self.retry_after = retry_after
+
+    @property
+    def name(self):
+        return LEVELS[self.level]
+
+    @property
+    def shed(self):
+        return self.level >= SHED
+
+
+class AdmissionController:
+    """Picks a degradation level per request from queue depth and latency"""
+
+    def __init__(self, max_in_flight=8, target_latency=1.0, window=10.0, thresholds=DEFAULT_THRESHOLDS):
+        self.max_in_flight = max_in_flight
+        self.target_latency = target_latency
+        self.window = window
+        self.thresholds = thresholds
+        self.in_flight = 0
+        self._latencies = deque()  # (finished_at, seconds) within the window
+        self._lock = threading.Lock()
+
+    def configure(self, max_in_flight, target_latency):
+        self.max_in_flight = max(1, max_in_flight)
+        self.target_latency = target_latency
+
+    def _recent_latency(self, now):
+        while self._latencies and now - self._latencies[0][0] > self.window:
+            self._latencies.popleft()
+        if not self._latencies:
+            return 0.0
+        return sum(seconds for _, seconds in self._latencies) / len(self._latencies)
+
+    def _pressure(self, now):
+        depth = self.in_flight / self.max_in_flight
+        latency = self._recent_latency(now) / self.target_latency if self.target_latency > 0 else 0.0
+        return max(depth, latency)
+
+    def _level(self, pressure):
+        if pressure > 1.0 and self.in_flight > 1:
+            return SHED
+        return sum(1 for threshold in self.thresholds if pressure >= threshold)
+
+    @contextmanager
+    def admit(self):
+        """Yield a Ticket; admitted requests count as in flight until the block ends"""
+        with self._lock:
+            now = time.monotonic()
+            # Count this request too, so a full house sheds instead of queueing
+            self.in_flight += 1
+            level = self._level(self._pressure(now))
+            if level >= SHED:
+                self.in_flight -= 1
+                retry_after = max(1, math.ceil(self._recent_latency(now) or self.target_latency))
+        metrics.DEGRADATION_LEVEL.set(level)
+        metrics.ADMISSIONS_TOTAL.inc(level=LEVELS[level])
+
+        if level >= SHED:
+            yield Ticket(level, retry_after)
+            return
+
+        start = time.monotonic()
+        try:
+            yield Ticket(level)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self.in_flight -= 1
+                self._latencies.append((finished, finished - start))
+
+
+CONTROLLER = AdmissionController()
@@ -0,0 +1,31 @@
+"""
+On-demand rendering of annotated detection images
+
+/predict stores the original upload and the detection boxes; the
+annotated image is drawn only when someone looks at it (serve_image).
+This needs OpenCV and NumPy but not torch, so web-only processes can
+render without loading the model stack.
+"""
+
+import cv2
+import numpy as np
+
+
+def draw_detections(image, detections):
+    """Draw detection dicts onto a BGR image in place, like the postprocessors do"""
+    for detection in detections:
+        x1, y1, x2, y2 = detection['bbox']
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f"{detection['class']}: {detection['confidence']:.2f}"
+        cv2.putText(image, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return image
+
+
+def render_annotated(image_bytes, detections):
+    """Decode a stored original image, draw its detections and return JPEG bytes"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Stored image could not be decoded")
+    draw_detections(image, detections)
+    _, buffer = cv2.imencode('.jpg', image)
+    return buffer.tobytes()
@@ -1,31 +1,106 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash, send_file
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash, send_file, g, Response, make_response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import torch
-import cv2
-import numpy as np
-from PIL import Image
-import io
+from datetime import datetime, timedelta, timezone
 import base64
+import hashlib
+import io
 import os
+import sys
 import json
+import secrets
 import uuid
+import threading
+import time
 from werkzeug.utils import secure_filename
+import admission
+import job_queue
+import metrics
+import motion
+import notify
+import profiling
+import render_cache
+import scheduler
+import export
+import shadow
+import wire
 
-# Create uploads directory if it doesn't exist
-UPLOAD_FOLDER = 'static/uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Uploads directory, created by create_app()
+UPLOAD_FOLDER = os.environ.get('WARS_UPLOAD_FOLDER', 'static/uploads')
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///weapon_detection.db'
+app.config['SECRET_KEY'] = os.environ.get('WARS_SECRET_KEY', 'your-secret-key-change-this-in-production')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('WARS_DATABASE_URI', 'sqlite:///weapon_detection.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Initialize database
-db = SQLAlchemy(app)
+# Opt-in profiling of /predict: fraction of requests to sample, and a latency
+# threshold in seconds above which a request's profile is always kept
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('WARS_PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_SLOW_THRESHOLD'] = float(os.environ.get('WARS_PROFILE_SLOW_THRESHOLD', 0))
+app.config['PROFILE_DIR'] = os.environ.get('WARS_PROFILE_DIR', 'profiles')
+
+# How often each server process checks which model version admins deployed
+app.config['MODEL_SYNC_INTERVAL'] = float(os.environ.get('WARS_MODEL_SYNC_INTERVAL', 5))
+# Fraction of /predict requests also run through the shadow candidate model, if one is set
+app.config['SHADOW_SAMPLE_RATE'] = float(os.environ.get('WARS_SHADOW_SAMPLE_RATE', 0.05))
+
+# Admission control for /predict (see admission.py): at most this many predictions in
+# flight per process, leaving a gunicorn thread free for dashboards and alert APIs
+app.config['ADMISSION_MAX_IN_FLIGHT'] = int(os.environ.get(
+    'WARS_ADMISSION_MAX_IN_FLIGHT', max(1, int(os.environ.get('WARS_THREADS', 4)) - 1)))
+# Recent /predict latency (seconds) at which requests are shed
+app.config['ADMISSION_TARGET_LATENCY'] = float(os.environ.get('WARS_ADMISSION_TARGET_LATENCY', 2.0))
+# Model input size used at the reduced_resolution degradation level
+app.config['DEGRADED_IMGSZ'] = int(os.environ.get('WARS_DEGRADED_IMGSZ', 416))
+
+# Inference scheduling (see scheduler.py): concurrent model runs per process, seconds
+# before a waiting lower-priority request is served anyway, and the admins' fair share
+app.config['INFERENCE_CONCURRENCY'] = int(os.environ.get('WARS_INFERENCE_CONCURRENCY', 1))
+app.config['SCHEDULER_MAX_WAIT'] = float(os.environ.get('WARS_SCHEDULER_MAX_WAIT', 5.0))
+app.config['SCHEDULER_ADMIN_WEIGHT'] = float(os.environ.get('WARS_SCHEDULER_ADMIN_WEIGHT', 4.0))
+
+# Motion gating of camera frames (see motion.py): fraction of changed pixels below which
+# a frame reuses the last analysed frame's detections (0 disables), and how often the
+# model runs regardless
+app.config['MOTION_THRESHOLD'] = float(os.environ.get('WARS_MOTION_THRESHOLD', 0.01))
+app.config['MOTION_FORCE_EVERY'] = int(os.environ.get('WARS_MOTION_FORCE_EVERY', 10))
+
+# Near-duplicate uploads: a frame whose perceptual hash is within this many bits (of 64)
+# of one of the user's stored frames gets that detection back; negative disables
+app.config['DEDUP_MAX_DISTANCE'] = int(os.environ.get('WARS_DEDUP_MAX_DISTANCE', 4))
+
+# Cascade detection: screen each frame cheaply (the model at CASCADE_SCREEN_IMGSZ, or the
+# loaded version named by CASCADE_SCREEN_MODEL) and run the full model only on frames
+# with a box at or above CASCADE_SCREEN_CONF
+app.config['CASCADE'] = os.environ.get('WARS_CASCADE', '0').lower() in ('1', 'true', 'yes')
+app.config['CASCADE_SCREEN_IMGSZ'] = int(os.environ.get('WARS_CASCADE_SCREEN_IMGSZ', 320))
+app.config['CASCADE_SCREEN_CONF'] = float(os.environ.get('WARS_CASCADE_SCREEN_CONF', 0.1))
+app.config['CASCADE_SCREEN_MODEL'] = os.environ.get('WARS_CASCADE_SCREEN_MODEL', '')
+
+# Inference job queue (see job_queue.py): seconds a claimed job stays leased without a
+# worker heartbeat, attempts before a job fails, and the base retry delay in seconds
+app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('WARS_JOB_LEASE_SECONDS', 30))
+app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('WARS_JOB_MAX_ATTEMPTS', 3))
+app.config['JOB_RETRY_BACKOFF'] = float(os.environ.get('WARS_JOB_RETRY_BACKOFF', 5.0))
+
+# Alert notifications (see notify.py): destination URLs separated by spaces, seconds
+# between messages to one destination (alerts in between become one digest), delivery
+# attempts per alert and the base retry delay in seconds
+app.config['NOTIFY_URLS'] = os.environ.get('WARS_NOTIFY_URLS', '')
+app.config['NOTIFY_INTERVAL'] = float(os.environ.get('WARS_NOTIFY_INTERVAL', 30))
+app.config['NOTIFY_MAX_ATTEMPTS'] = int(os.environ.get('WARS_NOTIFY_MAX_ATTEMPTS', 8))
+app.config['NOTIFY_RETRY_BACKOFF'] = float(os.environ.get('WARS_NOTIFY_RETRY_BACKOFF', 10.0))
+
+# Detections per page read by the streaming export; memory use is bounded by one page
+app.config['EXPORT_PAGE_SIZE'] = int(os.environ.get('WARS_EXPORT_PAGE_SIZE', 500))
+
+# Seconds a process trusts a checked API token before looking it up again; a revoked
+# token stops working in other processes within this time
+app.config['API_TOKEN_CACHE_SECONDS'] = float(os.environ.get('WARS_API_TOKEN_CACHE_SECONDS', 30))
+
+# Database, bound to the app in create_app()
+db = SQLAlchemy()
 
 # Add custom Jinja2 filter for JSON parsing
 @app.template_filter('from_json')
@@ -36,6 +111,21 @@ def from_json_filter(json_string):
     except (json.JSONDecodeError, TypeError):
         return []
 
+# Request metrics
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Picks up outbox rows left over from before a restart; a no-op once running
+    notify.DISPATCHER.ensure_started()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    metrics.REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -53,6 +143,12 @@ class Detection(db.Model):
     confidence_scores = db.Column(db.Text, nullable=False)  # JSON string
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     alert_sent = db.Column(db.Boolean, default=False)
+    source = db.Column(db.String(100), index=True)  # camera/stream name, None for plain uploads
+    model_version = db.Column(db.String(100), index=True)  # registry version that produced it
+    # True when image_path is the unannotated original; serve_image then draws the boxes
+    image_is_original = db.Column(db.Boolean, default=False)
+    # Perceptual hash of the frame (dedup.py), stored as a signed 64-bit integer
+    image_hash = db.Column(db.BigInteger)
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -61,68 +157,291 @@ class Alert(db.Model):
     message = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     acknowledged = db.Column(db.Boolean, default=False)
+    # Tracked alerts cover a whole track of frames from one source
+    source = db.Column(db.String(100))
+    track_id = db.Column(db.String(32), index=True)
+    frame_count = db.Column(db.Integer, default=1)
+    last_seen = db.Column(db.DateTime)
+
+class AlertAcknowledgement(db.Model):
+    """A (bulk) acknowledgement, kept for a while so the user's other open dashboards can apply it"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    scope = db.Column(db.Text, nullable=False)  # JSON: alert ids, or filter fields (see parse_alert_scope)
+    count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ModelDeployment(db.Model):
+    """Activation history of model versions; the newest row per role is current
+    
+    role 'active' serves traffic; role 'shadow' is the candidate evaluated on
+    sampled traffic, with an empty version meaning shadowing was stopped.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(100), nullable=False)
+    path = db.Column(db.String(300))
+    activated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    activated_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    role = db.Column(db.String(20), default='active', index=True)
+
+class ShadowComparison(db.Model):
+    """One sampled request run through both the active and the shadow model
+    
+    Counts and sums only, so agreement and latency aggregate in SQL.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    primary_version = db.Column(db.String(100), nullable=False)
+    candidate_version = db.Column(db.String(100), nullable=False, index=True)
+    primary_seconds = db.Column(db.Float, nullable=False)
+    candidate_seconds = db.Column(db.Float, nullable=False)
+    primary_boxes = db.Column(db.Integer, nullable=False)
+    candidate_boxes = db.Column(db.Integer, nullable=False)
+    matched_boxes = db.Column(db.Integer, nullable=False)
+    class_mismatches = db.Column(db.Integer, nullable=False)
+    iou_sum = db.Column(db.Float, nullable=False)
+    confidence_delta_sum = db.Column(db.Float, nullable=False)
+    confidence_abs_delta_sum = db.Column(db.Float, nullable=False)
+    agreed = db.Column(db.Boolean, nullable=False)
+
+class SourceRegion(db.Model):
+    """A region of interest of a camera source (see roi.py)
+    
+    polygon is a JSON list of [x, y] points relative to the frame size (0-1).
+    Detections from the owner's frames with that source are limited to the
+    union of its regions; other accounts' sources of the same name are not.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)  # owner of the source
+    source = db.Column(db.String(100), nullable=False, index=True)
+    name = db.Column(db.String(100))
+    polygon = db.Column(db.Text, nullable=False)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+class InferenceJob(db.Model):
+    """An uploaded image waiting for, or processed by, an inference worker (see job_queue.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    image_path = db.Column(db.String(200), nullable=False)
+    source = db.Column(db.String(100))
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)  # not retried before this
+    lease_owner = db.Column(db.String(100), index=True)
+    lease_token = db.Column(db.String(32), index=True)
+    lease_expires_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    detection_id = db.Column(db.Integer, db.ForeignKey('detection.id'))
+    error = db.Column(db.Text)
 
-# Load your YOLO model
-model_path = 'improved_weapon_detection_10_epochs.pt'
-model = None
+class InferenceWorker(db.Model):
+    """An inference worker process and its last heartbeat"""
+    name = db.Column(db.String(100), primary_key=True)
+    hostname = db.Column(db.String(100))
+    pid = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_heartbeat = db.Column(db.DateTime)
+    stopped_at = db.Column(db.DateTime)
+    jobs_done = db.Column(db.Integer, default=0)
+    jobs_failed = db.Column(db.Integer, default=0)
 
-def load_model():
-    global model
+JOBS = job_queue.JobQueue(db, InferenceJob, InferenceWorker)
+
+class Notification(db.Model):
+    """Outbox row: one alert waiting for, or delivered to, one notification destination"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)  # owner of the alert
+    destination = db.Column(db.String(200), nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON alert summary
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)  # not retried before this
+    lease_owner = db.Column(db.String(100))
+    lease_token = db.Column(db.String(32), index=True)
+    lease_expires_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, index=True)
+    error = db.Column(db.Text)
+
+class ApiToken(db.Model):
+    """Bearer token for machine clients of /api/detect; only its SHA-256 is stored"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    prefix = db.Column(db.String(16), nullable=False)  # shown in the token list
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime)
+    revoked_at = db.Column(db.DateTime)
+
+# Columns added after the first release; create_all() does not add columns
+# to existing tables, so upgrade_schema() adds any that are missing
+SCHEMA_UPGRADES = {
+    'detection': ('source', 'model_version', 'image_is_original', 'image_hash'),
+    'alert': ('source', 'track_id', 'frame_count', 'last_seen'),
+    'model_deployment': ('role',),
+    'source_region': ('user_id',),
+    'notification': ('user_id',),
+}
+
+def column_ddl(column, dialect):
+    """Type and scalar default of a model column, in the database's own DDL"""
+    ddl = column.type.compile(dialect=dialect)
+    if column.default is not None and column.default.is_scalar:
+        default = db.literal(column.default.arg, column.type).compile(
+            dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f' DEFAULT {default}'
+    return ddl
+
+def upgrade_schema():
+    """Add columns missing from tables created by older versions"""
+    inspector = db.inspect(db.engine)
+    for table, columns in SCHEMA_UPGRADES.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name in columns:
+            if name not in existing:
+                ddl = column_ddl(db.metadata.tables[table].c[name], db.engine.dialect)
+                db.session.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+                print(f"Added column {table}.{name}")
+    db.session.commit()
+
+def get_inference():
+    """Import the ML pipeline on first use"""
+    import inference
+    return inference
+
+def model_loaded():
+    """Whether a model is loaded, without importing the ML stack"""
+    inference = sys.modules.get('inference')
+    return inference is not None and inference.model is not None
+
+_model_sync_lock = threading.Lock()
+_model_synced_at = None
+
+def latest_deployment(role):
+    return ModelDeployment.query.filter_by(role=role).order_by(ModelDeployment.id.desc()).first()
+
+def sync_active_model(inference, force=False):
+    """Follow the latest ModelDeployments, loading checkpoints if needed
+    
+    Each server process checks at most every MODEL_SYNC_INTERVAL seconds,
+    so a switch made through one worker reaches the others. Only one
+    thread syncs at a time; the others keep serving the current model.
+    The shadow candidate is followed the same way.
+    """
+    global _model_synced_at
+    now = time.monotonic()
+    if not force and _model_synced_at is not None and \
+            now - _model_synced_at < app.config['MODEL_SYNC_INTERVAL']:
+        return
+    if not _model_sync_lock.acquire(blocking=force):
+        return
     try:
-        # Check if model file exists
-        if not os.path.exists(model_path):
-            print(f"Model file not found: {model_path}")
-            return False
-        
-        print(f"Loading model from: {model_path}")
-        
-        # Try different loading methods
-        try:
-            # Method 1: Direct torch.load for custom models
-            checkpoint = torch.load(model_path, map_location='cpu')
-            print("Model loaded using torch.load method")
-            
-            # If it's a state dict, we need to create the model architecture first
-            if isinstance(checkpoint, dict) and 'model' in checkpoint:
-                # This is a YOLOv5 checkpoint
-                model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=False)
-                model.load_state_dict(checkpoint['model'].state_dict())
-            else:
-                # Try to load as a complete model
-                model = checkpoint
-                
-        except Exception as e1:
-            print(f"Method 1 failed: {e1}")
-            try:
-                # Method 2: Using ultralytics YOLO
-                from ultralytics import YOLO
-                model = YOLO(model_path)
-                print("Model loaded using ultralytics YOLO method")
-            except Exception as e2:
-                print(f"Method 2 failed: {e2}")
-                try:
-                    # Method 3: Using torch.hub with custom path
-                    model = torch.hub.load('ultralytics/yolov5', 'custom', path=model_path, force_reload=True)
-                    print("Model loaded using torch.hub method")
-                except Exception as e3:
-                    print(f"Method 3 failed: {e3}")
-                    raise Exception(f"All loading methods failed. Last error: {e3}")
-        
-        # Set model to evaluation mode
-        if hasattr(model, 'eval'):
-            model.eval()
-        
-        print("Model loaded successfully!")
-        print(f"Model type: {type(model)}")
-        return True
+        _model_synced_at = now
+        candidate = latest_deployment('shadow')
+        if candidate is not None and candidate.version and inference.REGISTRY.get(candidate.version) is None:
+            print(f"Loading shadow model {candidate.version} from {candidate.path}")
+            inference.REGISTRY.load(candidate.version, candidate.path)
+        shadow.EVALUATOR.candidate = (candidate.version or None) if candidate is not None else None
         
+        deployment = latest_deployment('active')
+        active = inference.REGISTRY.active()
+        if deployment is None or (active is not None and active.version == deployment.version):
+            return
+        if inference.REGISTRY.get(deployment.version) is None:
+            print(f"Loading deployed model {deployment.version} from {deployment.path}")
+            inference.REGISTRY.load(deployment.version, deployment.path)
+        inference.REGISTRY.activate(deployment.version)
+        print(f"Switched to model {deployment.version}")
     except Exception as e:
-        print(f"Error loading model: {e}")
-        print("Please ensure:")
-        print("1. The model file exists and is valid")
-        print("2. You have the required dependencies installed")
-        print("3. The model is compatible with the current PyTorch version")
-        return False
+        print(f"Model sync failed, keeping the current model: {e}")
+    finally:
+        _model_sync_lock.release()
+
+_regions_lock = threading.Lock()
+_regions = {}
+_regions_loaded_at = None
+
+def source_regions(user_id, source):
+    """Region polygons of a user's source, or None for the whole frame
+    
+    Keyed by (user id, source) like the motion gate and tracks: another
+    account's camera with the same name is a different camera. All regions
+    are cached and reloaded at most every MODEL_SYNC_INTERVAL seconds, so
+    edits made through one worker reach the others.
+    """
+    global _regions, _regions_loaded_at
+    if source is None:
+        return None
+    now = time.monotonic()
+    with _regions_lock:
+        if _regions_loaded_at is None or now - _regions_loaded_at >= app.config['MODEL_SYNC_INTERVAL']:
+            regions = {}
+            for region in SourceRegion.query.filter(SourceRegion.user_id.isnot(None)).order_by(SourceRegion.id):
+                regions.setdefault((region.user_id, region.source), []).append(json.loads(region.polygon))
+            _regions, _regions_loaded_at = regions, now
+        return _regions.get((user_id, source))
+
+def region_plan(frames, keys):
+    """RegionPlan cropping each frame to the regions of its (user id, source) key"""
+    import roi
+    return roi.RegionPlan(frames, [source_regions(*key) for key in keys])
+
+def run_plan(inference, active, plan, imgsz=None):
+    """Run a RegionPlan's inputs through run_detector()"""
+    if plan.cropped:
+        # Crops run at their own size (rounded up to the model stride) instead of being scaled up
+        imgsz = min(imgsz or inference.native_imgsz(active.model), -(-plan.max_side // 32) * 32)
+    return run_detector(inference, active, plan.inputs, imgsz=imgsz)
+
+def plan_detections(inference, active, plan, results):
+    """Per-frame detections of a RegionPlan in full-frame coordinates"""
+    return plan.detections(results, lambda result, array: inference.postprocess(
+        result, array, model=active.model, annotate=False)[1])
+
+def detect_frames(inference, active, frames, keys):
+    """Detections for a batch of frames, each limited to its (user id, source) regions"""
+    plan = region_plan(frames, keys)
+    return plan_detections(inference, active, plan, run_plan(inference, active, plan))
+
+def record_shadow_comparison(**comparison):
+    """Store a shadow comparison; called from the evaluator thread"""
+    with app.app_context():
+        try:
+            db.session.add(ShadowComparison(**comparison))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+def active_model(inference):
+    """The ModelVersion a new request should use, or None if no model can be loaded"""
+    sync_active_model(inference)
+    if inference.model is None:
+        inference.load_model()
+    return inference.REGISTRY.active()
+
+def delete_detections(user_id=None):
+    """Delete a user's detections (everyone's without user_id) and the rows that refer to them
+    
+    Referring rows go first, so the deletes also work where foreign keys are
+    enforced. Jobs keep their history without the detection; the caller commits.
+    """
+    detections = Detection.query if user_id is None else Detection.query.filter_by(user_id=user_id)
+    acknowledgements = AlertAcknowledgement.query if user_id is None else \
+        AlertAcknowledgement.query.filter_by(user_id=user_id)
+    notifications = Notification.query if user_id is None else Notification.query.filter_by(user_id=user_id)
+    owned = detections.with_entities(Detection.id)
+    InferenceJob.query.filter(InferenceJob.detection_id.in_(owned)).update(
+        {'detection_id': None}, synchronize_session=False)
+    acknowledgements.delete(synchronize_session=False)
+    notifications.delete(synchronize_session=False)
+    Alert.query.filter(Alert.detection_id.in_(owned)).delete(synchronize_session=False)
+    detections.delete(synchronize_session=False)
 
 def reset_all_statistics():
     """Reset all statistics when app starts"""
@@ -139,8 +458,7 @@ def reset_all_statistics():
                     pass  # File might already be deleted
         
         # Clear all data
-        Detection.query.delete()
-        Alert.query.delete()
+        delete_detections()
         
         db.session.commit()
         print("All statistics reset successfully")
@@ -148,86 +466,223 @@ def reset_all_statistics():
         db.session.rollback()
         print(f"Error resetting statistics: {e}")
 
-def preprocess_image(image):
-    """Convert PIL image to format suitable for YOLO"""
-    # Convert PIL to OpenCV format
-    img_array = np.array(image)
-    if len(img_array.shape) == 3:
-        img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-    return img_array
-
-def postprocess_results(results, original_image):
-    """Process YOLO results and create annotated image"""
-    # Get the first result (assuming single image)
-    result = results[0]
-    
-    # Create a copy of the original image for annotation
-    annotated_img = original_image.copy()
-    
-    # Get detection results
-    detections = []
-    if len(result.boxes) > 0:
-        for i, box in enumerate(result.boxes):
-            # Extract box coordinates
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            confidence = box.conf[0].cpu().numpy()
-            class_id = int(box.cls[0].cpu().numpy())
-            
-            # Get class name (you may need to adjust this based on your model's classes)
-            class_name = result.names[class_id] if hasattr(result, 'names') else f"Class_{class_id}"
-            
-            # Draw bounding box
-            cv2.rectangle(annotated_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-            
-            # Draw label
-            label = f"{class_name}: {confidence:.2f}"
-            cv2.putText(annotated_img, label, (int(x1), int(y1) - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            detections.append({
-                'class': class_name,
-                'confidence': float(confidence),
-                'bbox': [int(x1), int(y1), int(x2), int(y2)]
-            })
+def dedup_column(image_hash):
+    """Hash value for Detection.image_hash, which is signed"""
+    if image_hash is None:
+        return None
+    import dedup
+    return dedup.to_signed(image_hash)
+
+def sync_duplicate_index(index, batch_size=10000):
+    """Load hashed detections the index has not seen yet, in id order"""
+    while True:
+        rows = db.session.query(Detection.id, Detection.user_id, Detection.image_hash) \
+            .filter(Detection.id > index.last_id, Detection.image_hash.isnot(None)) \
+            .order_by(Detection.id).limit(batch_size).all()
+        index.sync(rows)
+        if len(rows) < batch_size:
+            return
+
+def find_duplicate(user_id, image_hash, model_version):
+    """The user's closest detection by model_version within DEDUP_MAX_DISTANCE bits, or None
+    
+    Results of other model versions are not reused, so a model switch takes
+    effect for frames uploaded before it.
+    """
+    import dedup
+    sync_duplicate_index(dedup.INDEX)
+    for detection_id, _, _ in dedup.INDEX.search(image_hash, app.config['DEDUP_MAX_DISTANCE'], user_id=user_id):
+        detection = Detection.query.get(detection_id)
+        if detection is None:
+            dedup.INDEX.discard([detection_id])  # deleted since it was indexed
+        elif detection.model_version == model_version:
+            metrics.DEDUP_LOOKUPS.inc(result='duplicate')
+            return detection
+    metrics.DEDUP_LOOKUPS.inc(result='unique')
+    return None
+
+def run_detector(inference, active, img_arrays, imgsz=None):
+    """Run a batch through the active model version, or through the cascade when enabled
     
-    return annotated_img, detections
+    Returns one result per image for inference.postprocess(); with the
+    cascade, images the screen cleared get None (no detections).
+    """
+    if not app.config['CASCADE']:
+        return inference.run_model_batch(img_arrays, model=active.model, imgsz=imgsz)
+    screen = inference.REGISTRY.get(app.config['CASCADE_SCREEN_MODEL']) if app.config['CASCADE_SCREEN_MODEL'] else None
+    return inference.run_cascade_batch(img_arrays, model=active.model,
+                                       screen_model=screen.model if screen is not None else None,
+                                       screen_imgsz=app.config['CASCADE_SCREEN_IMGSZ'],
+                                       screen_conf=app.config['CASCADE_SCREEN_CONF'],
+                                       imgsz=imgsz)
 
-def postprocess_ultralytics_results(results, original_image):
-    """Process ultralytics YOLO results and create annotated image"""
-    # Get the first result
-    result = results[0]
+def record_detection(user_id, image_filename, detections, source=None, model_version=None,
+                     image_is_original=False, image_hash=None):
+    """Add a Detection and its alerts to the session; the caller commits
     
-    # Create a copy of the original image for annotation
-    annotated_img = original_image.copy()
+    With a source (camera, stream), detections are linked to tracks across
+    frames and each track keeps a single alert that is updated in place.
+    Returns the detection and the newly raised alert summaries.
+    """
+    detection = Detection(
+        user_id=user_id,
+        image_path=image_filename,
+        detections=json.dumps(detections),
+        confidence_scores=json.dumps([d['confidence'] for d in detections]),
+        source=source,
+        model_version=model_version,
+        image_is_original=image_is_original,
+        image_hash=dedup_column(image_hash)
+    )
+    db.session.add(detection)
+    db.session.flush()  # assigns detection.id without a separate commit
     
-    # Get detection results
-    detections = []
-    if result.boxes is not None and len(result.boxes) > 0:
-        boxes = result.boxes.xyxy.cpu().numpy()  # Get boxes
-        confidences = result.boxes.conf.cpu().numpy()  # Get confidences
-        class_ids = result.boxes.cls.cpu().numpy().astype(int)  # Get class IDs
+    if source is not None:
+        alerts_created = record_tracked_alerts(detection, detections, source)
+        notify.DISPATCHER.enqueue(alerts_created, detection)
+        return detection, alerts_created
+    
+    # Check for weapons and create alerts
+    alerts_created = []
+    if detections:
+        # Create weapon detection alert
+        alert = Alert(
+            detection_id=detection.id,
+            alert_type='weapon_detected',
+            message=f'Weapon detected with {len(detections)} object(s) found'
+        )
+        db.session.add(alert)
+        metrics.ALERTS_TOTAL.inc(action='created')
+        alerts_created.append({
+            'type': 'weapon_detected',
+            'message': f'🚨 WEAPON DETECTED! {len(detections)} object(s) found',
+            'severity': 'high'
+        })
         
-        for i, (box, confidence, class_id) in enumerate(zip(boxes, confidences, class_ids)):
-            x1, y1, x2, y2 = box
-            
-            # Get class name
-            class_name = result.names[class_id] if hasattr(result, 'names') else f"Class_{class_id}"
-            
-            # Draw bounding box
-            cv2.rectangle(annotated_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-            
-            # Draw label
-            label = f"{class_name}: {confidence:.2f}"
-            cv2.putText(annotated_img, label, (int(x1), int(y1) - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            detections.append({
-                'class': class_name,
-                'confidence': float(confidence),
-                'bbox': [int(x1), int(y1), int(x2), int(y2)]
+        # Check for high confidence detections
+        high_confidence = [d for d in detections if d['confidence'] > 0.8]
+        if high_confidence:
+            alert = Alert(
+                detection_id=detection.id,
+                alert_type='high_confidence',
+                message=f'High confidence weapon detection: {len(high_confidence)} object(s) with >80% confidence'
+            )
+            db.session.add(alert)
+            metrics.ALERTS_TOTAL.inc(action='created')
+            alerts_created.append({
+                'type': 'high_confidence',
+                'message': f'⚠️ HIGH CONFIDENCE: {len(high_confidence)} weapon(s) detected with >80% confidence',
+                'severity': 'critical'
             })
     
-    return annotated_img, detections
+    # Outbox rows commit with the alerts; delivery happens on the dispatcher thread
+    notify.DISPATCHER.enqueue(alerts_created, detection)
+    return detection, alerts_created
+
+def record_tracked_alerts(detection, detections, source):
+    """Raise one alert per track and update it as the track continues"""
+    import tracking
+    
+    now = datetime.utcnow()
+    alerts_created = []
+    # Per user, like the motion gate: another account's camera with the same name is a different camera
+    owned = db.select(Detection.id).where(Detection.user_id == detection.user_id)
+    for track, _, _ in tracking.TRACKERS.update((detection.user_id, source), detections):
+        message = (f'{track.class_name} tracked on {source} across {track.hits} frame(s), '
+                   f'max confidence {track.max_confidence:.0%}')
+        
+        # Update the track's alert in place; create it if it is new or was deleted
+        for attr, alert_type, raise_it in (('alert_id', 'weapon_detected', True),
+                                           ('high_confidence_alert_id', 'high_confidence',
+                                            track.max_confidence > 0.8)):
+            alert_id = getattr(track, attr)
+            if alert_id is not None:
+                updated = Alert.query.filter(Alert.id == alert_id, Alert.detection_id.in_(owned)).update({
+                    'detection_id': detection.id,
+                    'message': message,
+                    'frame_count': track.hits,
+                    'last_seen': now
+                }, synchronize_session=False)
+                if updated:
+                    metrics.ALERTS_TOTAL.inc(action='updated')
+                    continue
+            if not raise_it:
+                continue
+            
+            alert = Alert(
+                detection_id=detection.id,
+                alert_type=alert_type,
+                message=message,
+                source=source,
+                track_id=track.track_id,
+                frame_count=track.hits,
+                last_seen=now
+            )
+            db.session.add(alert)
+            db.session.flush()
+            setattr(track, attr, alert.id)
+            metrics.ALERTS_TOTAL.inc(action='created')
+            if alert_type == 'weapon_detected':
+                alerts_created.append({
+                    'type': 'weapon_detected',
+                    'message': f'🚨 WEAPON DETECTED on {source}! New {track.class_name} track',
+                    'severity': 'high'
+                })
+            else:
+                alerts_created.append({
+                    'type': 'high_confidence',
+                    'message': f'⚠️ HIGH CONFIDENCE: {track.class_name} on {source} at {track.max_confidence:.0%}',
+                    'severity': 'critical'
+                })
+    
+    return alerts_created
+
+# Upload formats stored as-is; anything else is stored under a neutral extension
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+
+def save_detection_image(image_bytes, extension='.jpg'):
+    """Write an encoded image to the uploads folder and return its filename"""
+    if extension not in IMAGE_EXTENSIONS:
+        extension = '.img'
+    unique_filename = f"detection_{uuid.uuid4().hex}{extension}"
+    with open(os.path.join(UPLOAD_FOLDER, unique_filename), 'wb') as f:
+        f.write(image_bytes)
+    return unique_filename
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+_token_lock = threading.Lock()
+_tokens = {}  # token hash -> (user_id, is_admin, checked_at)
+
+def api_token_user():
+    """(user_id, is_admin) for the request's bearer token, or None
+    
+    Checked tokens are cached for API_TOKEN_CACHE_SECONDS, so a camera
+    gateway sending many frames costs one database lookup per interval,
+    which also records when the token was last used.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    digest = hash_token(token.strip())
+    now = time.monotonic()
+    with _token_lock:
+        cached = _tokens.get(digest)
+    if cached is not None and now - cached[2] < app.config['API_TOKEN_CACHE_SECONDS']:
+        return cached[:2]
+    
+    row = ApiToken.query.filter_by(token_hash=digest, revoked_at=None).first()
+    user = User.query.get(row.user_id) if row is not None else None
+    if user is None:
+        with _token_lock:
+            _tokens.pop(digest, None)
+        return None
+    row.last_used_at = datetime.utcnow()
+    db.session.commit()
+    with _token_lock:
+        _tokens[digest] = (user.id, bool(user.is_admin), now)
+    return user.id, bool(user.is_admin)
 
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -309,14 +764,111 @@ def dashboard():
                          recent_detections=recent_detections,
                          total_detections=total_detections,
                          weapon_detections=weapon_detections,
-                         recent_alerts=recent_alerts)
+                         recent_alerts=recent_alerts,
+                         ack_cursor=acknowledgement_cursor(session['user_id']))
 
 @app.route('/predict', methods=['POST'])
+@profiling.profile_request('predict')
 def predict():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    # Degrade or shed before the upload is even read
+    with admission.CONTROLLER.admit() as ticket:
+        if ticket.shed:
+            response = make_response(jsonify({'error': 'Server overloaded, please retry later',
+                                              'degradation': degradation_info(ticket)}), 503)
+            response.headers['Retry-After'] = str(ticket.retry_after)
+        else:
+            response = make_response(run_predict(ticket))
+    response.headers['X-Degradation-Level'] = str(ticket.level)
+    return response
+
+def degradation_info(ticket):
+    return {'level': ticket.level, 'mode': ticket.name}
+
+def request_priority():
+    """Scheduling class of a /predict request: camera frames are live, and
+    callers can mark bulk uploads as batch with priority=batch"""
+    if request.form.get('priority') in ('batch', 'backfill'):
+        return scheduler.BATCH
+    if request.form.get('source'):
+        return scheduler.LIVE
+    return scheduler.INTERACTIVE
+
+def analyse_frame(ticket, inference, active, user_id, img_array, source, priority, is_admin=None):
+    """Detections for a decoded frame, as /predict and /api/detect produce them
+    
+    Near-duplicates of a stored upload and camera frames the motion gate
+    lets through reuse earlier detections; other frames run through the
+    source's regions of interest once the scheduler grants a slot.
+    Returns (detections, image_hash, duplicate Detection or None, motion_gated).
+    """
+    stage = metrics.PREDICT_STAGE_SECONDS
+    # Near-duplicates of a frame already stored (re-encoded, rescaled, shifted) get its
+    # result. Camera frames are left to the motion gate, so their tracks stay up to date.
+    duplicate = None
+    with stage.time(stage='dedup'):
+        import dedup
+        image_hash = dedup.dhash(img_array)
+        if source is None and app.config['DEDUP_MAX_DISTANCE'] >= 0:
+            duplicate = find_duplicate(user_id, image_hash, active.version)
+    if duplicate is not None:
+        return json.loads(duplicate.detections), image_hash, duplicate, False
+    
+    # Camera frames that barely differ from the source's last analysed frame reuse its detections
+    gate_key = (user_id, source, active.version) if source else None
+    with stage.time(stage='motion_gate'):
+        detections, thumbnail = motion.MOTION_GATE.check(gate_key, img_array)
+    if detections is not None:
+        return detections, image_hash, None, True
+    
+    # Only the source's regions of interest go to the model, if it has any
+    plan = region_plan([img_array], [(user_id, source)])
+    if is_admin is None:
+        user = User.query.get(user_id)
+        is_admin = user is not None and user.is_admin
+    weight = app.config['SCHEDULER_ADMIN_WEIGHT'] if is_admin else 1.0
+    # Run inference based on model type, once the scheduler grants a slot
+    with scheduler.SCHEDULER.slot(priority, user=user_id, weight=weight), \
+            stage.time(stage='inference'), metrics.MODEL_INFERENCE_SECONDS.time(version=active.version):
+        inference_start = time.perf_counter()
+        imgsz = app.config['DEGRADED_IMGSZ'] if ticket.level >= admission.REDUCED_RESOLUTION else None
+        results = run_plan(inference, active, plan, imgsz=imgsz)
+        inference_seconds = time.perf_counter() - inference_start
+    with stage.time(stage='postprocess'):
+        detections = plan_detections(inference, active, plan, results)[0]
+    motion.MOTION_GATE.record(gate_key, thumbnail, detections)
+    
+    # Compare against the shadow candidate in the background. The candidate runs the whole
+    # frame at native size, so only requests served the same way are comparable: not
+    # cropped to regions, not screened by the cascade, not at a degraded level.
+    comparable = ticket.level == admission.NORMAL and not plan.cropped and not app.config['CASCADE']
+    if comparable and shadow.EVALUATOR.sampled(active.version):
+        shadow.EVALUATOR.submit(img_array, active.version, detections, inference_seconds)
+    return detections, image_hash, None, False
+
+def store_frame(user_id, image_bytes, extension, detections, source, active, image_hash, duplicate=None):
+    """Store an analysed frame and its detection; returns (Detection, alerts created)
+    
+    A near-duplicate is not stored again: its earlier detection is returned.
+    """
+    if duplicate is not None:
+        return duplicate, []
+    stage = metrics.PREDICT_STAGE_SECONDS
+    # Store the upload as received, no re-encode
+    with stage.time(stage='image_write'):
+        filename = save_detection_image(image_bytes, extension)
+    with stage.time(stage='db_commit'):
+        detection, alerts_created = record_detection(user_id, filename, detections, source=source,
+                                                     model_version=active.version, image_is_original=True,
+                                                     image_hash=image_hash)
+        db.session.commit()
+    return detection, alerts_created
+
+def run_predict(ticket):
+    """Body of /predict, at the degradation level the admission ticket allows"""
     try:
-        if 'user_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-        
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
         
@@ -324,95 +876,90 @@ def predict():
         if file.filename == '':
             return jsonify({'error': 'No image selected'}), 400
         
-        # Load model if not already loaded
-        if model is None:
-            if not load_model():
-                return jsonify({'error': 'Failed to load model'}), 500
-        
-        # Read and preprocess image
-        image = Image.open(file.stream)
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Preprocess for YOLO
-        img_array = preprocess_image(image)
-        
-        # Run inference based on model type
-        with torch.no_grad():
-            if hasattr(model, 'predict'):  # ultralytics YOLO
-                results = model.predict(img_array, verbose=False)
-                annotated_img, detections = postprocess_ultralytics_results(results, img_array)
-            else:  # torch.hub YOLO
-                results = model(img_array)
-                annotated_img, detections = postprocess_results(results, img_array)
-        
-        # Save annotated image
-        unique_filename = f"detection_{uuid.uuid4().hex}.jpg"
-        image_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        cv2.imwrite(image_path, annotated_img)
-        
-        # Save detection to database
-        detection = Detection(
-            user_id=session['user_id'],
-            image_path=unique_filename,
-            detections=json.dumps(detections),
-            confidence_scores=json.dumps([d['confidence'] for d in detections])
-        )
-        db.session.add(detection)
-        db.session.commit()
+        # Take the active model once; an admin switch mid-request does not affect it
+        inference = get_inference()
+        active = active_model(inference)
+        if active is None:
+            return jsonify({'error': 'Failed to load model'}), 500
         
-        # Check for weapons and create alerts
-        alerts_created = []
-        if detections:
-            # Create weapon detection alert
-            alert = Alert(
-                detection_id=detection.id,
-                alert_type='weapon_detected',
-                message=f'Weapon detected with {len(detections)} object(s) found'
-            )
-            db.session.add(alert)
-            alerts_created.append({
-                'type': 'weapon_detected',
-                'message': f'🚨 WEAPON DETECTED! {len(detections)} object(s) found',
-                'severity': 'high'
-            })
+        stage = metrics.PREDICT_STAGE_SECONDS
+        with metrics.QUEUE_DEPTH.track_inprogress():
+            # Read and decode image; the raw upload is stored as the original. Decoded
+            # with OpenCV like serve_image and the export re-decode it, so EXIF
+            # rotation is applied the same way and stored boxes fit the rendered image.
+            with stage.time(stage='decode'):
+                image_bytes = file.read()
+                img_array = inference.decode_bytes(image_bytes)
+            if img_array is None:
+                return jsonify({'error': 'Image could not be decoded'}), 400
             
-            # Check for high confidence detections
-            high_confidence = [d for d in detections if d['confidence'] > 0.8]
-            if high_confidence:
-                alert = Alert(
-                    detection_id=detection.id,
-                    alert_type='high_confidence',
-                    message=f'High confidence weapon detection: {len(high_confidence)} object(s) with >80% confidence'
-                )
-                db.session.add(alert)
-                alerts_created.append({
-                    'type': 'high_confidence',
-                    'message': f'⚠️ HIGH CONFIDENCE: {len(high_confidence)} weapon(s) detected with >80% confidence',
-                    'severity': 'critical'
-                })
+            source = request.form.get('source') or None
+            priority = request_priority()
+            detections, image_hash, duplicate, motion_gated = analyse_frame(
+                ticket, inference, active, session['user_id'], img_array, source, priority)
+            
+            include_image = request.form.get('include_image') in ('1', 'true')
+            annotate = include_image and ticket.level < admission.SKIP_ANNOTATION
+            # Annotation is lazy (see serve_image) unless the caller wants the image inline
+            annotated_img = img_array
+            if annotate:
+                with stage.time(stage='annotate'):
+                    import annotation
+                    annotated_img = annotation.draw_detections(img_array.copy(), detections)
         
-        db.session.commit()
+        extension = os.path.splitext(secure_filename(file.filename))[1].lower() or '.jpg'
+        detection, alerts_created = store_frame(session['user_id'], image_bytes, extension, detections,
+                                                source, active, image_hash, duplicate)
         
-        # Convert annotated image back to base64 for web display
-        _, buffer = cv2.imencode('.jpg', annotated_img)
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
+        # Inline image only on request; otherwise clients load image_url
+        img_base64 = None
+        if include_image:
+            with stage.time(stage='base64_encode'):
+                img_base64 = base64.b64encode(inference.encode_jpeg(annotated_img)).decode('utf-8')
         
         return jsonify({
             'success': True,
             'detections': detections,
             'annotated_image': img_base64,
+            'image_url': url_for('serve_image', filename=detection.image_path),
             'total_detections': len(detections),
             'alerts': alerts_created,
-            'detection_id': detection.id
+            'detection_id': detection.id,
+            'model_version': detection.model_version,
+            'annotated': annotate,
+            'motion_gated': motion_gated,
+            'duplicate_of': duplicate.id if duplicate is not None else None,
+            'degradation': degradation_info(ticket),
+            'priority': priority
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
 
 @app.route('/health')
 def health():
-    return jsonify({'status': 'healthy', 'model_loaded': model is not None})
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'healthy', 'model_loaded': model_loaded()})
+
+@app.route('/ready')
+def ready():
+    """Readiness: the model is loaded and the database answers"""
+    checks = {'model_loaded': model_loaded()}
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        checks['database'] = True
+    except Exception:
+        db.session.rollback()
+        checks['database'] = False
+    
+    is_ready = all(checks.values())
+    return jsonify({'status': 'ready' if is_ready else 'not_ready', **checks}), 200 if is_ready else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/image/<filename>')
 def serve_image(filename):
@@ -420,16 +967,33 @@ def serve_image(filename):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    # Verify the image belongs to the current user
-    detection = Detection.query.filter_by(image_path=filename, user_id=session['user_id']).first()
+    # Verify the image belongs to the current user; admins can view any (similar-frame search)
+    query = Detection.query.filter_by(image_path=filename)
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        query = query.filter_by(user_id=session['user_id'])
+    detection = query.first()
     if not detection:
         return "Image not found or access denied", 404
     
     image_path = os.path.join(UPLOAD_FOLDER, filename)
-    if os.path.exists(image_path):
-        return send_file(image_path, mimetype='image/jpeg')
-    else:
+    if not os.path.exists(image_path):
         return "Image file not found", 404
+    if not detection.image_is_original:
+        return send_file(image_path, mimetype='image/jpeg')  # annotated when it was stored
+    
+    # Draw the boxes on the stored original on first view, then serve from the cache
+    rendered = render_cache.RENDER_CACHE.get(filename)
+    if rendered is None:
+        import annotation
+        with open(image_path, 'rb') as f:
+            original = f.read()
+        try:
+            rendered = annotation.render_annotated(original, json.loads(detection.detections))
+        except ValueError:
+            return "Image file could not be decoded", 500
+        render_cache.RENDER_CACHE.put(filename, rendered)
+    return send_file(io.BytesIO(rendered), mimetype='image/jpeg')
 
 # Additional routes
 @app.route('/alerts')
@@ -438,7 +1002,7 @@ def alerts():
         return redirect(url_for('login'))
     
     alerts = Alert.query.join(Detection).filter(Detection.user_id == session['user_id']).order_by(Alert.timestamp.desc()).all()
-    return render_template('alerts.html', alerts=alerts)
+    return render_template('alerts.html', alerts=alerts, ack_cursor=acknowledgement_cursor(session['user_id']))
 
 @app.route('/detection/<int:detection_id>')
 def view_detection(detection_id):
@@ -448,6 +1012,131 @@ def view_detection(detection_id):
     detection = Detection.query.filter_by(id=detection_id, user_id=session['user_id']).first_or_404()
     return render_template('detection_detail.html', detection=detection)
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue an image for the inference workers instead of running it in this process"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    file = request.files.get('image')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'No image file provided'}), 400
+    
+    # Workers read the stored upload, which also becomes the detection's original image
+    extension = os.path.splitext(secure_filename(file.filename))[1].lower() or '.jpg'
+    filename = save_detection_image(file.read(), extension)
+    job = JOBS.enqueue(session['user_id'], filename, source=request.form.get('source') or None)
+    db.session.commit()
+    return jsonify({'job_id': job.id, 'status': job.status,
+                    'status_url': url_for('job_status', job_id=job.id)}), 202
+
+@app.route('/api/detect', methods=['POST'])
+@profiling.profile_request('detect')
+def api_detect():
+    """Raw-body prediction for machine clients, authenticated by API token (see wire.py)"""
+    caller = api_token_user()
+    if caller is None:
+        response = jsonify({'error': 'Valid API token required'})
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response, 401
+    
+    with admission.CONTROLLER.admit() as ticket:
+        if ticket.shed:
+            response = make_response(jsonify({'error': 'Server overloaded, please retry later',
+                                              'degradation': degradation_info(ticket)}), 503)
+            response.headers['Retry-After'] = str(ticket.retry_after)
+        else:
+            response = make_response(run_detect(ticket, *caller))
+    response.headers['X-Degradation-Level'] = str(ticket.level)
+    return response
+
+def run_detect(ticket, user_id, is_admin):
+    """Body of /api/detect: decode the raw body, analyse and store the frame, answer columnar"""
+    mimetype = wire.response_type(request.headers.get('Accept'))
+    if mimetype is None:
+        return jsonify({'error': f'Accept one of {wire.RAW}, {wire.JSON} or {wire.MSGPACK} (if installed)'}), 406
+    content_type = request.mimetype
+    if content_type not in wire.IMAGE_TYPES and content_type != wire.RAW:
+        return jsonify({'error': 'Content-Type must be image/jpeg, image/png or application/octet-stream'}), 415
+    
+    inference = get_inference()
+    active = active_model(inference)
+    if active is None:
+        return jsonify({'error': 'Failed to load model'}), 500
+    
+    source = request.headers.get('X-Source') or request.args.get('source') or None
+    if request.args.get('priority') in ('batch', 'backfill'):
+        priority = scheduler.BATCH
+    else:
+        priority = scheduler.LIVE if source else scheduler.INTERACTIVE
+    
+    stage = metrics.PREDICT_STAGE_SECONDS
+    try:
+        with metrics.QUEUE_DEPTH.track_inprogress():
+            with stage.time(stage='decode'):
+                body = request.get_data(cache=False)
+                if content_type == wire.RAW:
+                    shape = wire.parse_shape(request.headers.get('X-Frame-Shape'))
+                    array = wire.parse_raw(body, shape, request.headers.get('X-Frame-Dtype', 'uint8'))
+                    img_array = inference.array_to_frame(array)
+                else:
+                    img_array = inference.decode_bytes(body)
+                    if img_array is None:
+                        raise ValueError('Image could not be decoded')
+            detections, image_hash, duplicate, motion_gated = analyse_frame(
+                ticket, inference, active, user_id, img_array, source, priority, is_admin=is_admin)
+        
+        if content_type == wire.RAW:
+            # Raw pixels are kept as a JPEG, the only encode on this path
+            with stage.time(stage='image_write'):
+                image_bytes, extension = inference.encode_jpeg(img_array), '.jpg'
+        else:
+            image_bytes, extension = body, wire.IMAGE_TYPES[content_type]
+        detection, _ = store_frame(user_id, image_bytes, extension, detections, source, active,
+                                   image_hash, duplicate)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+    
+    classes, ids = wire.class_table(getattr(active.model, 'names', None), detections)
+    body = wire.encode(detections, mimetype, ids, detection_id=detection.id,
+                       duplicate_of=duplicate.id if duplicate is not None else None,
+                       motion_gated=motion_gated, level=ticket.level)
+    response = Response(body, mimetype=mimetype)
+    response.headers['X-Class-Names'] = wire.class_header(classes)
+    response.headers['X-Model-Version'] = detection.model_version or ''
+    return response
+
+@app.route('/api/jobs/<int:job_id>')
+def job_status(job_id):
+    """Status of a queued job, with its detections once done"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    job = InferenceJob.query.filter_by(id=job_id, user_id=session['user_id']).first_or_404()
+    result = {
+        'job_id': job.id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.detection_id is not None:
+        detection = Detection.query.get(job.detection_id)
+        if detection is not None:
+            detections = json.loads(detection.detections)
+            result.update({
+                'detection_id': detection.id,
+                'detections': detections,
+                'total_detections': len(detections),
+                'image_url': url_for('serve_image', filename=detection.image_path),
+                'model_version': detection.model_version,
+            })
+    return jsonify(result)
+
 @app.route('/api/alerts')
 def api_alerts():
     if 'user_id' not in session:
@@ -463,7 +1152,10 @@ def api_alerts():
         'type': alert.alert_type,
         'message': alert.message,
         'timestamp': alert.timestamp.isoformat(),
-        'severity': 'high' if alert.alert_type == 'weapon_detected' else 'critical'
+        'severity': 'high' if alert.alert_type == 'weapon_detected' else 'critical',
+        'source': alert.source,
+        'frame_count': alert.frame_count or 1,
+        'last_seen': alert.last_seen.isoformat() if alert.last_seen else None
     } for alert in alerts])
 
 @app.route('/api/acknowledge_alert/<int:alert_id>', methods=['POST'])
@@ -471,16 +1163,131 @@ def acknowledge_alert(alert_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Authentication required'}), 401
     
-    alert = Alert.query.join(Detection).filter(
+    Alert.query.join(Detection).filter(
         Alert.id == alert_id,
         Detection.user_id == session['user_id']
     ).first_or_404()
     
-    alert.acknowledged = True
+    acknowledge_alerts(session['user_id'], {'ids': [alert_id]})
     db.session.commit()
     
     return jsonify({'success': True})
 
+MAX_ACKNOWLEDGE_IDS = 5000
+
+def parse_utc_time(value):
+    """Naive UTC datetime from an ISO 8601 string, with or without an offset; raises ValueError"""
+    parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_alert_scope(data):
+    """Normalised acknowledgement scope from a request body; raises ValueError
+    
+    {"ids": [...]} names alerts. Otherwise type, detection_id, since and
+    until (ISO times, UTC) filter them, and max_id leaves out alerts newer
+    than the ones the caller has seen. {"all": true} without
+    a filter takes every unacknowledged alert.
+    """
+    ids = data.get('ids')
+    if ids is not None:
+        if isinstance(ids, str):
+            ids = [part for part in ids.split(',') if part.strip()]
+        ids = sorted({int(alert_id) for alert_id in ids})
+        if not ids:
+            raise ValueError('ids is empty')
+        if len(ids) > MAX_ACKNOWLEDGE_IDS:
+            raise ValueError(f'At most {MAX_ACKNOWLEDGE_IDS} ids per request; use a filter for more')
+        return {'ids': ids}
+    
+    scope = {}
+    if data.get('type'):
+        scope['type'] = str(data['type'])
+    for key in ('detection_id', 'max_id'):
+        if data.get(key) not in (None, ''):
+            scope[key] = int(data[key])
+    for key in ('since', 'until'):
+        if data.get(key):
+            scope[key] = parse_utc_time(data[key]).isoformat()
+    if not scope:
+        if data.get('all') not in (True, 1, '1', 'true', 'on'):
+            raise ValueError('Give ids, a filter (type, detection_id, since, until, max_id) or all')
+        scope['all'] = True
+    return scope
+
+def acknowledge_alerts(user_id, scope):
+    """Acknowledge the user's unacknowledged alerts in a scope with one UPDATE; the caller commits
+    
+    Returns the number of alerts acknowledged. The scope is recorded as an
+    AlertAcknowledgement for the user's other open dashboards to apply.
+    """
+    owned = db.select(Detection.id).where(Detection.user_id == user_id)
+    conditions = [Alert.acknowledged == False, Alert.detection_id.in_(owned)]
+    if 'ids' in scope:
+        conditions.append(Alert.id.in_(scope['ids']))
+    if 'type' in scope:
+        conditions.append(Alert.alert_type == scope['type'])
+    if 'detection_id' in scope:
+        conditions.append(Alert.detection_id == scope['detection_id'])
+    if 'since' in scope:
+        conditions.append(Alert.timestamp >= datetime.fromisoformat(scope['since']))
+    if 'until' in scope:
+        conditions.append(Alert.timestamp <= datetime.fromisoformat(scope['until']))
+    if 'max_id' in scope:
+        conditions.append(Alert.id <= scope['max_id'])
+    
+    result = db.session.execute(db.update(Alert).where(*conditions).values(acknowledged=True)
+                                .execution_options(synchronize_session=False))
+    count = result.rowcount
+    if count:
+        db.session.add(AlertAcknowledgement(user_id=user_id, scope=json.dumps(scope), count=count))
+        metrics.ALERTS_TOTAL.inc(count, action='acknowledged')
+        # Dashboards poll every few seconds; older entries are only kept for ones that were asleep
+        AlertAcknowledgement.query.filter(AlertAcknowledgement.created_at < datetime.utcnow() - timedelta(days=1)) \
+            .delete(synchronize_session=False)
+    return count
+
+def acknowledgement_cursor(user_id):
+    """Id of the user's latest acknowledgement, where a freshly rendered page starts polling"""
+    return db.session.query(db.func.max(AlertAcknowledgement.id)) \
+        .filter(AlertAcknowledgement.user_id == user_id).scalar() or 0
+
+@app.route('/api/alerts/acknowledge', methods=['POST'])
+def bulk_acknowledge_alerts():
+    """Acknowledge alerts by id list, by filter or all at once, in a single UPDATE"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        scope = parse_alert_scope(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid acknowledgement: {e}'}), 400
+    
+    count = acknowledge_alerts(session['user_id'], scope)
+    db.session.commit()
+    return jsonify({'success': True, 'acknowledged': count, 'scope': scope})
+
+@app.route('/api/alerts/acknowledgements')
+def alert_acknowledgements():
+    """Acknowledgements made since a cursor, so open dashboards can drop those alerts"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    after = request.args.get('after', type=int)
+    if after is None:
+        return jsonify({'cursor': acknowledgement_cursor(session['user_id']), 'events': []})
+    events = AlertAcknowledgement.query.filter(
+        AlertAcknowledgement.user_id == session['user_id'],
+        AlertAcknowledgement.id > after
+    ).order_by(AlertAcknowledgement.id).limit(100).all()
+    return jsonify({
+        'cursor': events[-1].id if events else after,
+        'events': [{'id': event.id, 'count': event.count, 'scope': json.loads(event.scope),
+                    'created_at': event.created_at.isoformat()} for event in events],
+    })
+
 # Profile and Settings Routes
 @app.route('/profile')
 def profile():
@@ -507,8 +1314,8 @@ def profile():
     
     safe_scans = total_scans - weapon_detections
     
-    # Calculate average response time (mock data for now)
-    avg_response_time = "2.3s"
+    # Average /predict latency measured by this server process
+    avg_response_time = metrics.format_seconds(metrics.REQUEST_LATENCY.mean(endpoint='predict'))
     
     # Get activity stats
     today = datetime.now().date()
@@ -537,7 +1344,8 @@ def profile():
         'avg_response_time': avg_response_time,
         'today_scans': today_scans,
         'week_scans': week_scans,
-        'month_scans': month_scans
+        'month_scans': month_scans,
+        'stage_latency': metrics.stage_means()
     }
     
     return render_template('profile.html', user_stats=user_stats)
@@ -562,13 +1370,45 @@ def settings():
             continue
     
     safe_scans = total_scans - weapon_detections
+    api_tokens = ApiToken.query.filter_by(user_id=session['user_id'], revoked_at=None) \
+        .order_by(ApiToken.created_at.desc()).all()
     
     return render_template('settings.html', 
                          total_scans=total_scans,
                          weapon_detections=weapon_detections,
                          safe_scans=safe_scans,
+                         api_tokens=api_tokens,
                          confidence_threshold=75)
 
+@app.route('/settings/api-tokens', methods=['POST'])
+def create_api_token():
+    """Create an API token for /api/detect; the token is only shown in this response"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json(silent=True) or request.form
+    name = (data.get('name') or '').strip()[:100]
+    if not name:
+        return jsonify({'error': 'Token name is required'}), 400
+    token = 'wars_' + secrets.token_urlsafe(32)
+    row = ApiToken(user_id=session['user_id'], name=name, token_hash=hash_token(token), prefix=token[:12])
+    db.session.add(row)
+    db.session.commit()
+    return jsonify({'success': True, 'id': row.id, 'name': row.name, 'token': token})
+
+@app.route('/settings/api-tokens/<int:token_id>/revoke', methods=['POST'])
+def revoke_api_token(token_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    row = ApiToken.query.filter_by(id=token_id, user_id=session['user_id']).first_or_404()
+    if row.revoked_at is None:
+        row.revoked_at = datetime.utcnow()
+        db.session.commit()
+    with _token_lock:
+        _tokens.pop(row.token_hash, None)
+    return jsonify({'success': True})
+
 @app.route('/settings/reset-stats', methods=['POST'])
 def reset_statistics():
     if 'user_id' not in session:
@@ -587,8 +1427,7 @@ def reset_statistics():
                     pass  # File might already be deleted
         
         # Delete all user's detections and related alerts
-        Detection.query.filter_by(user_id=session['user_id']).delete()
-        Alert.query.join(Detection).filter(Detection.user_id == session['user_id']).delete()
+        delete_detections(session['user_id'])
         
         db.session.commit()
         return jsonify({'success': True, 'message': 'Statistics reset successfully'})
@@ -614,8 +1453,7 @@ def clear_all_data():
                     pass  # File might already be deleted
         
         # Delete all user's detections and related data
-        Detection.query.filter_by(user_id=session['user_id']).delete()
-        Alert.query.join(Detection).filter(Detection.user_id == session['user_id']).delete()
+        delete_detections(session['user_id'])
         
         db.session.commit()
         return jsonify({'success': True, 'message': 'All data cleared successfully'})
@@ -623,6 +1461,107 @@ def clear_all_data():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'zip': 'application/zip'}
+
+def export_rows(user_id, upto, since=None, until=None, source=None):
+    """The user's detections up to id upto, oldest first, read a page at a time
+    
+    Keyset pagination (id > last id of the previous page) keeps each page an
+    index range scan however deep the export is, where OFFSET would rescan
+    every skipped row. Each page is its own short read transaction, so a
+    slow download does not hold the database while detections are stored.
+    """
+    columns = (Detection.id, Detection.timestamp, Detection.source, Detection.model_version,
+               Detection.image_path, Detection.image_is_original, Detection.detections)
+    conditions = [Detection.user_id == user_id, Detection.id <= upto]
+    if since is not None:
+        conditions.append(Detection.timestamp >= since)
+    if until is not None:
+        conditions.append(Detection.timestamp <= until)
+    if source:
+        conditions.append(Detection.source == source)
+    
+    last_id = 0
+    while True:
+        page = db.session.execute(db.select(*columns).where(Detection.id > last_id, *conditions)
+                                  .order_by(Detection.id).limit(app.config['EXPORT_PAGE_SIZE'])).all()
+        alerts = {}
+        if page:
+            for detection_id, alert_type, acknowledged in db.session.execute(
+                    db.select(Alert.detection_id, Alert.alert_type, Alert.acknowledged)
+                    .where(Alert.detection_id.in_([row.id for row in page])).order_by(Alert.id)):
+                alerts.setdefault(detection_id, []).append((alert_type, bool(acknowledged)))
+        db.session.rollback()  # end the read transaction before handing rows to the client
+        if not page:
+            return
+        for row in page:
+            try:
+                detections = json.loads(row.detections)
+            except (json.JSONDecodeError, TypeError):
+                detections = []
+            raised = alerts.get(row.id, [])
+            yield {'id': row.id, 'timestamp': row.timestamp, 'source': row.source,
+                   'model_version': row.model_version, 'image_path': row.image_path,
+                   'image_is_original': row.image_is_original, 'detections': detections,
+                   'alerts': [alert_type for alert_type, _ in raised],
+                   'acknowledged': all(acknowledged for _, acknowledged in raised) if raised else None}
+        last_id = page[-1].id
+
+def export_images(rows):
+    """ZIP items for an export: each detection's annotated image, then detections.jsonl"""
+    for row in rows():
+        name = row['image_path']
+        image = render_cache.RENDER_CACHE.get(name) if row['image_is_original'] else None
+        if image is None:
+            try:
+                with open(os.path.join(UPLOAD_FOLDER, name), 'rb') as f:
+                    image = f.read()
+            except OSError:
+                continue  # file cleaned up; the index still lists the detection
+            if row['image_is_original']:
+                import annotation
+                try:
+                    image = annotation.render_annotated(image, row['detections'])
+                except ValueError:
+                    continue
+        if row['image_is_original']:
+            name = os.path.splitext(name)[0] + '.jpg'
+        stamp = row['timestamp'] or datetime.utcnow()
+        yield f"images/{name}", stamp.timetuple()[:6], image
+    yield 'detections.jsonl', datetime.utcnow().timetuple()[:6], export.json_lines(rows())
+
+@app.route('/export/detections.<fmt>')
+def export_detections(fmt):
+    """Stream the user's detection history as CSV, JSON Lines or a ZIP of annotated images"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown export format; use one of {', '.join(EXPORT_FORMATS)}"}), 404
+    
+    try:
+        since = parse_utc_time(request.args['since']) if request.args.get('since') else None
+        until = parse_utc_time(request.args['until']) if request.args.get('until') else None
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time: {e}'}), 400
+    
+    user_id = session['user_id']
+    source = request.args.get('source') or None
+    # Detections stored during the download are left out, so the ZIP's images and index agree
+    upto = db.session.query(db.func.max(Detection.id)).filter(Detection.user_id == user_id).scalar() or 0
+    rows = lambda: export_rows(user_id, upto, since, until, source)
+    if fmt == 'csv':
+        body = export.csv_lines(rows())
+    elif fmt == 'jsonl':
+        body = export.json_lines(rows())
+    else:
+        body = export.zip_stream(export_images(rows))
+    
+    response = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="wars-detections-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # let a proxy pass the stream through as it comes
+    return response
+
 @app.route('/admin/reset-all-stats', methods=['POST'])
 def admin_reset_all_statistics():
     """Admin route to reset all statistics for all users"""
@@ -640,6 +1579,338 @@ def admin_reset_all_statistics():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/admin')
+def admin():
+    """Admin tools: model versions and stored request profiles"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return "Admin access required", 403
+    
+    profile_dir = app.config['PROFILE_DIR']
+    profiles = profiling.list_artifacts(profile_dir)
+    selected = request.args.get('profile')
+    hot_functions = []
+    if selected and any(p['id'] == selected for p in profiles):
+        hot_functions = profiling.top_functions(profile_dir, selected)
+    
+    return render_template('admin.html',
+                         profiles=profiles,
+                         selected_profile=selected,
+                         hot_functions=hot_functions,
+                         models=model_overview(),
+                         shadow_summary=shadow_summary(),
+                         shadow_sample_rate=shadow.EVALUATOR.sample_rate,
+                         regions=db.session.query(SourceRegion, User.username).outerjoin(
+                             User, SourceRegion.user_id == User.id).order_by(
+                             SourceRegion.source, SourceRegion.id).all(),
+                         known_sources=db.session.query(User.username, Detection.source).join(
+                             Detection, Detection.user_id == User.id).filter(Detection.source.isnot(None)).distinct(
+                             ).order_by(Detection.source, User.username).all(),
+                         job_counts=JOBS.counts(),
+                         workers=InferenceWorker.query.order_by(InferenceWorker.last_heartbeat.desc()).limit(20).all(),
+                         worker_stale_after=timedelta(seconds=app.config['JOB_LEASE_SECONDS']),
+                         now=datetime.utcnow(),
+                         notifications=notify.DISPATCHER.overview(),
+                         cascade_enabled=app.config['CASCADE'],
+                         cascade_summary=metrics.cascade_summary(),
+                         profile_sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+                         profile_slow_threshold=app.config['PROFILE_SLOW_THRESHOLD'])
+
+def model_overview():
+    """Registered, available and deployed model versions for the admin page"""
+    inference = sys.modules.get('inference')
+    active = inference.REGISTRY.active() if inference else None
+    detection_counts = dict(db.session.query(Detection.model_version, db.func.count(Detection.id))
+                            .group_by(Detection.model_version).all())
+    loaded = []
+    for entry in (inference.REGISTRY.versions() if inference else []):
+        count, total = metrics.MODEL_INFERENCE_SECONDS.summary(version=entry.version)
+        loaded.append({
+            'version': entry.version,
+            'path': entry.path,
+            'active': active is not None and active.version == entry.version,
+            'loaded_at': datetime.fromtimestamp(entry.loaded_at),
+            'load_time': metrics.format_seconds(entry.load_seconds),
+            'inferences': count,
+            'mean_latency': metrics.format_seconds(total / count if count else None),
+            'detections': detection_counts.get(entry.version, 0),
+        })
+    loaded_paths = {entry['path'] for entry in loaded}
+    available = []
+    if inference:
+        available = [{'path': path, 'version': inference.version_for(path)}
+                     for path in inference.available_checkpoints() if path not in loaded_paths]
+    deployments = ModelDeployment.query.order_by(ModelDeployment.id.desc()).limit(10).all()
+    return {'loaded': loaded, 'available': available, 'deployments': deployments,
+            'shadow': shadow.EVALUATOR.candidate}
+
+def shadow_summary():
+    """Agreement and latency of each shadow candidate against the model it shadowed"""
+    c = ShadowComparison
+    rows = db.session.query(
+        c.primary_version, c.candidate_version, db.func.count(c.id),
+        db.func.sum(db.case((c.agreed == True, 1), else_=0)),
+        db.func.sum(c.primary_boxes), db.func.sum(c.candidate_boxes), db.func.sum(c.matched_boxes),
+        db.func.sum(c.class_mismatches), db.func.sum(c.iou_sum),
+        db.func.sum(c.confidence_delta_sum), db.func.sum(c.confidence_abs_delta_sum),
+        db.func.avg(c.primary_seconds), db.func.avg(c.candidate_seconds),
+        db.func.max(c.timestamp)
+    ).group_by(c.primary_version, c.candidate_version).order_by(db.func.max(c.timestamp).desc()).all()
+    
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else None
+    
+    summary = []
+    for (primary, candidate, frames, agreed, primary_boxes, candidate_boxes, matched, mismatches,
+         iou_sum, delta_sum, abs_delta_sum, primary_latency, candidate_latency, last) in rows:
+        summary.append({
+            'primary': primary,
+            'candidate': candidate,
+            'frames': frames,
+            'frame_agreement': ratio(agreed, frames),
+            'recall': ratio(matched, primary_boxes),        # primary boxes the candidate also found
+            'precision': ratio(matched, candidate_boxes),   # candidate boxes the primary also found
+            'class_mismatches': mismatches,
+            'mean_iou': ratio(iou_sum, matched),
+            'confidence_delta': ratio(delta_sum, matched),
+            'confidence_abs_delta': ratio(abs_delta_sum, matched),
+            'primary_latency': metrics.format_seconds(primary_latency),
+            'candidate_latency': metrics.format_seconds(candidate_latency),
+            'speedup': ratio(primary_latency, candidate_latency),
+            'last': last,
+        })
+    return summary
+
+@app.route('/admin/models/activate', methods=['POST'])
+def admin_activate_model():
+    """Switch the active model, loading the checkpoint first if needed"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    version = data.get('version')
+    path = data.get('path')
+    activate = data.get('activate', True) not in (False, 'false', '0')
+    inference = get_inference()
+    
+    try:
+        entry = inference.REGISTRY.get(version) if version else None
+        if entry is None:
+            # Only checkpoints from the model directory may be loaded
+            if path not in inference.available_checkpoints():
+                return jsonify({'error': 'Unknown model version or checkpoint'}), 404
+            entry = inference.REGISTRY.load(version or inference.version_for(path), path)
+        if not activate:
+            return jsonify({'success': True, 'version': entry.version, 'active': False})
+        
+        inference.REGISTRY.activate(entry.version)
+        db.session.add(ModelDeployment(version=entry.version, path=entry.path, activated_by=user.id))
+        db.session.commit()
+        return jsonify({'success': True, 'version': entry.version, 'active': True})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Model switch failed: {str(e)}'}), 500
+
+@app.route('/admin/models/shadow', methods=['POST'])
+def admin_shadow_model():
+    """Start shadowing live traffic with a candidate model, or stop with {"stop": true}"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    inference = get_inference()
+    
+    try:
+        if data.get('stop') in (True, 'true', '1'):
+            entry = None
+        else:
+            version = data.get('version')
+            path = data.get('path')
+            entry = inference.REGISTRY.get(version) if version else None
+            if entry is None:
+                if path not in inference.available_checkpoints():
+                    return jsonify({'error': 'Unknown model version or checkpoint'}), 404
+                entry = inference.REGISTRY.load(version or inference.version_for(path), path)
+        
+        shadow.EVALUATOR.candidate = entry.version if entry else None
+        db.session.add(ModelDeployment(version=entry.version if entry else '', path=entry.path if entry else None,
+                                       activated_by=user.id, role='shadow'))
+        db.session.commit()
+        return jsonify({'success': True, 'shadow': shadow.EVALUATOR.candidate})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Shadow switch failed: {str(e)}'}), 500
+
+@app.route('/admin/models/unload', methods=['POST'])
+def admin_unload_model():
+    """Free a standby model version in this server process"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    inference = get_inference()
+    if data.get('version') == shadow.EVALUATOR.candidate:
+        return jsonify({'error': f"Model {data.get('version')} is the shadow candidate"}), 409
+    try:
+        inference.REGISTRY.unload(data.get('version'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify({'success': True})
+
+def parse_polygon(value):
+    """Polygon from JSON [[x, y], ...] or "x,y x,y ..." text; relative coordinates 0-1"""
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            value = [point.split(',') for point in value.replace(';', ' ').split()]
+    points = [[float(x), float(y)] for x, y in value]
+    if len(points) < 3:
+        raise ValueError('A polygon needs at least 3 points')
+    if not all(0.0 <= c <= 1.0 for point in points for c in point):
+        raise ValueError('Coordinates are fractions of the frame size, between 0 and 1')
+    return points
+
+@app.route('/admin/regions', methods=['POST'])
+def admin_add_region():
+    """Add a region of interest to a user's camera source (the admin's own by default)"""
+    global _regions_loaded_at
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    source = (data.get('source') or '').strip()
+    if not source:
+        return jsonify({'error': 'Source is required'}), 400
+    owner_name = (data.get('owner') or '').strip()
+    owner = User.query.filter_by(username=owner_name).first() if owner_name else user
+    if owner is None:
+        return jsonify({'error': f'Unknown owner: {owner_name}'}), 400
+    try:
+        polygon = parse_polygon(data.get('polygon') or '')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid polygon: {e}'}), 400
+    
+    region = SourceRegion(user_id=owner.id, source=source, name=(data.get('name') or '').strip() or None,
+                          polygon=json.dumps(polygon), created_by=user.id)
+    db.session.add(region)
+    db.session.commit()
+    _regions_loaded_at = None  # this process picks it up now, the others within MODEL_SYNC_INTERVAL
+    return jsonify({'success': True, 'id': region.id})
+
+@app.route('/admin/regions/<int:region_id>/delete', methods=['POST'])
+def admin_delete_region(region_id):
+    """Remove a region of interest"""
+    global _regions_loaded_at
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    region = SourceRegion.query.get(region_id)
+    if region is None:
+        return jsonify({'error': 'Region not found'}), 404
+    db.session.delete(region)
+    db.session.commit()
+    _regions_loaded_at = None
+    return jsonify({'success': True})
+
+@app.route('/admin/similar', methods=['POST'])
+def admin_similar_frames():
+    """Stored frames of any user that look like an uploaded image or a stored detection"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    import dedup
+    data = request.get_json(silent=True) or request.form
+    try:
+        max_distance = int(data.get('max_distance', 10))
+        limit = min(int(data.get('limit', 50)), 500)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_distance and limit must be integers'}), 400
+    
+    exclude = None
+    if request.files.get('image'):
+        inference = get_inference()
+        image = inference.decode_bytes(request.files['image'].read())
+        if image is None:
+            return jsonify({'error': 'Image could not be decoded'}), 400
+        image_hash = dedup.dhash(image)
+    elif data.get('detection_id'):
+        reference = Detection.query.get(data.get('detection_id'))
+        if reference is None:
+            return jsonify({'error': 'Detection not found'}), 404
+        if reference.image_hash is None:
+            return jsonify({'error': 'Detection has no image hash (recorded before hashing was added)'}), 409
+        image_hash, exclude = dedup.to_unsigned(reference.image_hash), reference.id
+    else:
+        return jsonify({'error': 'Provide an image or a detection_id'}), 400
+    
+    sync_duplicate_index(dedup.INDEX)
+    matches = [m for m in dedup.INDEX.search(image_hash, max_distance, limit=limit + 1) if m[0] != exclude][:limit]
+    distances = {detection_id: distance for detection_id, _, distance in matches}
+    rows = db.session.query(Detection, User.username).join(User, Detection.user_id == User.id) \
+        .filter(Detection.id.in_(list(distances))).all()
+    rows.sort(key=lambda row: (distances[row[0].id], -row[0].id))
+    return jsonify({
+        'hash': f'{image_hash:016x}',
+        'results': [{
+            'detection_id': detection.id,
+            'distance': distances[detection.id],
+            'username': username,
+            'timestamp': detection.timestamp.isoformat() if detection.timestamp else None,
+            'source': detection.source,
+            'total_detections': len(json.loads(detection.detections)),
+            'image_url': url_for('serve_image', filename=detection.image_path),
+        } for detection, username in rows]
+    })
+
+@app.route('/admin/profiles/<filename>')
+def download_profile(filename):
+    """Download a stored pstats dump or Chrome trace"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return "Admin access required", 403
+    
+    filename = secure_filename(filename)
+    if not filename.endswith((profiling.PSTATS_SUFFIX, profiling.TRACE_SUFFIX)):
+        return "Profile not found", 404
+    
+    path = os.path.join(app.config['PROFILE_DIR'], filename)
+    if os.path.exists(path):
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=filename)
+    else:
+        return "Profile not found", 404
+
 @app.route('/reset-stats-now', methods=['GET'])
 def reset_stats_now():
     """Quick route to reset all statistics (for testing)"""
@@ -649,10 +1920,35 @@ def reset_stats_now():
     except Exception as e:
         return f"Error: {e}"
 
-if __name__ == '__main__':
-    # Create database tables
+def create_app(config=None, load_model_on_start=True, reset_stats=False):
+    """Initialize the database and model and return the configured app
+    
+    Importing this module has no side effects; servers call this once
+    (gunicorn does it in the master when preloading, see gunicorn.conf.py).
+    """
+    if config:
+        app.config.update(config)
+    
+    if not os.path.exists(UPLOAD_FOLDER):
+        os.makedirs(UPLOAD_FOLDER)
+    
+    if 'sqlalchemy' not in app.extensions:
+        db.init_app(app)
+    
+    shadow.EVALUATOR.configure(record_shadow_comparison, app.config['SHADOW_SAMPLE_RATE'])
+    admission.CONTROLLER.configure(app.config['ADMISSION_MAX_IN_FLIGHT'], app.config['ADMISSION_TARGET_LATENCY'])
+    scheduler.SCHEDULER.configure(app.config['INFERENCE_CONCURRENCY'], app.config['SCHEDULER_MAX_WAIT'])
+    JOBS.configure(app.config['JOB_LEASE_SECONDS'], app.config['JOB_MAX_ATTEMPTS'],
+                   app.config['JOB_RETRY_BACKOFF'])
+    motion.MOTION_GATE.configure(app.config['MOTION_THRESHOLD'], app.config['MOTION_FORCE_EVERY'])
+    notify.DISPATCHER.configure(app, db, Notification,
+                                notify.parse_destinations(app.config['NOTIFY_URLS'], app.config['NOTIFY_INTERVAL']),
+                                app.config['NOTIFY_MAX_ATTEMPTS'], app.config['NOTIFY_RETRY_BACKOFF'])
+    
     with app.app_context():
+        # Create database tables
         db.create_all()
+        upgrade_schema()
         
         # Create admin user if it doesn't exist
         admin = User.query.filter_by(username='admin').first()
@@ -667,10 +1963,25 @@ if __name__ == '__main__':
             db.session.commit()
             print("Admin user created: username=admin, password=admin123")
         
-        # Reset all statistics when app starts
-        print("Resetting all statistics on startup...")
-        reset_all_statistics()
+        if reset_stats:
+            # Reset all statistics when app starts
+            print("Resetting all statistics on startup...")
+            reset_all_statistics()
+    
+    # Load model on startup: the deployed version if an admin switched, else the default
+    if load_model_on_start:
+        inference = get_inference()
+        with app.app_context():
+            sync_active_model(inference, force=True)
+        if inference.model is None:
+            inference.load_model()
     
-    # Load model on startup
-    load_model()
+    return app
+
+if __name__ == '__main__':
+    # Development server; use `gunicorn -c gunicorn.conf.py wsgi:app` in production
+    create_app(reset_stats=True)
+    # HTTP/1.1, so API clients can keep their connection open between frames
+    from werkzeug.serving import WSGIRequestHandler
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
     app.run(debug=True, host='0.0.0.0', port=5000)
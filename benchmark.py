@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the weapon detection pipeline
+
+Measures throughput and p50/p95/p99 latency of preprocess_image, model
+inference, postprocess_ultralytics_results, JPEG encoding and the full
+/predict route (through the Flask test client) across image resolutions,
+batch sizes and concurrency levels. Runs fully offline: when the trained
+checkpoint is missing (or --standin is given) the stand-in TinyDetector
+from tiny_model.py is used instead.
+
+Usage:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json --tolerance 0.10
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+from PIL import Image
+
+def make_image(width, height, seed=0):
+    """Synthetic thermal-looking BGR frame: smooth background with warm blobs"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frame = 40 + 30 * (y / max(height - 1, 1))
+    for _ in range(3):
+        cx, cy = rng.uniform(0, width), rng.uniform(0, height)
+        radius = rng.uniform(0.05, 0.15) * max(width, height)
+        frame += 180 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * radius ** 2))
+    frame += rng.normal(0, 4, size=frame.shape)
+    gray = np.clip(frame, 0, 255).astype(np.uint8)
+    return cv2.applyColorMap(gray, cv2.COLORMAP_INFERNO)
+
+
+def encode_jpeg(image_bgr):
+    ok, buffer = cv2.imencode('.jpg', image_bgr)
+    return buffer.tobytes()
+
+
+def summarize(latencies, images, wall_time):
+    """Latency percentiles in milliseconds and throughput in images/sec"""
+    values = np.asarray(latencies) * 1000.0
+    return {
+        'iterations': len(latencies),
+        'images_per_sec': round(images / wall_time, 2) if wall_time > 0 else None,
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def run_timed(fn, inputs, concurrency, images_per_call=1, warmup=2):
+    """Call fn on each input with a thread pool, returning per-call latencies"""
+    for item in inputs[:warmup]:
+        fn(item)
+
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(item) for item in inputs]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, inputs))
+    wall_time = time.perf_counter() - start
+    return summarize(latencies, len(inputs) * images_per_call, wall_time)
+
+
+def setup_app(workdir, use_standin):
+    """Import the app against a scratch database and upload folder"""
+    os.environ['WARS_UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+
+    import app as wars
+    import inference
+    from werkzeug.security import generate_password_hash
+
+    wars.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'benchmark.db'),
+        'PROFILE_SAMPLE_RATE': 0,
+        'PROFILE_SLOW_THRESHOLD': 0,
+        # Timed runs re-post the warm-up images; measure the full pipeline every time
+        'DEDUP_MAX_DISTANCE': -1,
+    }, load_model_on_start=False)
+
+    if use_standin or not os.path.exists(inference.model_path):
+        from tiny_model import TinyDetector
+        inference.REGISTRY.register('standin', TinyDetector(), activate=True)
+        model_name = 'standin:TinyDetector'
+    else:
+        if not inference.load_model():
+            sys.exit("Failed to load model checkpoint")
+        model_name = inference.model_path
+
+    with wars.app.app_context():
+        if not wars.User.query.filter_by(username='benchmark').first():
+            wars.db.session.add(wars.User(username='benchmark', email='benchmark@localhost',
+                                          password_hash=generate_password_hash('benchmark')))
+            wars.db.session.commit()
+    return wars, model_name
+
+
+def bench_resolution(wars, width, height, args):
+    """Run every stage for one resolution"""
+    inference = wars.get_inference()
+    results = []
+    frames = [make_image(width, height, seed=i) for i in range(args.iterations)]
+    pil_images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+    model = inference.model
+    resolution = f"{width}x{height}"
+
+    def record(stage, stats, batch_size=1, concurrency=1):
+        stats.update({'stage': stage, 'resolution': resolution,
+                      'batch_size': batch_size, 'concurrency': concurrency})
+        results.append(stats)
+        print(f"  {stage:<12} {resolution:>10} batch={batch_size:<3} conc={concurrency:<3} "
+              f"{stats['images_per_sec'] or 0:>9.1f} img/s  p50={stats['p50_ms']:.2f}ms  "
+              f"p95={stats['p95_ms']:.2f}ms  p99={stats['p99_ms']:.2f}ms")
+
+    for concurrency in args.concurrency:
+        record('preprocess', run_timed(inference.preprocess_image, pil_images, concurrency),
+               concurrency=concurrency)
+
+    for batch_size in args.batch_sizes:
+        batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+        batches = [b for b in batches if len(b) == batch_size] or [frames[:batch_size]]
+        for concurrency in args.concurrency:
+            stats = run_timed(lambda batch: model.predict(batch, verbose=False), batches,
+                              concurrency, images_per_call=batch_size)
+            record('inference', stats, batch_size, concurrency)
+
+    predictions = [model.predict(frame, verbose=False) for frame in frames]
+    pairs = list(zip(predictions, frames))
+    for concurrency in args.concurrency:
+        stats = run_timed(lambda pair: inference.postprocess_ultralytics_results(*pair), pairs, concurrency)
+        record('postprocess', stats, concurrency=concurrency)
+
+    annotated = [inference.postprocess_ultralytics_results(*pair)[0] for pair in pairs]
+    for concurrency in args.concurrency:
+        record('jpeg_encode', run_timed(lambda img: cv2.imencode('.jpg', img), annotated, concurrency),
+               concurrency=concurrency)
+
+    if not args.skip_predict:
+        payloads = [encode_jpeg(frame) for frame in frames]
+        clients = queue.Queue()
+        for _ in range(max(args.concurrency)):
+            client = wars.app.test_client()
+            client.post('/login', data={'username': 'benchmark', 'password': 'benchmark'})
+            clients.put(client)
+
+        def post(payload):
+            client = clients.get()
+            try:
+                response = client.post('/predict', content_type='multipart/form-data',
+                                       data={'image': (io.BytesIO(payload), 'frame.jpg')})
+            finally:
+                clients.put(client)
+            if response.status_code != 200:
+                raise RuntimeError(f"/predict returned {response.status_code}: {response.get_data(as_text=True)}")
+
+        for concurrency in args.concurrency:
+            record('predict', run_timed(post, payloads, concurrency), concurrency=concurrency)
+
+    return results
+
+
+def compare(current, baseline, tolerance):
+    """Print deltas against a baseline run; return the number of regressions"""
+    def key(row):
+        return (row['stage'], row['resolution'], row['batch_size'], row['concurrency'])
+
+    previous = {key(row): row for row in baseline['results']}
+    regressions = 0
+    print(f"\nComparison against baseline from {baseline['meta'].get('timestamp')}:")
+    for row in current['results']:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        delta = (row['p50_ms'] - old['p50_ms']) / old['p50_ms'] if old['p50_ms'] else 0.0
+        flag = ''
+        if delta > tolerance:
+            regressions += 1
+            flag = '  <-- REGRESSION'
+        print(f"  {row['stage']:<12} {row['resolution']:>10} batch={row['batch_size']:<3} "
+              f"conc={row['concurrency']:<3} p50 {old['p50_ms']:.2f} -> {row['p50_ms']:.2f}ms "
+              f"({delta:+.1%}){flag}")
+    return regressions
+
+
+def parse_resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the weapon detection pipeline')
+    parser.add_argument('--resolutions', nargs='+', type=parse_resolution,
+                        default=[(320, 240), (640, 480), (1280, 720)], help='WIDTHxHEIGHT list')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--iterations', type=int, default=32, help='Images per case')
+    parser.add_argument('--standin', action='store_true', help='Always use the stand-in model')
+    parser.add_argument('--skip-predict', action='store_true', help='Skip the full /predict route')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed p50 slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory(prefix='wars-bench-') as workdir:
+        wars, model_name = setup_app(workdir, args.standin)
+        print(f"Benchmarking with model: {model_name}")
+
+        results = []
+        for width, height in args.resolutions:
+            results.extend(bench_resolution(wars, width, height, args))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'model': model_name,
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads(),
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{regressions} case(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
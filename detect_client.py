@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Client and overhead benchmark for the raw-body prediction API
+
+DetectClient posts frames to /api/detect over one keep-alive connection
+with an API token (create one under Settings > API Tokens) and decodes
+the columnar response (see wire.py). From the command line it sends
+image files and prints their detections.
+
+--benchmark serves the app in-process (stand-in model if the checkpoint
+is missing) and sends the same frames through /predict (multipart and
+JSON, with and without the inline base64 image) and through /api/detect
+(JPEG and raw uint8 bodies). For each it reports the client latency, the
+server time per request and the share of that time spent in inference.
+
+Usage:
+    python detect_client.py --url http://localhost:5000 --token wars_... frames/*.jpg
+    python detect_client.py --benchmark --requests 200
+"""
+
+import argparse
+import http.client
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from urllib.parse import unquote, urlsplit
+
+import wire
+
+
+class DetectClient:
+    """Keep-alive /api/detect client"""
+
+    def __init__(self, url, token, accept=wire.RAW, timeout=30):
+        parts = urlsplit(url)
+        connection = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection(parts.hostname, parts.port, timeout=timeout)
+        self.token = token
+        self.accept = accept
+
+    def detect(self, jpeg=None, array=None, source=None, content_type='image/jpeg'):
+        """Detections for an encoded image or a raw uint8/uint16 array, as a dict of columns"""
+        headers = {'Authorization': f'Bearer {self.token}', 'Accept': self.accept}
+        if array is not None:
+            body = array.tobytes()
+            headers.update({'Content-Type': wire.RAW, 'X-Frame-Dtype': str(array.dtype),
+                            'X-Frame-Shape': ','.join(str(size) for size in array.shape)})
+        else:
+            body = jpeg
+            headers['Content-Type'] = content_type
+        if source:
+            headers['X-Source'] = source
+        self.connection.request('POST', '/api/detect', body=body, headers=headers)
+        response = self.connection.getresponse()
+        payload = response.read()
+        if response.status != 200:
+            raise RuntimeError(f'{response.status}: {payload[:200].decode("utf-8", "replace")}')
+        if self.accept == wire.RAW:
+            result = wire.decode(payload)
+        else:
+            if self.accept == wire.MSGPACK:
+                import msgpack
+                result = msgpack.unpackb(payload)
+                count = result['n']
+                result.update(box=list(struct.unpack(f'<{4 * count}i', result['box'])),
+                              conf=list(struct.unpack(f'<{count}f', result['conf'])),
+                              cls=list(struct.unpack(f'<{count}H', result['cls'])))
+            else:
+                result = json.loads(payload)
+            result['box'] = [result['box'][i:i + 4] for i in range(0, len(result['box']), 4)]
+        names = response.getheader('X-Class-Names')
+        result['classes'] = [unquote(name) for name in names.split(',')] if names else []
+        result['model_version'] = response.getheader('X-Model-Version')
+        return result
+
+    def close(self):
+        self.connection.close()
+
+
+def create_token(wars, username, name='benchmark'):
+    with wars.app.app_context():
+        user = wars.User.query.filter_by(username=username).first()
+        token = 'wars_' + os.urandom(24).hex()
+        wars.db.session.add(wars.ApiToken(user_id=user.id, name=name, token_hash=wars.hash_token(token),
+                                          prefix=token[:12]))
+        wars.db.session.commit()
+        return token
+
+
+def server_seconds(endpoint):
+    """(requests, total server seconds, inference seconds) so far, read from the in-process metrics"""
+    import metrics
+    count, total = metrics.REQUEST_LATENCY.summary(endpoint=endpoint)
+    return count, total, metrics.PREDICT_STAGE_SECONDS.summary(stage='inference')[1]
+
+
+def benchmark(args):
+    import requests
+    from werkzeug.serving import WSGIRequestHandler
+
+    import benchmark as bench
+    import load_test
+
+    os.environ['WARS_DEDUP_MAX_DISTANCE'] = '-1'  # the same frames go through every mode
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    with tempfile.TemporaryDirectory(prefix='wars-detect-') as workdir:
+        server, base_url = load_test.start_in_process_server(workdir, 0)
+        import app as wars
+        token = create_token(wars, 'loadtest')
+        frames = [bench.make_image(args.width, args.height, seed=i) for i in range(8)]
+        jpegs = [bench.encode_jpeg(frame) for frame in frames]
+
+        session = requests.Session()
+        session.post(f'{base_url}/login', data={'username': 'loadtest', 'password': 'loadtest'})
+
+        def predict(i, include_image):
+            data = {'include_image': '1'} if include_image else {}
+            response = session.post(f'{base_url}/predict', files={'image': ('frame.jpg', jpegs[i])}, data=data)
+            response.json()
+
+        client = DetectClient(base_url, token)
+        modes = [
+            ('/predict + base64 image', 'predict', lambda i: predict(i, True)),
+            ('/predict', 'predict', lambda i: predict(i, False)),
+            ('/api/detect jpeg', 'api_detect', lambda i: client.detect(jpeg=jpegs[i])),
+            ('/api/detect raw uint8', 'api_detect', lambda i: client.detect(array=frames[i])),
+        ]
+        print(f"{args.requests} requests per mode, {args.width}x{args.height} frames, one connection")
+        print(f"{'mode':<26} {'client':>9} {'server':>9} {'non-inference':>14} {'inference share':>16}")
+        results = {}
+        for name, endpoint, send in modes:
+            for i in range(3):
+                send(i % len(frames))  # warm up
+            before = server_seconds(endpoint)
+            start = time.perf_counter()
+            for i in range(args.requests):
+                send(i % len(frames))
+            client_s = (time.perf_counter() - start) / args.requests
+            count, total, inferred = (after - first for after, first in zip(server_seconds(endpoint), before))
+            server_s = total / max(count, 1)
+            overhead_s = (total - inferred) / max(count, 1)
+            results[name] = {'client_ms': round(client_s * 1000, 2), 'server_ms': round(server_s * 1000, 2),
+                             'non_inference_ms': round(overhead_s * 1000, 2),
+                             'inference_share': round(inferred / total, 3) if total else None}
+            print(f"{name:<26} {client_s * 1000:>7.2f}ms {server_s * 1000:>7.2f}ms {overhead_s * 1000:>12.2f}ms "
+                  f"{100 * inferred / total if total else 0:>15.0f}%")
+        client.close()
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send frames to /api/detect, or benchmark it against /predict')
+    parser.add_argument('images', nargs='*', help='Image files to send')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--token', default=os.environ.get('WARS_API_TOKEN'), help='API token (or WARS_API_TOKEN)')
+    parser.add_argument('--source', help='Camera/stream name sent as X-Source')
+    parser.add_argument('--accept', default=wire.RAW, choices=[wire.RAW, wire.JSON, wire.MSGPACK])
+    parser.add_argument('--benchmark', action='store_true', help='Compare against /predict on an in-process server')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per mode for --benchmark')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--output', help='Write --benchmark results as JSON')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args)
+        return
+    if not args.token:
+        sys.exit("❌ An API token is required (--token or WARS_API_TOKEN)")
+    client = DetectClient(args.url, args.token, accept=args.accept)
+    for path in args.images:
+        with open(path, 'rb') as f:
+            body = f.read()
+        content_type = 'image/png' if path.lower().endswith('.png') else 'image/jpeg'
+        result = client.detect(jpeg=body, source=args.source, content_type=content_type)
+        found = [f"{result['classes'][cls]} {conf:.2f} {box}"
+                 for box, conf, cls in zip(result['box'], result['conf'], result['cls'])]
+        print(f"{path}: detection {result['detection_id']}, {result['n']} found" +
+              ''.join(f"\n  {line}" for line in found))
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
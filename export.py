@@ -0,0 +1,108 @@
+"""
+Streaming export formats for detection history
+
+The export routes page through detections with keyset queries and hand
+the rows to these generators, which yield the response body piece by
+piece. Nothing holds more than one page of rows or one image, so memory
+stays flat whatever the size of the account.
+
+- CSV: one line per detection, summary columns plus the boxes as JSON.
+- JSON Lines: one object per detection with the full detection list.
+- ZIP: one annotated JPEG per detection plus detections.jsonl. The
+  archive is written to a non-seekable sink, so zipfile puts sizes and
+  CRCs in data descriptors after each file and every file can be sent as
+  soon as it is written. JPEGs are stored without compression.
+"""
+
+import csv
+import json
+import zipfile
+
+COLUMNS = ('id', 'timestamp', 'source', 'model_version', 'image', 'weapons', 'classes',
+           'max_confidence', 'alerts', 'acknowledged', 'detections')
+
+
+def summary(row):
+    """Export record of a detection row dict (see app.export_rows)"""
+    detections = row['detections']
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'].isoformat() if row['timestamp'] else None,
+        'source': row['source'],
+        'model_version': row['model_version'],
+        'image': row['image_path'],
+        'weapons': len(detections),
+        'classes': sorted({detection['class'] for detection in detections}),
+        'max_confidence': max((detection['confidence'] for detection in detections), default=None),
+        'alerts': row['alerts'],
+        'acknowledged': row['acknowledged'],
+        'detections': detections,
+    }
+
+
+class _Line:
+    """File-like target for csv.writer that hands back what was written"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """CSV text, header first, one line per detection"""
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        record = summary(row)
+        record.update(classes=';'.join(record['classes']), alerts=';'.join(record['alerts']),
+                      detections=json.dumps(record['detections'], separators=(',', ':')))
+        yield writer.writerow([record[column] for column in COLUMNS])
+
+
+def json_lines(rows):
+    """JSON Lines, one object per detection"""
+    for row in rows:
+        yield json.dumps(summary(row), separators=(',', ':')) + '\n'
+
+
+class _Sink:
+    """Write-only, non-seekable file for ZipFile that collects bytes until drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_stream(files):
+    """ZIP archive bytes for (name, date_time, data) items, yielded file by file
+
+    data is bytes or an iterable of str lines (for a generated index).
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, date_time, data in files:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            if isinstance(data, bytes):
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, 'w') as entry:
+                    entry.write(data)
+                yield sink.drain()
+                continue
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w') as entry:
+                for line in data:
+                    entry.write(line.encode('utf-8'))
+                    if len(sink.chunks) > 64:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()  # central directory
@@ -6,7 +6,6 @@ Comprehensive fix and run script for the weapon detection system
 import os
 import sys
 import subprocess
-import torch
 
 def install_dependencies():
     """Install required dependencies"""
@@ -43,6 +42,8 @@ def test_model_file():
     print(f"File size: {os.path.getsize(model_path) / (1024*1024):.2f} MB")
     
     try:
+        # Imported here so installing dependencies does not require torch
+        import torch
         print("Testing torch.load...")
         checkpoint = torch.load(model_path, map_location='cpu')
         print(f"✅ torch.load successful")
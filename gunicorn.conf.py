@@ -0,0 +1,57 @@
+"""
+Gunicorn configuration for the weapon detection app
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app (and the model) is loaded once in the master with preload_app and
+inherited by forked workers copy-on-write, so workers start without a cold
+model load. Workers are recycled after a bounded number of requests and
+drained gracefully. Settings can be overridden with WARS_* environment
+variables. Gunicorn does not run on Windows; use `python app.py` there.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('WARS_BIND', '0.0.0.0:5000')
+
+# Preforked workers, each with a few threads so a slow upload does not
+# block page and API requests handled by the same worker
+workers = int(os.environ.get('WARS_WORKERS', max(2, multiprocessing.cpu_count() // 2)))
+worker_class = 'gthread'
+threads = int(os.environ.get('WARS_THREADS', 4))
+
+# Load the app and model in the master before forking
+preload_app = True
+
+# Graceful worker recycling
+max_requests = int(os.environ.get('WARS_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('WARS_MAX_REQUESTS_JITTER', 100))
+graceful_timeout = int(os.environ.get('WARS_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WARS_TIMEOUT', 120))
+# Seconds an idle keep-alive connection stays open; camera gateways posting to /api/detect
+# reuse one connection for their whole stream
+keepalive = int(os.environ.get('WARS_KEEPALIVE', 75))
+
+accesslog = '-'
+errorlog = '-'
+
+# Intra-op threads per worker for torch; keeps workers from oversubscribing cores
+torch_threads = int(os.environ.get('WARS_TORCH_THREADS', max(1, multiprocessing.cpu_count() // workers)))
+
+
+def post_fork(server, worker):
+    """Give each worker its own DB connections and torch thread pool"""
+    from app import app, db
+
+    with app.app_context():
+        # Pooled connections opened in the master must not be shared across processes.
+        # close=False drops them from this child's pool without closing the master's sockets
+        db.engine.dispose(close=False)
+
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    server.log.info("Worker %s ready (torch threads: %s)", worker.pid, torch_threads)
@@ -0,0 +1,410 @@
+"""
+Model loading and image pipeline for weapon detection
+
+This is the only module that imports the ML stack (torch, OpenCV, NumPy,
+PIL). app.py imports it lazily on the first request that needs the model,
+so web-only processes and admin tools start without paying for it.
+"""
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+import metrics
+import profiling
+import weights
+
+# Default checkpoint; more can be loaded side by side through REGISTRY
+model_path = 'improved_weapon_detection_10_epochs.pt'
+# Directory scanned for further checkpoints that admins can load
+model_dir = os.environ.get('WARS_MODEL_DIR', 'models')
+# Load a checkpoint's memory-mapped weights file (weights.py) when it is up to date
+mmap_weights = os.environ.get('WARS_MMAP_WEIGHTS', '1').lower() in ('1', 'true', 'yes')
+# The active model; only REGISTRY.activate() should assign it
+model = None
+
+class ModelVersion:
+    """A loaded checkpoint registered under a version name"""
+    
+    def __init__(self, version, path, model, load_seconds=None):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+class ModelRegistry:
+    """Checkpoints loaded side by side, one of them active
+    
+    Requests take the active ModelVersion once and use it to the end, so
+    activate() is a single reference swap: requests already running finish
+    on the model they started with, new requests get the new one.
+    """
+    
+    def __init__(self):
+        self._versions = {}
+        self._active = None
+        self._lock = threading.Lock()
+    
+    def register(self, version, loaded_model, path=None, load_seconds=None, activate=False):
+        entry = ModelVersion(version, path, loaded_model, load_seconds)
+        with self._lock:
+            self._versions[version] = entry
+        if load_seconds is not None:
+            metrics.MODEL_LOAD_SECONDS.set(load_seconds)
+        if self._active is None or self._active.version != version:
+            metrics.ACTIVE_MODEL.set(0, version=version)
+        if activate:
+            self.activate(version)
+        return entry
+    
+    def load(self, version, path, activate=False):
+        """Load a checkpoint and register it; returns the ModelVersion"""
+        load_start = time.perf_counter()
+        loaded_model = load_checkpoint(path)  # outside the lock, serving continues
+        return self.register(version, loaded_model, path, time.perf_counter() - load_start, activate)
+    
+    def activate(self, version):
+        global model
+        with self._lock:
+            entry = self._versions[version]
+            self._active = entry
+            model = entry.model
+        for other in self.versions():
+            metrics.ACTIVE_MODEL.set(1 if other.version == version else 0, version=other.version)
+        return entry
+    
+    def unload(self, version):
+        with self._lock:
+            if self._active is not None and self._active.version == version:
+                raise ValueError(f"Model {version} is active")
+            self._versions.pop(version, None)
+        metrics.ACTIVE_MODEL.set(0, version=version)
+    
+    def active(self):
+        """The active ModelVersion, or None when no model is loaded"""
+        entry = self._active
+        if entry is None or entry.model is not model:
+            # model was assigned directly (older tools); treat it as unversioned
+            return ModelVersion('unversioned', None, model) if model is not None else None
+        return entry
+    
+    def get(self, version):
+        return self._versions.get(version)
+    
+    def versions(self):
+        with self._lock:
+            return sorted(self._versions.values(), key=lambda entry: entry.loaded_at)
+
+REGISTRY = ModelRegistry()
+
+def version_for(path):
+    """Default version name of a checkpoint: its file name without extension"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def available_checkpoints():
+    """Checkpoints that may be loaded: the default one and those in model_dir"""
+    paths = [model_path] if os.path.exists(model_path) else []
+    if os.path.isdir(model_dir):
+        names = sorted(os.listdir(model_dir))
+        paths.extend(os.path.join(model_dir, name) for name in names if name.endswith('.pt'))
+        # Mapped files without their .pt are versions of their own
+        paths.extend(os.path.join(model_dir, name) for name in names if name.endswith(weights.EXTENSION)
+                     and os.path.splitext(name)[0] + '.pt' not in names)
+    return paths
+
+def load_checkpoint(path, mapped=None):
+    """Load one checkpoint, trying each supported format; raises on failure
+    
+    A .pt checkpoint with an up-to-date memory-mapped weights file next to
+    it is loaded from that file instead, unless mapped is False.
+    """
+    mapped = mmap_weights if mapped is None else mapped
+    if path.endswith(weights.EXTENSION) or (mapped and weights.is_current(weights.mapped_path(path), path)):
+        loaded_model = weights.load(weights.mapped_path(path))
+        print("Model loaded from memory-mapped weights")
+        if hasattr(loaded_model, 'eval'):
+            loaded_model.eval()
+        return loaded_model
+    
+    # Try different loading methods
+    try:
+        # Method 1: Direct torch.load for custom models
+        checkpoint = torch.load(path, map_location='cpu')
+        print("Model loaded using torch.load method")
+        
+        # If it's a state dict, we need to create the model architecture first
+        if isinstance(checkpoint, dict) and 'model' in checkpoint:
+            # This is a YOLOv5 checkpoint
+            loaded_model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=False)
+            loaded_model.load_state_dict(checkpoint['model'].state_dict())
+        else:
+            # Try to load as a complete model
+            loaded_model = checkpoint
+            
+    except Exception as e1:
+        print(f"Method 1 failed: {e1}")
+        try:
+            # Method 2: Using ultralytics YOLO
+            from ultralytics import YOLO
+            loaded_model = YOLO(path)
+            print("Model loaded using ultralytics YOLO method")
+        except Exception as e2:
+            print(f"Method 2 failed: {e2}")
+            try:
+                # Method 3: Using torch.hub with custom path
+                loaded_model = torch.hub.load('ultralytics/yolov5', 'custom', path=path, force_reload=True)
+                print("Model loaded using torch.hub method")
+            except Exception as e3:
+                print(f"Method 3 failed: {e3}")
+                raise Exception(f"All loading methods failed. Last error: {e3}")
+    
+    # Set model to evaluation mode
+    if hasattr(loaded_model, 'eval'):
+        loaded_model.eval()
+    return loaded_model
+
+def load_model():
+    """Load the default checkpoint and make it the active model"""
+    try:
+        # Check if model file exists
+        if not os.path.exists(model_path) and not os.path.exists(weights.mapped_path(model_path)):
+            print(f"Model file not found: {model_path}")
+            return False
+        
+        print(f"Loading model from: {model_path}")
+        entry = REGISTRY.load(version_for(model_path), model_path, activate=True)
+        print("Model loaded successfully!")
+        print(f"Model type: {type(entry.model)}")
+        return True
+        
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        print("Please ensure:")
+        print("1. The model file exists and is valid")
+        print("2. You have the required dependencies installed")
+        print("3. The model is compatible with the current PyTorch version")
+        return False
+
+def preprocess_image(image):
+    """Convert PIL image to format suitable for YOLO"""
+    # Convert PIL to OpenCV format
+    img_array = np.array(image)
+    if len(img_array.shape) == 3:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    return img_array
+
+def postprocess_results(results, original_image, annotate=True):
+    """Process YOLO results and create annotated image"""
+    # Get the first result (assuming single image)
+    result = results[0]
+    
+    # Create a copy of the original image for annotation
+    annotated_img = original_image.copy() if annotate else original_image
+    
+    # Get detection results
+    detections = []
+    if len(result.boxes) > 0:
+        for i, box in enumerate(result.boxes):
+            # Extract box coordinates
+            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+            confidence = box.conf[0].cpu().numpy()
+            class_id = int(box.cls[0].cpu().numpy())
+            
+            # Get class name (you may need to adjust this based on your model's classes)
+            class_name = result.names[class_id] if hasattr(result, 'names') else f"Class_{class_id}"
+            
+            if annotate:
+                # Draw bounding box
+                cv2.rectangle(annotated_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+                
+                # Draw label
+                label = f"{class_name}: {confidence:.2f}"
+                cv2.putText(annotated_img, label, (int(x1), int(y1) - 10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            
+            detections.append({
+                'class': class_name,
+                'confidence': float(confidence),
+                'bbox': [int(x1), int(y1), int(x2), int(y2)]
+            })
+    
+    return annotated_img, detections
+
+def postprocess_ultralytics_results(results, original_image, annotate=True):
+    """Process ultralytics YOLO results and create annotated image"""
+    # Get the first result
+    result = results[0]
+    
+    # Create a copy of the original image for annotation
+    annotated_img = original_image.copy() if annotate else original_image
+    
+    # Get detection results
+    detections = []
+    if result.boxes is not None and len(result.boxes) > 0:
+        boxes = result.boxes.xyxy.cpu().numpy()  # Get boxes
+        confidences = result.boxes.conf.cpu().numpy()  # Get confidences
+        class_ids = result.boxes.cls.cpu().numpy().astype(int)  # Get class IDs
+        
+        for i, (box, confidence, class_id) in enumerate(zip(boxes, confidences, class_ids)):
+            x1, y1, x2, y2 = box
+            
+            # Get class name
+            class_name = result.names[class_id] if hasattr(result, 'names') else f"Class_{class_id}"
+            
+            if annotate:
+                # Draw bounding box
+                cv2.rectangle(annotated_img, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+                
+                # Draw label
+                label = f"{class_name}: {confidence:.2f}"
+                cv2.putText(annotated_img, label, (int(x1), int(y1) - 10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            
+            detections.append({
+                'class': class_name,
+                'confidence': float(confidence),
+                'bbox': [int(x1), int(y1), int(x2), int(y2)]
+            })
+    
+    return annotated_img, detections
+
+def decode_image(stream):
+    """Decode an uploaded image stream into an RGB PIL image"""
+    image = Image.open(stream)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+def _model_or_active(requested):
+    return model if requested is None else requested
+
+def _predict_options(imgsz, conf):
+    options = {}
+    if imgsz:
+        options['imgsz'] = imgsz
+    if conf is not None:
+        options['conf'] = conf
+    return options
+
+def native_imgsz(model=None):
+    """Input size a model runs at when none is given"""
+    model = _model_or_active(model)
+    overrides = getattr(model, 'overrides', None)  # ultralytics YOLO
+    imgsz = overrides.get('imgsz') if isinstance(overrides, dict) else getattr(model, 'imgsz', None)
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz)
+    return imgsz or 640
+
+def run_model(img_array, model=None, imgsz=None, conf=None):
+    """Run a model (the active one by default) on a preprocessed image
+    
+    imgsz overrides the model's input size; boxes still come back in
+    img_array coordinates. conf overrides the confidence threshold of
+    ultralytics models.
+    """
+    model = _model_or_active(model)
+    with torch.no_grad(), profiling.inference_trace():
+        if hasattr(model, 'predict'):  # ultralytics YOLO
+            return model.predict(img_array, verbose=False, **_predict_options(imgsz, conf))
+        else:  # torch.hub YOLO
+            return model(img_array, size=imgsz) if imgsz else model(img_array)
+
+def run_model_batch(img_arrays, model=None, imgsz=None, conf=None):
+    """Run a model (the active one by default) on several preprocessed images in one call
+    
+    Returns one single-image result list per input, ready for postprocess().
+    """
+    model = _model_or_active(model)
+    with torch.no_grad(), profiling.inference_trace():
+        if hasattr(model, 'predict'):  # ultralytics YOLO batches lists natively
+            return [[result] for result in model.predict(list(img_arrays), verbose=False,
+                                                         **_predict_options(imgsz, conf))]
+        else:  # torch.hub YOLO
+            return [model(img_array, size=imgsz) if imgsz else model(img_array) for img_array in img_arrays]
+
+def _screen_hit(results, conf):
+    """Whether a screening result has any box at or above conf"""
+    boxes = results[0].boxes
+    if boxes is None or len(boxes) == 0:
+        return False
+    return bool((boxes.conf >= conf).any())
+
+def run_cascade_batch(img_arrays, model=None, screen_model=None, screen_imgsz=320, screen_conf=0.1, imgsz=None):
+    """Two-stage detection: a cheap screen of every image, the full model on the hits
+    
+    The screen is screen_model (by default the full model itself) at input
+    size screen_imgsz with confidence threshold screen_conf, set low so it
+    passes anything the full model might report. Images with a screen hit
+    run through the full model, batched together, at imgsz (the model's own
+    size by default). Returns one entry per image: the full model's results
+    for hits, None for images the screen cleared, which postprocess() turns
+    into no detections.
+    """
+    model = _model_or_active(model)
+    screen_model = model if screen_model is None else screen_model
+    
+    start = time.perf_counter()
+    screens = run_model_batch(img_arrays, model=screen_model, imgsz=screen_imgsz, conf=screen_conf)
+    metrics.CASCADE_STAGE_SECONDS.observe((time.perf_counter() - start) / len(img_arrays), stage='screen')
+    hits = [i for i, screen in enumerate(screens) if _screen_hit(screen, screen_conf)]
+    metrics.CASCADE_FRAMES.inc(len(img_arrays) - len(hits), result='cleared')
+    
+    results = [None] * len(img_arrays)
+    if hits:
+        start = time.perf_counter()
+        full = run_model_batch([img_arrays[i] for i in hits], model=model, imgsz=imgsz)
+        metrics.CASCADE_STAGE_SECONDS.observe((time.perf_counter() - start) / len(hits), stage='full')
+        metrics.CASCADE_FRAMES.inc(len(hits), result='escalated')
+        for i, result in zip(hits, full):
+            results[i] = result
+    return results
+
+def run_cascade(img_array, model=None, **options):
+    """run_cascade_batch() for one image: its full results, or None if the screen cleared it"""
+    return run_cascade_batch([img_array], model=model, **options)[0]
+
+def postprocess(results, img_array, model=None, annotate=True):
+    """Dispatch to the postprocessor matching the model type
+    
+    With annotate=False no boxes are drawn and img_array itself is returned.
+    results=None (an image the cascade screen cleared) has no detections.
+    """
+    if results is None:
+        return (img_array.copy() if annotate else img_array), []
+    if hasattr(_model_or_active(model), 'predict'):
+        return postprocess_ultralytics_results(results, img_array, annotate)
+    else:
+        return postprocess_results(results, img_array, annotate)
+
+def read_image(path):
+    """Read an image file from disk as a BGR array, or None if unreadable"""
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+def decode_bytes(data):
+    """Decode encoded image bytes as a BGR array, or None if undecodable"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def array_to_frame(array):
+    """8-bit BGR frame from a raw uint8/uint16 grayscale or BGR array
+    
+    16-bit (radiometric thermal) frames are stretched from their own
+    minimum to maximum, the way thermal viewers display them.
+    """
+    if array.dtype == np.uint16:
+        array = cv2.normalize(array, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+    if array.ndim == 3 and array.shape[2] == 1:
+        array = array[:, :, 0]
+    if array.ndim == 2:
+        return cv2.cvtColor(array, cv2.COLOR_GRAY2BGR)
+    return np.ascontiguousarray(array)
+
+def encode_jpeg(image):
+    """Encode a BGR image as JPEG bytes"""
+    _, buffer = cv2.imencode('.jpg', image)
+    return buffer.tobytes()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Inference worker for the database job queue
+
+Polls the app's database for jobs queued through /api/jobs, runs them in
+batches through the active model (with regions of interest and the
+cascade, like the web app), and records the results as Detection and
+Alert rows. Start as many workers as there are CPUs or machines to
+spare. Every worker needs the same database (WARS_DATABASE_URI) and the
+same uploads folder (WARS_UPLOAD_FOLDER, e.g. a network share).
+
+A heartbeat thread reports the worker as alive and extends the leases of
+the jobs it is running. If a worker is killed, its jobs are claimed
+again once their leases expire (WARS_JOB_LEASE_SECONDS). On SIGTERM or
+Ctrl+C the worker finishes its current batch and hands back anything
+unfinished.
+
+Usage:
+    python inference_worker.py --batch-size 4
+    WARS_DATABASE_URI=postgresql://wars@db/wars WARS_UPLOAD_FOLDER=/mnt/wars/uploads python inference_worker.py
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+import dedup
+import job_queue
+
+
+class Worker:
+    """Claims batches of jobs, runs them and records the results"""
+
+    def __init__(self, wars, inference, args):
+        self.wars = wars
+        self.inference = inference
+        self.args = args
+        self.name = args.name or job_queue.worker_name()
+        self.done = 0
+        self.failed = 0
+        self.stop_event = threading.Event()
+
+    def heartbeat_loop(self):
+        with self.wars.app.app_context():
+            while True:
+                try:
+                    self.wars.JOBS.heartbeat(self.name, done=self.done, failed=self.failed)
+                except Exception as e:
+                    self.wars.db.session.rollback()
+                    print(f"⚠️ Heartbeat failed: {e}")
+                if self.stop_event.wait(self.args.heartbeat):
+                    return
+
+    def run(self):
+        jobs = self.wars.JOBS
+        heartbeat = threading.Thread(target=self.heartbeat_loop, name='heartbeat', daemon=True)
+        with self.wars.app.app_context():
+            jobs.heartbeat(self.name)
+            heartbeat.start()
+            print(f"👷 Worker {self.name} polling for jobs (batch={self.args.batch_size})")
+            try:
+                while not self.stop_event.is_set():
+                    # Only claim once a model is there, so jobs do not use up attempts without one
+                    active = self.wait_for_model()
+                    if active is None:
+                        break
+                    batch = jobs.claim(self.name, limit=self.args.batch_size)
+                    if batch:
+                        self.process(batch, active)
+                        continue
+                    if self.args.exit_when_idle:
+                        counts = jobs.counts()
+                        if not counts[job_queue.QUEUED] and not counts[job_queue.RUNNING]:
+                            break
+                    self.stop_event.wait(self.args.poll_interval)
+            finally:
+                self.stop_event.set()
+                heartbeat.join()
+                self.wars.db.session.rollback()
+                jobs.heartbeat(self.name, done=self.done, failed=self.failed)
+                jobs.release(self.name)
+        print(f"✅ Worker {self.name} stopped: done={self.done} failed={self.failed}")
+
+    def wait_for_model(self):
+        """The active model version, waiting while none is loaded (startup, a model swap)
+
+        Returns None only if the worker is stopping and there is still no model.
+        """
+        delay = 1.0
+        while True:
+            try:
+                active = self.wars.active_model(self.inference)
+            except Exception as e:
+                self.wars.db.session.rollback()
+                print(f"⚠️ Could not get the active model: {e}")
+                active = None
+            if active is not None:
+                return active
+            if self.stop_event.is_set():
+                return None
+            print(f"⏳ No model loaded, retrying in {delay:.0f}s")
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, 30.0)
+
+    def process(self, batch, active):
+        wars, jobs = self.wars, self.wars.JOBS
+        runnable = []
+        for job in batch:
+            try:
+                with open(os.path.join(wars.UPLOAD_FOLDER, job.image_path), 'rb') as f:
+                    image = self.inference.decode_bytes(f.read())
+            except OSError:
+                image = None
+            if image is None:
+                jobs.fail(job, 'Image missing or unreadable', permanent=True)
+                self.failed += 1
+                continue
+            runnable.append((job, image))
+        if not runnable:
+            return
+
+        try:
+            found = wars.detect_frames(self.inference, active, [image for _, image in runnable],
+                                       [(job.user_id, job.source) for job, _ in runnable])
+        except Exception as e:
+            print(f"❌ Inference failed for batch of {len(runnable)}: {e}")
+            for job, _ in runnable:
+                jobs.fail(job, e)
+                self.failed += 1
+            return
+
+        for (job, image), detections in zip(runnable, found):
+            try:
+                detection, _ = wars.record_detection(job.user_id, job.image_path, detections, source=job.source,
+                                                     model_version=active.version, image_is_original=True,
+                                                     image_hash=dedup.dhash(image))
+                if jobs.complete(job, detection.id):
+                    wars.db.session.commit()
+                    self.done += 1
+                else:
+                    # Our lease expired and another worker took the job over
+                    wars.db.session.rollback()
+                    print(f"⚠️ Lost the lease on job {job.id}; result discarded")
+            except Exception as e:
+                wars.db.session.rollback()
+                print(f"❌ Failed to record job {job.id}: {e}")
+                jobs.fail(job, e)
+                self.failed += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run queued inference jobs from the app database')
+    parser.add_argument('--name', help='Worker name (default: host-pid-random)')
+    parser.add_argument('--batch-size', type=int, default=4, help='Jobs claimed and run per model call')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls of an empty queue')
+    parser.add_argument('--heartbeat', type=float, default=None,
+                        help='Seconds between heartbeats (default: a third of the job lease)')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--standin', action='store_true', help='Use the stand-in TinyDetector')
+    parser.add_argument('--exit-when-idle', action='store_true', help='Stop once no jobs are queued or running')
+    args = parser.parse_args()
+
+    import app as wars
+
+    config = {}
+    if wars.app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Several worker processes share the file; wait for the write lock instead of failing
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    wars.create_app(config, load_model_on_start=not args.standin)
+    if args.heartbeat is None:
+        args.heartbeat = max(1.0, wars.app.config['JOB_LEASE_SECONDS'] / 3)
+
+    inference = wars.get_inference()
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    if args.standin:
+        from tiny_model import TinyDetector
+        inference.REGISTRY.register('standin', TinyDetector(), activate=True)
+    if inference.model is None:
+        sys.exit("❌ Model could not be loaded")
+
+    worker = Worker(wars, inference, args)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop_event.set())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop_event.set()
+
+
+if __name__ == '__main__':
+    main()
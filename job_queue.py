@@ -0,0 +1,155 @@
+"""
+Database-backed inference job queue
+
+Uploads sent to /api/jobs are stored and queued as InferenceJob rows, and
+any number of inference workers (inference_worker.py), on any machine
+that reaches the database and the uploads folder, claim and run them.
+Results land in the usual Detection and Alert tables.
+
+Claiming is one UPDATE that takes a batch of rows and stamps them with
+the worker's name, a fresh lease token and a lease expiry time:
+
+- PostgreSQL selects the rows with FOR UPDATE SKIP LOCKED, so workers
+  claiming at the same time take different rows without waiting.
+- SQLite allows one writer at a time, so the UPDATE is atomic by itself.
+
+While a worker runs jobs, its heartbeat extends their leases. If a worker
+dies, its leases expire and the jobs are claimed again. A job that fails
+is retried with exponential backoff until max_attempts. A worker only
+records a result while it still holds the job's lease token: the result
+and the status change commit together, and a worker whose lease was taken
+over rolls back instead of writing a duplicate Detection.
+
+Only the standard library is imported; the app passes in its database
+and models.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+STATUSES = (QUEUED, RUNNING, DONE, FAILED)
+
+
+def worker_name():
+    """Unique default name for a worker process"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """Queue operations on the InferenceJob and InferenceWorker tables"""
+
+    def __init__(self, db, job_model, worker_model, lease_seconds=30, max_attempts=3, retry_backoff=5.0):
+        self.db = db
+        self.Job = job_model
+        self.Worker = worker_model
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    def configure(self, lease_seconds, max_attempts, retry_backoff):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+    def enqueue(self, user_id, image_path, source=None):
+        """Add a job for a stored upload; the caller commits"""
+        job = self.Job(user_id=user_id, image_path=image_path, source=source, status=QUEUED,
+                       max_attempts=self.max_attempts, available_at=datetime.utcnow())
+        self.db.session.add(job)
+        self.db.session.flush()
+        return job
+
+    def claim(self, worker, limit=1):
+        """Lease up to limit runnable jobs to a worker and return them, committed"""
+        now = datetime.utcnow()
+        self._fail_exhausted(now)
+        token = uuid.uuid4().hex
+        table = self.Job.__table__.name
+        runnable = (f"SELECT id FROM {table} "
+                    f"WHERE (status = :queued AND available_at <= :now) "
+                    f"OR (status = :running AND lease_expires_at < :now) "
+                    f"ORDER BY id LIMIT :limit")
+        if self.db.session.get_bind().dialect.name == 'postgresql':
+            runnable += " FOR UPDATE SKIP LOCKED"
+        claim = self.db.text(
+            f"UPDATE {table} SET status = :running, lease_owner = :worker, lease_token = :token, "
+            f"lease_expires_at = :expires, attempts = attempts + 1, started_at = :now "
+            f"WHERE id IN ({runnable})"
+        ).bindparams(self.db.bindparam('now', type_=self.db.DateTime),
+                     self.db.bindparam('expires', type_=self.db.DateTime))
+        self.db.session.execute(claim, {'queued': QUEUED, 'running': RUNNING, 'now': now, 'limit': limit,
+                                        'worker': worker, 'token': token,
+                                        'expires': now + timedelta(seconds=self.lease_seconds)})
+        self.db.session.commit()
+        return self.Job.query.filter_by(lease_token=token).order_by(self.Job.id).all()
+
+    def _fail_exhausted(self, now):
+        """Give up on jobs whose lease expired on their last attempt"""
+        self.Job.query.filter(self.Job.status == RUNNING, self.Job.lease_expires_at < now,
+                              self.Job.attempts >= self.Job.max_attempts) \
+            .update({'status': FAILED, 'finished_at': now, 'lease_token': None,
+                     'error': 'Worker lost on the last attempt (lease expired)'},
+                    synchronize_session=False)
+
+    def heartbeat(self, worker, hostname=None, pid=None, done=0, failed=0):
+        """Record that a worker is alive and extend the leases of its running jobs"""
+        now = datetime.utcnow()
+        row = self.Worker.query.get(worker)
+        if row is None:
+            row = self.Worker(name=worker, hostname=hostname or socket.gethostname(), pid=pid or os.getpid(),
+                              started_at=now)
+            self.db.session.add(row)
+        row.last_heartbeat = now
+        row.jobs_done = done
+        row.jobs_failed = failed
+        row.stopped_at = None
+        self.Job.query.filter_by(lease_owner=worker, status=RUNNING) \
+            .update({'lease_expires_at': now + timedelta(seconds=self.lease_seconds)},
+                    synchronize_session=False)
+        self.db.session.commit()
+
+    def complete(self, job, detection_id):
+        """Mark a job done in the caller's transaction; False if its lease was lost
+
+        The caller commits on True and rolls back on False, so the result is
+        only kept by the worker that still holds the lease.
+        """
+        updated = self.Job.query.filter_by(id=job.id, lease_token=job.lease_token, status=RUNNING) \
+            .update({'status': DONE, 'detection_id': detection_id, 'finished_at': datetime.utcnow(),
+                     'lease_token': None, 'error': None}, synchronize_session=False)
+        return updated == 1
+
+    def fail(self, job, error, permanent=False):
+        """Retry a job after a backoff, or fail it for good; commits"""
+        now = datetime.utcnow()
+        if permanent or job.attempts >= job.max_attempts:
+            values = {'status': FAILED, 'finished_at': now}
+        else:
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            values = {'status': QUEUED, 'available_at': now + timedelta(seconds=delay)}
+        values.update({'error': str(error)[:500], 'lease_token': None})
+        self.Job.query.filter_by(id=job.id, lease_token=job.lease_token) \
+            .update(values, synchronize_session=False)
+        self.db.session.commit()
+
+    def release(self, worker):
+        """Hand a stopping worker's unfinished jobs back to the queue; commits"""
+        now = datetime.utcnow()
+        self.Job.query.filter_by(lease_owner=worker, status=RUNNING) \
+            .update({'status': QUEUED, 'lease_token': None, 'available_at': now,
+                     'attempts': self.Job.attempts - 1}, synchronize_session=False)
+        row = self.Worker.query.get(worker)
+        if row is not None:
+            row.stopped_at = now
+        self.db.session.commit()
+
+    def counts(self):
+        """Number of jobs per status"""
+        rows = self.db.session.query(self.Job.status, self.db.func.count(self.Job.id)) \
+            .group_by(self.Job.status).all()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(rows)
+        return counts
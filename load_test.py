@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Load generator and concurrency stress test for the Flask app
+
+Virtual users log in, then send a weighted mix of /predict uploads and
+dashboard, alerts, profile and /api/alerts hits, paced to a target total
+request rate. Each step of --users runs for --duration seconds and reports
+throughput, error rate and latency percentiles per route, so running with
+an increasing user ladder shows where a single node saturates and which
+route degrades first.
+
+By default the app is served in-process on a local port (werkzeug's
+threaded server, scratch database, stand-in model if the checkpoint is
+missing). Pass --url to target an already running server instead.
+
+Usage:
+    python load_test.py --users 1 4 16 32 --duration 20 --rate 50
+    python load_test.py --url http://localhost:5000 --username admin --password admin123
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+
+DEFAULT_MIX = 'predict=60,dashboard=15,alerts=10,profile=5,api_alerts=10'
+
+ROUTES = {
+    'predict': ('POST', '/predict'),
+    'dashboard': ('GET', '/dashboard'),
+    'alerts': ('GET', '/alerts'),
+    'profile': ('GET', '/profile'),
+    'api_alerts': ('GET', '/api/alerts'),
+    'health': ('GET', '/health'),
+}
+
+
+class Pacer:
+    """Spaces requests from all virtual users to a target total rate"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            slot = max(self._next, time.perf_counter())
+            self._next = slot + self.interval
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Stats:
+    """Thread-safe per-route latency and status collection"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, latency, status, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            counts = self.statuses.setdefault(route, {})
+            counts[status] = counts.get(status, 0) + 1
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed):
+        rows = {}
+        for route, latencies in sorted(self.latencies.items()):
+            values = np.asarray(latencies) * 1000.0
+            rows[route] = {
+                'requests': len(latencies),
+                'throughput_rps': round(len(latencies) / elapsed, 2),
+                'error_rate': round(self.errors.get(route, 0) / len(latencies), 4),
+                'statuses': {str(k): v for k, v in sorted(self.statuses[route].items(), key=str)},
+                'p50_ms': round(float(np.percentile(values, 50)), 2),
+                'p95_ms': round(float(np.percentile(values, 95)), 2),
+                'p99_ms': round(float(np.percentile(values, 99)), 2),
+                'max_ms': round(float(values.max()), 2),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        errors = sum(self.errors.values())
+        return {
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+            'error_rate': round(errors / total, 4) if total else 0,
+            'routes': rows,
+        }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        route, weight = part.split('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route '{route}', choose from {sorted(ROUTES)}")
+        mix[route] = float(weight)
+    return mix
+
+
+def load_corpus(pattern, count):
+    """JPEG payloads from a directory/glob, or synthetic frames"""
+    if pattern:
+        paths = glob.glob(os.path.join(pattern, '*')) if os.path.isdir(pattern) else glob.glob(pattern)
+        paths = [p for p in sorted(paths) if p.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+        if not paths:
+            sys.exit(f"No images found for {pattern}")
+        payloads = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                payloads.append((os.path.basename(path), f.read()))
+        return payloads
+
+    from benchmark import make_image, encode_jpeg
+    return [(f"synthetic_{i}.jpg", encode_jpeg(make_image(640, 480, seed=i))) for i in range(count)]
+
+
+def start_in_process_server(workdir, port):
+    """Serve the app from a background thread against scratch storage"""
+    os.environ['WARS_UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+
+    import app as wars
+    import inference
+    from werkzeug.serving import make_server
+    from werkzeug.security import generate_password_hash
+
+    # The corpus repeats; with dedup on most requests would skip inference
+    wars.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'loadtest.db'),
+                     'DEDUP_MAX_DISTANCE': -1},
+                    load_model_on_start=False)
+
+    if not os.path.exists(inference.model_path):
+        from tiny_model import TinyDetector
+        inference.REGISTRY.register('standin', TinyDetector(), activate=True)
+        print("Checkpoint not found, serving the stand-in TinyDetector")
+    else:
+        inference.load_model()
+
+    with wars.app.app_context():
+        wars.db.session.add(wars.User(username='loadtest', email='loadtest@localhost',
+                                      password_hash=generate_password_hash('loadtest')))
+        wars.db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', port, wars.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def virtual_user(base_url, args, mix, corpus, pacer, stats, deadline, user_index):
+    """One logged-in client sending the request mix until the deadline"""
+    rng = random.Random(args.seed + user_index)
+    http = requests.Session()
+    try:
+        response = http.post(f"{base_url}/login", allow_redirects=False, timeout=args.timeout,
+                             data={'username': args.username, 'password': args.password})
+        if response.status_code != 302 or 'session' not in http.cookies:
+            stats.record('login', 0.0, response.status_code, False)
+            return
+    except requests.RequestException:
+        stats.record('login', 0.0, 'exception', False)
+        return
+
+    routes, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        pacer.wait()
+        if time.perf_counter() >= deadline:
+            break
+        route = rng.choices(routes, weights)[0]
+        method, path = ROUTES[route]
+        start = time.perf_counter()
+        try:
+            if route == 'predict':
+                name, payload = corpus[rng.randrange(len(corpus))]
+                response = http.post(f"{base_url}{path}", files={'image': (name, payload, 'image/jpeg')},
+                                     timeout=args.timeout)
+            else:
+                response = http.request(method, f"{base_url}{path}", allow_redirects=False,
+                                        timeout=args.timeout)
+            status = response.status_code
+            ok = status == 200
+        except requests.RequestException:
+            status, ok = 'exception', False
+        stats.record(route, time.perf_counter() - start, status, ok)
+
+
+def run_step(base_url, args, mix, corpus, users):
+    stats = Stats()
+    pacer = Pacer(args.rate)
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=virtual_user,
+                                args=(base_url, args, mix, corpus, pacer, stats, deadline, i),
+                                daemon=True)
+               for i in range(users)]
+    start = time.perf_counter()
+    for i, thread in enumerate(threads):
+        thread.start()
+        if args.ramp_up:
+            time.sleep(args.ramp_up / users)
+    for thread in threads:
+        thread.join(args.duration + args.timeout + 5)
+    return stats.report(time.perf_counter() - start)
+
+
+def print_step(users, report):
+    print(f"\n=== {users} virtual user(s): {report['throughput_rps']:.1f} req/s, "
+          f"error rate {report['error_rate']:.2%} ===")
+    print(f"  {'route':<12} {'reqs':>6} {'req/s':>8} {'errors':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, row in report['routes'].items():
+        print(f"  {route:<12} {row['requests']:>6} {row['throughput_rps']:>8.1f} {row['error_rate']:>8.2%} "
+              f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms")
+
+
+def find_saturation(steps, max_error_rate):
+    """First user count where throughput stops growing or errors appear"""
+    previous = None
+    for step in steps:
+        report = step['report']
+        if report['error_rate'] > max_error_rate:
+            return step['users'], 'error rate above threshold'
+        if previous and report['throughput_rps'] < previous['throughput_rps'] * 1.05:
+            return step['users'], 'throughput stopped increasing'
+        previous = report
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the weapon detection app')
+    parser.add_argument('--url', help='Target server; omit to serve the app in-process')
+    parser.add_argument('--port', type=int, default=0, help='Port for the in-process server')
+    parser.add_argument('--username', default='loadtest')
+    parser.add_argument('--password', default='loadtest')
+    parser.add_argument('--users', nargs='+', type=int, default=[1, 4, 16],
+                        help='Virtual user counts, run as successive steps')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per step')
+    parser.add_argument('--rate', type=float, default=0, help='Target total req/s (0 = unpaced)')
+    parser.add_argument('--ramp-up', type=float, default=0, help='Seconds to start all users')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--images', help='Directory or glob of images to upload')
+    parser.add_argument('--corpus-size', type=int, default=16, help='Synthetic images when --images is unset')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.images, args.corpus_size)
+
+    server = None
+    workdir = tempfile.TemporaryDirectory(prefix='wars-load-')
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        server, base_url = start_in_process_server(workdir.name, args.port)
+        args.username, args.password = 'loadtest', 'loadtest'
+    print(f"Target: {base_url} | mix: {args.mix} | rate: {args.rate or 'unpaced'} req/s")
+
+    steps = []
+    try:
+        for users in args.users:
+            report = run_step(base_url, args, args.mix, corpus, users)
+            print_step(users, report)
+            steps.append({'users': users, 'report': report})
+    finally:
+        if server is not None:
+            server.shutdown()
+        workdir.cleanup()
+
+    saturation, reason = find_saturation(steps, args.max_error_rate)
+    if saturation:
+        worst = max(steps[-1]['report']['routes'].items(), key=lambda item: item[1]['p95_ms'])[0]
+        print(f"\nSaturation at {saturation} user(s): {reason}. Slowest route: {worst}")
+    else:
+        print("\nNo saturation observed; try more users or a higher rate")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {'timestamp': datetime.utcnow().isoformat(), 'target': base_url,
+                         'mix': args.mix, 'rate': args.rate, 'duration': args.duration},
+                'steps': steps,
+                'saturation_users': saturation,
+            }, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""
+Lightweight Prometheus-style metrics for the weapon detection app
+
+Exposes counters, gauges and histograms in the Prometheus text format
+without pulling in an extra dependency. Metrics live in process memory,
+so each server process reports its own numbers.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, tuned for the predict pipeline stages
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREDICT_STAGES = ('decode', 'dedup', 'motion_gate', 'inference', 'postprocess',
+                  'annotate', 'image_write', 'db_commit', 'base64_encode')
+
+
+def _label_key(labelnames, labels):
+    """Build a hashable key for a label set in declared order"""
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    """Render a label set as {a="x",b="y"}"""
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    body = ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing counter"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, optionally computed on scrape"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increment while the block runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def collect(self):
+        if self._callback is not None:
+            self.set(self._callback())
+        return super().collect()
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels):
+        """Return (count, sum) for a label set"""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if series is None:
+            return 0, 0.0
+        return series[2], series[1]
+
+    def mean(self, **labels):
+        count, total = self.summary(**labels)
+        return total / count if count else None
+
+    def collect(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket"
+                             f"{_format_labels(self.labelnames, key, [('le', _format_value(bound))])}"
+                             f" {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+def process_resident_memory_bytes():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, AttributeError):
+        return 0
+
+
+REGISTRY = Registry()
+
+REQUESTS_TOTAL = REGISTRY.counter(
+    'wars_http_requests_total', 'HTTP requests handled', ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = REGISTRY.histogram(
+    'wars_http_request_duration_seconds', 'HTTP request latency', ('endpoint',))
+PREDICT_STAGE_SECONDS = REGISTRY.histogram(
+    'wars_predict_stage_duration_seconds', 'Latency of each predict() stage', ('stage',))
+QUEUE_DEPTH = REGISTRY.gauge(
+    'wars_inference_queue_depth', 'Predict requests waiting for or running inference')
+CACHE_HITS = REGISTRY.counter(
+    'wars_cache_hits_total', 'Cache hits by cache name', ('cache',))
+CACHE_MISSES = REGISTRY.counter(
+    'wars_cache_misses_total', 'Cache misses by cache name', ('cache',))
+ALERTS_TOTAL = REGISTRY.counter(
+    'wars_alerts_total', 'Alert rows created, updated in place by tracking, or acknowledged', ('action',))
+MODEL_LOAD_SECONDS = REGISTRY.gauge(
+    'wars_model_load_seconds', 'Wall-clock time of the last successful model load')
+ACTIVE_MODEL = REGISTRY.gauge(
+    'wars_model_active', 'Registered model versions: 1 for the active one, 0 for standby', ('version',))
+MODEL_INFERENCE_SECONDS = REGISTRY.histogram(
+    'wars_model_inference_duration_seconds', 'Inference latency per model version', ('version',))
+SHADOW_EVALUATIONS = REGISTRY.counter(
+    'wars_shadow_evaluations_total', 'Shadow model comparisons by outcome', ('result',))
+DEGRADATION_LEVEL = REGISTRY.gauge(
+    'wars_degradation_level', 'Degradation level of the latest admitted /predict request (0 = normal, 4 = shed)')
+ADMISSIONS_TOTAL = REGISTRY.counter(
+    'wars_predict_admissions_total', '/predict admission decisions by degradation level', ('level',))
+SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    'wars_scheduler_queue_depth', 'Requests waiting for an inference slot', ('priority',))
+SCHEDULER_WAIT_SECONDS = REGISTRY.histogram(
+    'wars_scheduler_wait_seconds', 'Time spent waiting for an inference slot', ('priority',))
+SCHEDULER_PROMOTIONS = REGISTRY.counter(
+    'wars_scheduler_starvation_promotions_total', 'Waiters served ahead of higher classes after max wait',
+    ('priority',))
+INFERENCE_SLOTS_BUSY = REGISTRY.gauge(
+    'wars_inference_slots_busy', 'Inference slots currently held')
+DEDUP_LOOKUPS = REGISTRY.counter(
+    'wars_dedup_lookups_total', 'Near-duplicate lookups of /predict uploads by outcome', ('result',))
+CASCADE_FRAMES = REGISTRY.counter(
+    'wars_cascade_frames_total', 'Frames the cascade screen cleared or escalated to the full model', ('result',))
+CASCADE_STAGE_SECONDS = REGISTRY.histogram(
+    'wars_cascade_stage_duration_seconds', 'Per-image latency of each cascade stage', ('stage',))
+MOTION_GATE_FRAMES = REGISTRY.counter(
+    'wars_motion_gate_frames_total', 'Frames seen by the motion gate: reused, or why the model ran', ('result',))
+NOTIFICATIONS = REGISTRY.counter(
+    'wars_notifications_total', 'Notification messages by destination kind and outcome', ('kind', 'result'))
+NOTIFIED_ALERTS = REGISTRY.counter(
+    'wars_notified_alerts_total', 'Alerts delivered to notification destinations, alone or in a digest', ('kind',))
+PROCESS_MEMORY = REGISTRY.gauge(
+    'wars_process_resident_memory_bytes', 'Resident memory of this process',
+    callback=process_resident_memory_bytes)
+PROCESS_START_TIME = REGISTRY.gauge(
+    'wars_process_start_time_seconds', 'Start time of this process since the epoch')
+PROCESS_START_TIME.set(time.time())
+
+
+def cascade_summary():
+    """Hit rates and estimated time saved by cascade detection, for display
+
+    The saving is what the cleared frames would have cost in the full model,
+    less the time spent screening every frame.
+    """
+    cleared = CASCADE_FRAMES.value(result='cleared')
+    escalated = CASCADE_FRAMES.value(result='escalated')
+    frames = cleared + escalated
+    if not frames:
+        return None
+    screen_mean = CASCADE_STAGE_SECONDS.mean(stage='screen') or 0.0
+    full_mean = CASCADE_STAGE_SECONDS.mean(stage='full')
+    saved = None
+    if full_mean is not None:
+        saved = cleared * full_mean - frames * screen_mean
+    return {
+        'frames': int(frames),
+        'cleared': int(cleared),
+        'escalated': int(escalated),
+        'escalation_rate': escalated / frames,
+        'screen_latency': format_seconds(screen_mean),
+        'full_latency': format_seconds(full_mean),
+        'saved_seconds': saved,
+        'saved_fraction': saved / (frames * full_mean) if saved is not None and full_mean else None,
+    }
+
+
+def format_seconds(value):
+    """Human friendly latency for the profile page"""
+    if value is None:
+        return 'N/A'
+    if value < 1:
+        return f"{value * 1000:.0f}ms"
+    return f"{value:.1f}s"
+
+
+def stage_means():
+    """Average latency per predict stage, for display"""
+    return {stage: format_seconds(PREDICT_STAGE_SECONDS.mean(stage=stage))
+            for stage in PREDICT_STAGES}
@@ -0,0 +1,120 @@
+"""
+Motion gating: skip inference on frames where nothing has changed
+
+Most consecutive frames from a fixed thermal camera are nearly identical.
+For each source the gate keeps a small grayscale thumbnail of the last
+frame that went through the model, together with that frame's
+detections. A new frame is shrunk the same way and compared pixel by
+pixel with that reference frame (a background subtraction against the
+last analysed frame). If the changed fraction is below the threshold, the
+reference detections are reused and the model is skipped.
+
+Comparing against the last analysed frame rather than the previous one
+means slow drift still adds up and eventually triggers a pass. Each
+thumbnail has its mean subtracted, so a camera's automatic gain
+adjustments do not count as motion. Every force_every-th frame of a
+source goes through the model whatever the gate says, so reused results
+can never go stale for long.
+
+State is per process and bounded to max_sources sources, least recently
+seen dropped first. NumPy and OpenCV are imported on first use.
+"""
+
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+class _SourceState:
+    def __init__(self, thumbnail, detections):
+        self.thumbnail = thumbnail
+        self.detections = detections
+        self.reused = 0  # frames answered from the reference since it was analysed
+
+
+class MotionGate:
+    """Per-source frame differencing in front of the model"""
+
+    def __init__(self, threshold=0.01, force_every=10, pixel_delta=20, width=96, max_sources=1024):
+        self.threshold = threshold      # changed fraction of thumbnail pixels that counts as motion
+        self.force_every = force_every  # run the model at least once every this many frames
+        self.pixel_delta = pixel_delta  # grey-level difference at which a pixel counts as changed
+        self.width = width
+        self.max_sources = max_sources
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, threshold, force_every):
+        self.threshold = threshold
+        self.force_every = max(1, force_every)
+
+    @property
+    def enabled(self):
+        return self.threshold > 0 and self.force_every > 1
+
+    def thumbnail(self, img_array):
+        """Small zero-mean grayscale copy of a BGR or grayscale frame"""
+        import cv2
+        import numpy as np
+
+        height, width = img_array.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        # Shrink first, so the colour conversion only touches the thumbnail
+        small = cv2.resize(img_array, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = small.astype(np.float32)
+        if img_array.dtype == np.uint16:
+            small *= 255.0 / 65535.0
+        return small - small.mean()
+
+    def changed_fraction(self, reference, thumbnail):
+        import numpy as np
+
+        if reference.shape != thumbnail.shape:
+            return 1.0
+        return np.count_nonzero(np.abs(thumbnail - reference) > self.pixel_delta) / thumbnail.size
+
+    def check(self, source, img_array):
+        """Return (detections, thumbnail)
+
+        detections is a copy of the reference frame's detections when the frame
+        can skip the model, otherwise None; pass thumbnail to record() with the
+        new detections after running the model.
+        """
+        if not self.enabled or source is None:
+            return None, None
+        thumbnail = self.thumbnail(img_array)
+        with self._lock:
+            state = self._sources.get(source)
+            if state is None:
+                result = 'new'
+            elif state.reused + 1 >= self.force_every:
+                result = 'forced'
+            elif self.changed_fraction(state.thumbnail, thumbnail) >= self.threshold:
+                result = 'motion'
+            else:
+                state.reused += 1
+                self._sources.move_to_end(source)
+                metrics.MOTION_GATE_FRAMES.inc(result='reused')
+                return [dict(d) for d in state.detections], thumbnail
+        metrics.MOTION_GATE_FRAMES.inc(result=result)
+        return None, thumbnail
+
+    def record(self, source, thumbnail, detections):
+        """Make an analysed frame the new reference for its source"""
+        if thumbnail is None:
+            return
+        with self._lock:
+            self._sources[source] = _SourceState(thumbnail, [dict(d) for d in detections])
+            self._sources.move_to_end(source)
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+
+    def forget(self, source):
+        with self._lock:
+            self._sources.pop(source, None)
+
+
+MOTION_GATE = MotionGate()
@@ -0,0 +1,158 @@
+"""
+Opt-in request profiling for slow /predict calls
+
+A request is "armed" when it is sampled (PROFILE_SAMPLE_RATE) or when a
+latency threshold is configured (PROFILE_SLOW_THRESHOLD). Armed requests
+run under cProfile, and their inference step under the torch profiler.
+The artifacts are kept only if the request was sampled or turned out
+slower than the threshold, so threshold mode pays the profiler overhead
+on every request and is meant to be switched on while hunting hot spots.
+"""
+
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, g, has_app_context
+
+PSTATS_SUFFIX = '.pstats'
+TRACE_SUFFIX = '.trace.json'
+
+_cleanup_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Profiling state for one armed request"""
+
+    def __init__(self, endpoint, sampled):
+        self.endpoint = endpoint
+        self.sampled = sampled
+        self.profile_id = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}"
+        self.cprofile = cProfile.Profile()
+        self.torch_profiler = None
+        self.start = None
+        self.duration = None
+
+
+def _settings():
+    config = current_app.config
+    return (float(config.get('PROFILE_SAMPLE_RATE') or 0),
+            float(config.get('PROFILE_SLOW_THRESHOLD') or 0),
+            config.get('PROFILE_DIR', 'profiles'),
+            int(config.get('PROFILE_MAX_ARTIFACTS', 200)))
+
+
+def profile_request(endpoint):
+    """Decorator that profiles sampled or slow calls of a view"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            sample_rate, threshold, profile_dir, max_artifacts = _settings()
+            sampled = sample_rate > 0 and random.random() < sample_rate
+            if not sampled and threshold <= 0:
+                return view(*args, **kwargs)
+
+            request_profile = RequestProfile(endpoint, sampled)
+            g.request_profile = request_profile
+            request_profile.start = time.perf_counter()
+            request_profile.cprofile.enable()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                request_profile.cprofile.disable()
+                request_profile.duration = time.perf_counter() - request_profile.start
+                g.pop('request_profile', None)
+                if sampled or request_profile.duration >= threshold:
+                    try:
+                        save_artifacts(request_profile, profile_dir, max_artifacts)
+                    except Exception as e:
+                        print(f"Failed to save profile {request_profile.profile_id}: {e}")
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def inference_trace():
+    """Run the block under the torch profiler when the current request is armed"""
+    request_profile = g.get('request_profile') if has_app_context() else None
+    if request_profile is None:
+        yield
+        return
+
+    try:
+        from torch.profiler import profile, ProfilerActivity
+    except ImportError:
+        yield
+        return
+
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as torch_profiler:
+        yield
+    request_profile.torch_profiler = torch_profiler
+
+
+def save_artifacts(request_profile, profile_dir, max_artifacts):
+    """Write the pstats dump and Chrome trace for a request"""
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, request_profile.profile_id)
+    request_profile.cprofile.dump_stats(base + PSTATS_SUFFIX)
+    if request_profile.torch_profiler is not None:
+        request_profile.torch_profiler.export_chrome_trace(base + TRACE_SUFFIX)
+    print(f"Saved profile {request_profile.profile_id} "
+          f"({request_profile.duration * 1000:.0f}ms, sampled={request_profile.sampled})")
+    _prune(profile_dir, max_artifacts)
+
+
+def _prune(profile_dir, max_artifacts):
+    """Keep only the newest max_artifacts profiles"""
+    with _cleanup_lock:
+        profiles = list_artifacts(profile_dir)
+        for artifact in profiles[max_artifacts:]:
+            for filename in artifact['files']:
+                try:
+                    os.remove(os.path.join(profile_dir, filename))
+                except OSError:
+                    pass
+
+
+def list_artifacts(profile_dir):
+    """List stored profiles, newest first"""
+    if not os.path.isdir(profile_dir):
+        return []
+
+    artifacts = {}
+    for filename in os.listdir(profile_dir):
+        for suffix in (PSTATS_SUFFIX, TRACE_SUFFIX):
+            if filename.endswith(suffix):
+                profile_id = filename[:-len(suffix)]
+                artifact = artifacts.setdefault(profile_id, {'id': profile_id, 'files': [], 'size': 0})
+                path = os.path.join(profile_dir, filename)
+                artifact['files'].append(filename)
+                artifact['size'] += os.path.getsize(path)
+                artifact['modified'] = datetime.fromtimestamp(os.path.getmtime(path))
+
+    for artifact in artifacts.values():
+        artifact['files'].sort()
+    return sorted(artifacts.values(), key=lambda a: a['id'], reverse=True)
+
+
+def top_functions(profile_dir, profile_id, limit=25):
+    """Return the hottest functions of a stored pstats dump by cumulative time"""
+    import pstats
+
+    stats = pstats.Stats(os.path.join(profile_dir, profile_id + PSTATS_SUFFIX))
+    rows = []
+    for (filename, line, name), (cc, nc, tottime, cumtime, callers) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({name})",
+            'calls': nc,
+            'tottime': tottime,
+            'cumtime': cumtime
+        })
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Multi-process scaling test for the database job queue
+
+Queues --jobs synthetic frames in a scratch SQLite database, then drains
+the queue with 1, 2, 4, ... inference_worker.py processes (stand-in model
+by default) and reports jobs per second for each worker count. Every run
+checks that each job finished exactly once: one Detection per job, none
+lost or duplicated.
+
+With --kill, one worker of each run is SIGKILLed in its first batch and
+a replacement is started. The dead worker's jobs must be picked up again
+once their short lease expires, which shows up as jobs with more than one
+attempt.
+
+Throughput only scales with workers while there are free cores; on a
+single-core machine the runs mostly show the queue's overhead.
+
+Usage:
+    python queue_scaling_test.py --jobs 200 --workers 1 2 4
+    python queue_scaling_test.py --jobs 100 --workers 3 --kill --lease 3
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmark
+
+
+def setup_queue(workdir, env, count, width, height):
+    """Create the scratch app and store count frames to queue"""
+    os.environ.update(env)
+    import app as wars
+    from werkzeug.security import generate_password_hash
+
+    wars.create_app({'PROFILE_SAMPLE_RATE': 0}, load_model_on_start=False)
+    with wars.app.app_context():
+        wars.db.session.execute(wars.db.text('PRAGMA journal_mode=WAL'))
+        user = wars.User(username='queue', email='queue@localhost', password_hash=generate_password_hash('queue'))
+        wars.db.session.add(user)
+        wars.db.session.commit()
+        paths = [wars.save_detection_image(benchmark.encode_jpeg(benchmark.make_image(width, height, seed=i)), '.jpg')
+                 for i in range(count)]
+        return wars, user.id, paths
+
+
+def reset_queue(wars, user_id, paths):
+    with wars.app.app_context():
+        wars.Alert.query.delete()
+        wars.InferenceJob.query.delete()
+        wars.InferenceWorker.query.delete()
+        wars.Detection.query.delete()
+        for path in paths:
+            wars.JOBS.enqueue(user_id, path)
+        wars.db.session.commit()
+
+
+def holds_lease(wars, worker):
+    with wars.app.app_context():
+        return wars.InferenceJob.query.filter_by(lease_owner=worker, status='running').count() > 0
+
+
+def run_workers(wars, count, env, args):
+    worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_worker.py')
+    command = [sys.executable, worker_script, '--exit-when-idle', '--poll-interval', '0.2',
+               '--batch-size', str(args.batch_size), '--threads', str(args.threads)]
+    if not args.model:
+        command.append('--standin')
+    started = time.perf_counter()
+    workers = [subprocess.Popen(command + ['--name', f'scale-{count}-{i}'], env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+               for i in range(count)]
+    killed = None
+    if args.kill:
+        # Wait until the victim is running a batch, then take it down without a chance to release it
+        victim = f'scale-{count}-0'
+        while workers[0].poll() is None and not holds_lease(wars, victim):
+            time.sleep(0.02)
+        if workers[0].poll() is None:
+            workers[0].send_signal(signal.SIGKILL)
+            killed = workers[0]
+            # A supervisor would restart it; the replacement finds the jobs once their leases expire
+            workers.append(subprocess.Popen(command + ['--name', f'scale-{count}-restarted'], env=env,
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True))
+    for worker in workers:
+        _, stderr = worker.communicate()
+        if worker.returncode and worker is not killed:
+            raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else f'exit {worker.returncode}')
+    return time.perf_counter() - started, killed is not None
+
+
+def check_run(wars):
+    """Throughput from the job timestamps, and exactly-once checks"""
+    with wars.app.app_context():
+        wars.db.session.expire_all()
+        jobs = wars.InferenceJob.query.all()
+        done = [job for job in jobs if job.status == 'done']
+        detections = wars.Detection.query.count()
+        detection_ids = {job.detection_id for job in done}
+        # From the first claim, so worker start-up (model load) is not counted
+        first = min(job.started_at or job.created_at for job in jobs)
+        last = max((job.finished_at for job in done), default=first)
+        elapsed = max((last - first).total_seconds(), 1e-6)
+        return {
+            'jobs': len(jobs),
+            'done': len(done),
+            'failed': sum(job.status == 'failed' for job in jobs),
+            'retried': sum(job.attempts > 1 for job in done),
+            'detections': detections,
+            'exactly_once': len(done) == len(jobs) == detections == len(detection_ids),
+            'queue_seconds': round(elapsed, 2),
+            'jobs_per_s': round(len(done) / elapsed, 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drain the job queue with an increasing number of worker processes')
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1, help='torch threads per worker')
+    parser.add_argument('--size', default='640x480', help='Frame size WIDTHxHEIGHT')
+    parser.add_argument('--model', action='store_true', help='Use the real checkpoint instead of the stand-in')
+    parser.add_argument('--kill', action='store_true', help='SIGKILL one worker per run in its first batch')
+    parser.add_argument('--lease', type=int, default=3, help='Job lease seconds for this test')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+    width, height = benchmark.parse_resolution(args.size)
+
+    with tempfile.TemporaryDirectory(prefix='wars-queue-') as workdir:
+        env = dict(os.environ,
+                   WARS_DATABASE_URI='sqlite:///' + os.path.join(workdir, 'queue.db'),
+                   WARS_UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+                   WARS_JOB_LEASE_SECONDS=str(args.lease),
+                   WARS_JOB_RETRY_BACKOFF='0.5')
+        wars, user_id, paths = setup_queue(workdir, env, args.jobs, width, height)
+        print(f"Queue scaling: {args.jobs} jobs of {width}x{height}, batch {args.batch_size}, "
+              f"{args.threads} thread(s) per worker, {os.cpu_count()} CPU(s)")
+
+        results = {}
+        baseline = None
+        for count in args.workers:
+            reset_queue(wars, user_id, paths)
+            wall, killed = run_workers(wars, count, env, args)
+            result = check_run(wars)
+            result.update(workers=count, wall_seconds=round(wall, 2), killed=killed)
+            baseline = baseline or result['jobs_per_s']
+            result['speedup'] = round(result['jobs_per_s'] / baseline, 2)
+            results[count] = result
+            print(f"{count:>3} worker(s): {result['jobs_per_s']:>7.1f} jobs/s  x{result['speedup']:<5}"
+                  f" done {result['done']}/{result['jobs']}  retried {result['retried']}"
+                  f"  {'killed one  ' if killed else ''}exactly-once: {'yes' if result['exactly_once'] else 'NO'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cpus': os.cpu_count(), 'args': vars(args), 'results': results}, f, indent=2)
+
+    if not all(result['exactly_once'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
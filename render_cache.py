@@ -0,0 +1,56 @@
+"""
+In-memory LRU cache for rendered (annotated) detection images
+
+Annotated images are rendered on demand from the stored original and the
+detection's boxes. Rendering decodes, draws and re-encodes a full frame,
+so results are kept here, bounded by total size. Each server process has
+its own cache; entries never go stale because a detection's image and
+boxes do not change after it is recorded.
+"""
+
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+class RenderCache:
+    """Byte-size bounded LRU of rendered JPEGs keyed by image filename"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is None:
+            metrics.CACHE_MISSES.inc(cache='render')
+        else:
+            metrics.CACHE_HITS.inc(cache='render')
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+RENDER_CACHE = RenderCache()
@@ -0,0 +1,106 @@
+"""
+Regions of interest: run the model only on the parts of a frame that matter
+
+Fixed cameras often only need a doorway or a gate checked. A source can
+have polygons (stored in the SourceRegion table, in coordinates relative
+to the frame size, 0-1). For a frame from such a source, each polygon's
+bounding box is padded a little, overlapping boxes are merged, and only
+those crops go to the model. The crops of every frame in a batch run in
+one model call. Detected boxes are shifted back to full-frame coordinates,
+and a box whose centre falls outside every polygon is dropped.
+
+Frames without regions are passed through whole, so callers can use a
+RegionPlan for every batch.
+"""
+
+import cv2
+import numpy as np
+
+
+def polygon_pixels(polygon, shape):
+    """Relative [[x, y], ...] polygon as an int32 pixel contour for a frame shape"""
+    height, width = shape[:2]
+    points = np.asarray(polygon, dtype=np.float32) * np.float32([width, height])
+    return np.round(points).astype(np.int32)
+
+
+def crop_boxes(contours, shape, pad=16):
+    """Padded bounding boxes of the contours, with overlapping boxes merged"""
+    height, width = shape[:2]
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        boxes.append([max(0, x - pad), max(0, y - pad), min(width, x + w + pad), min(height, y + h + pad)])
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [box for box in boxes if box[2] > box[0] and box[3] > box[1]]
+
+
+def inside(detection, contours):
+    """Whether a detection's box centre lies within any of the contours"""
+    x1, y1, x2, y2 = detection['bbox']
+    centre = ((x1 + x2) / 2.0, (y1 + y2) / 2.0)
+    return any(cv2.pointPolygonTest(contour, centre, False) >= 0 for contour in contours)
+
+
+class RegionPlan:
+    """Model inputs for a batch of frames, and how to map their detections back
+
+    regions holds, per frame, a list of relative polygons or None/[] for
+    the whole frame.
+    """
+
+    def __init__(self, frames, regions, pad=16):
+        self.frames = frames
+        self.inputs = []     # arrays to run through the model, in order
+        self._parts = []     # (frame index, x offset, y offset) per input
+        self._contours = []  # per frame: pixel contours, or None when unrestricted
+        for index, (frame, polygons) in enumerate(zip(frames, regions)):
+            if not polygons:
+                self._contours.append(None)
+                self.inputs.append(frame)
+                self._parts.append((index, 0, 0))
+                continue
+            contours = [polygon_pixels(polygon, frame.shape) for polygon in polygons]
+            self._contours.append(contours)
+            for x1, y1, x2, y2 in crop_boxes(contours, frame.shape, pad):
+                self.inputs.append(np.ascontiguousarray(frame[y1:y2, x1:x2]))
+                self._parts.append((index, x1, y1))
+
+    @property
+    def cropped(self):
+        return any(contours is not None for contours in self._contours)
+
+    @property
+    def max_side(self):
+        """Longest side over all model inputs"""
+        return max((max(array.shape[:2]) for array in self.inputs), default=0)
+
+    def detections(self, results, postprocess):
+        """Per-frame detection lists in full-frame coordinates
+
+        postprocess(result, input_array) turns one model result into
+        detection dicts relative to its input.
+        """
+        per_frame = [[] for _ in self.frames]
+        for (index, dx, dy), array, result in zip(self._parts, self.inputs, results):
+            contours = self._contours[index]
+            for detection in postprocess(result, array):
+                if dx or dy:
+                    x1, y1, x2, y2 = detection['bbox']
+                    detection['bbox'] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+                if contours is None or inside(detection, contours):
+                    per_frame[index].append(detection)
+        return per_frame
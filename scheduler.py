@@ -0,0 +1,135 @@
+"""
+Priority scheduling of model inference within a server process
+
+Request threads ask the scheduler for an inference slot before running
+the model and give it back afterwards; decode and postprocessing stay
+outside, so only the model is serialised. When a slot frees up it goes
+to the next waiter chosen by:
+
+1. Starvation protection: a waiter that has been queued longer than
+   max_wait goes first, oldest first, whatever its class.
+2. Priority class: live > interactive > batch.
+3. Fair sharing within a class: weighted fair queuing over users, so one
+   user's burst of uploads cannot crowd out the others. Admins get a
+   larger weight.
+
+Waiters of one user are served in arrival order.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+PRIORITIES = ('live', 'interactive', 'batch')
+LIVE, INTERACTIVE, BATCH = PRIORITIES
+
+
+class _Waiter:
+    def __init__(self, seq, priority, user, weight):
+        self.seq = seq
+        self.priority = priority
+        self.user = user
+        self.weight = weight
+        self.enqueued = time.monotonic()
+        self.event = threading.Event()
+
+
+class InferenceScheduler:
+    """Grants a limited number of concurrent inference slots by priority"""
+
+    def __init__(self, concurrency=1, max_wait=5.0):
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.running = 0
+        # priority -> user -> deque of waiters
+        self._queues = {priority: {} for priority in PRIORITIES}
+        # priority -> user -> virtual time; the user with the lowest goes next
+        self._virtual_time = {priority: {} for priority in PRIORITIES}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def configure(self, concurrency, max_wait):
+        self.concurrency = max(1, concurrency)
+        self.max_wait = max_wait
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, user=None, weight=1.0):
+        """Block until an inference slot is granted, and hold it for the block"""
+        waiter = _Waiter(next(self._seq), priority, user, weight)
+        with self._lock:
+            if self.running < self.concurrency and not self._has_waiters():
+                self.running += 1
+                metrics.INFERENCE_SLOTS_BUSY.set(self.running)
+                waiter.event.set()
+            else:
+                self._enqueue(waiter)
+        waiter.event.wait()
+        metrics.SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - waiter.enqueued, priority=priority)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.running -= 1
+                self._dispatch()
+                metrics.INFERENCE_SLOTS_BUSY.set(self.running)
+
+    def _has_waiters(self):
+        return any(self._queues[priority] for priority in PRIORITIES)
+
+    def _enqueue(self, waiter):
+        users = self._queues[waiter.priority]
+        if waiter.user not in users:
+            # A user becoming active starts at the current virtual time of
+            # the class, so idle time does not build up credit
+            times = self._virtual_time[waiter.priority]
+            active = [times[u] for u in users]
+            floor = min(active) if active else max(times.values(), default=0.0)
+            times[waiter.user] = max(times.get(waiter.user, 0.0), floor)
+            users[waiter.user] = deque()
+        users[waiter.user].append(waiter)
+        metrics.SCHEDULER_QUEUE_DEPTH.inc(priority=waiter.priority)
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._remove(waiter)
+            self.running += 1
+            waiter.event.set()
+
+    def _next_waiter(self):
+        now = time.monotonic()
+        heads = [queue[0] for priority in PRIORITIES for queue in self._queues[priority].values()]
+        if not heads:
+            return None
+
+        starved = [w for w in heads if now - w.enqueued > self.max_wait]
+        if starved:
+            waiter = min(starved, key=lambda w: w.seq)
+            if waiter.priority != LIVE:
+                metrics.SCHEDULER_PROMOTIONS.inc(priority=waiter.priority)
+            return waiter
+
+        for priority in PRIORITIES:
+            users = self._queues[priority]
+            if users:
+                times = self._virtual_time[priority]
+                user = min(users, key=lambda u: (times[u], users[u][0].seq))
+                return users[user][0]
+        return None
+
+    def _remove(self, waiter):
+        users = self._queues[waiter.priority]
+        users[waiter.user].popleft()
+        if not users[waiter.user]:
+            del users[waiter.user]
+        self._virtual_time[waiter.priority][waiter.user] += 1.0 / waiter.weight
+        metrics.SCHEDULER_QUEUE_DEPTH.dec(priority=waiter.priority)
+
+
+SCHEDULER = InferenceScheduler()
@@ -0,0 +1,138 @@
+"""
+Shadow evaluation of a candidate model on live /predict traffic
+
+A sampled fraction of /predict requests that ran the production model on
+the whole frame at native size (no regions of interest, no cascade, no
+degradation) hands its decoded image and the production result to a
+background thread, which runs the same image through the candidate model
+and compares the two: boxes are matched by IoU, then class disagreements
+and confidence deltas are counted on the matched pairs. One compact row of counts and sums per comparison is
+recorded through a callback supplied by the app, so summaries can be
+aggregated in SQL.
+
+The response never waits for the candidate. The queue is bounded, and
+samples that arrive while it is full are dropped, so shadow traffic
+cannot build up a backlog. It still costs CPU, so keep the sample rate
+low on busy servers.
+
+This module only imports the standard library at import time; NumPy and
+the model come in with the worker thread.
+"""
+
+import queue
+import random
+import threading
+import time
+
+import metrics
+import scheduler
+
+
+def compare_detections(primary, candidate, iou_threshold=0.5):
+    """Match candidate boxes to primary boxes and summarise the differences
+
+    Boxes are paired greedily by highest IoU (at least iou_threshold),
+    regardless of class, so a box found by both models with different
+    labels counts as a class mismatch rather than a miss.
+    """
+    summary = {
+        'primary_boxes': len(primary),
+        'candidate_boxes': len(candidate),
+        'matched_boxes': 0,
+        'class_mismatches': 0,
+        'iou_sum': 0.0,
+        'confidence_delta_sum': 0.0,
+        'confidence_abs_delta_sum': 0.0,
+    }
+    if primary and candidate:
+        import numpy as np
+        from tracking import iou_matrix
+
+        iou = iou_matrix(np.asarray([d['bbox'] for d in primary], dtype=np.float32),
+                         np.asarray([d['bbox'] for d in candidate], dtype=np.float32))
+        used_primary, used_candidate = set(), set()
+        for flat_index in np.argsort(-iou, axis=None):
+            i, j = np.unravel_index(flat_index, iou.shape)
+            if iou[i, j] < iou_threshold:
+                break
+            if i in used_primary or j in used_candidate:
+                continue
+            used_primary.add(i)
+            used_candidate.add(j)
+            delta = candidate[j]['confidence'] - primary[i]['confidence']
+            summary['matched_boxes'] += 1
+            summary['class_mismatches'] += primary[i]['class'] != candidate[j]['class']
+            summary['iou_sum'] += float(iou[i, j])
+            summary['confidence_delta_sum'] += delta
+            summary['confidence_abs_delta_sum'] += abs(delta)
+
+    summary['agreed'] = (summary['matched_boxes'] == len(primary) == len(candidate)
+                         and summary['class_mismatches'] == 0)
+    return summary
+
+
+class ShadowEvaluator:
+    """Runs sampled requests through a candidate model on a background thread"""
+
+    def __init__(self, max_queue=32):
+        self.candidate = None  # version name in inference.REGISTRY, None when off
+        self.sample_rate = 0.0
+        self.record = None     # callback(**comparison) that stores a result row
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def configure(self, record, sample_rate):
+        self.record = record
+        self.sample_rate = sample_rate
+
+    def sampled(self, primary_version):
+        """Whether this request should be shadowed"""
+        return (self.candidate is not None and self.candidate != primary_version
+                and self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def submit(self, img_array, primary_version, primary_detections, primary_seconds):
+        """Queue a comparison without blocking; drops the sample when busy"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((self.candidate, img_array, primary_version,
+                                    primary_detections, primary_seconds))
+        except queue.Full:
+            metrics.SHADOW_EVALUATIONS.inc(result='dropped')
+
+    def _ensure_worker(self):
+        # Started lazily, so each preforked worker gets its own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        import inference
+
+        while True:
+            candidate, img_array, primary_version, primary_detections, primary_seconds = self._queue.get()
+            entry = inference.REGISTRY.get(candidate)
+            if entry is None:
+                metrics.SHADOW_EVALUATIONS.inc(result='failed')
+                continue
+            try:
+                # Shadow work never gets ahead of real traffic
+                with scheduler.SCHEDULER.slot(scheduler.BATCH, user='shadow'):
+                    start = time.perf_counter()
+                    results = inference.run_model(img_array, model=entry.model)
+                    candidate_seconds = time.perf_counter() - start
+                _, candidate_detections = inference.postprocess(results, img_array, model=entry.model,
+                                                                annotate=False)
+                comparison = compare_detections(primary_detections, candidate_detections)
+                self.record(primary_version=primary_version, candidate_version=candidate,
+                            primary_seconds=primary_seconds, candidate_seconds=candidate_seconds,
+                            **comparison)
+                metrics.MODEL_INFERENCE_SECONDS.observe(candidate_seconds, version=candidate)
+                metrics.SHADOW_EVALUATIONS.inc(result='compared')
+            except Exception as e:
+                print(f"Shadow evaluation of {candidate} failed: {e}")
+                metrics.SHADOW_EVALUATIONS.inc(result='failed')
+
+
+EVALUATOR = ShadowEvaluator()
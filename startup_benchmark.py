@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import and initialization time of the app
+
+Each case runs in a fresh interpreter so nothing is cached between runs.
+Reports the median wall time per case (interpreter start included) and
+which heavy ML modules the case ended up importing. Web-only startup
+must not import torch, cv2, numpy or PIL.
+
+With --weights, measures model loading per worker process instead: N
+workers load the checkpoint at once, pickled (torch.load) and from its
+memory-mapped weights file (weights.py), touch every weight as a first
+inference would, and report load time, RSS, PSS (shared pages split
+between the processes mapping them) and private memory. Without the real
+checkpoint, a stand-in of --weights-mb megabytes is used. Files are read
+from a warm page cache.
+
+Usage:
+    python startup_benchmark.py --repeat 5 --budget 1.0 --output startup.json
+    python startup_benchmark.py --weights --workers 1 4 8 --weights-mb 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('torch', 'cv2', 'numpy', 'PIL', 'ultralytics')
+
+CASES = {
+    'import_app': "import app",
+    'web_only_first_request': (
+        "import app\n"
+        "app.create_app(load_model_on_start=False)\n"
+        "client = app.app.test_client()\n"
+        "assert client.get('/login').status_code == 200\n"
+    ),
+    'admin_cli_import': "import fix_and_run",
+    'import_inference': "import inference",
+    'model_ready': (
+        "import os, app, inference\n"
+        "if os.path.exists(inference.model_path):\n"
+        "    app.create_app()\n"
+        "else:\n"
+        "    from tiny_model import TinyDetector\n"
+        "    app.create_app(load_model_on_start=False)\n"
+        "    inference.REGISTRY.register('standin', TinyDetector(), activate=True)\n"
+    ),
+}
+
+REPORT_SNIPPET = (
+    "\nimport sys, json\n"
+    "print('__STARTUP__' + json.dumps(sorted(m for m in %r if m in sys.modules)))\n"
+)
+
+
+def run_case(code, env):
+    """Run one case in a new interpreter; return (seconds, heavy modules imported)"""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', code + REPORT_SNIPPET % (HEAVY_MODULES,)],
+                               capture_output=True, text=True, env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'failed')
+    marker = [line for line in completed.stdout.splitlines() if line.startswith('__STARTUP__')]
+    return elapsed, json.loads(marker[-1][len('__STARTUP__'):]) if marker else []
+
+
+WEIGHTS_WORKER = """
+import json, sys, time
+start = time.perf_counter()
+import torch.nn as nn
+import inference
+imported = time.perf_counter()
+model = inference.load_checkpoint(sys.argv[1], mapped=False)
+loaded = time.perf_counter()
+modules = [model] if isinstance(model, nn.Module) else [v for v in vars(model).values() if isinstance(v, nn.Module)]
+for module in modules:
+    for tensor in module.state_dict().values():
+        tensor.float().sum()
+print('__READY__' + json.dumps({'load_s': loaded - imported, 'ready_s': time.perf_counter() - start}), flush=True)
+sys.stdin.readline()
+memory = {}
+with open('/proc/self/smaps_rollup') as f:
+    for line in f:
+        key, _, value = line.partition(':')
+        if value.strip().endswith('kB'):
+            memory[key] = int(value.split()[0]) / 1024
+print('__MEMORY__' + json.dumps({'rss_mb': memory['Rss'], 'pss_mb': memory['Pss'],
+                                 'private_mb': memory['Private_Clean'] + memory['Private_Dirty']}), flush=True)
+"""
+
+
+def marker_line(stream, marker):
+    for line in stream:
+        if line.startswith(marker):
+            return json.loads(line[len(marker):])
+    raise RuntimeError(f'worker exited before {marker}')
+
+
+def run_workers(path, count, env):
+    """Start count workers loading path at once; per-worker load time and memory once all are up"""
+    workers = [subprocess.Popen([sys.executable, '-c', WEIGHTS_WORKER, path], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, text=True, env=env,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+               for _ in range(count)]
+    try:
+        results = [marker_line(worker.stdout, '__READY__') for worker in workers]
+        # Measure while every worker is alive, so shared pages are split between all of them
+        for worker in workers:
+            worker.stdin.write('\n')
+            worker.stdin.flush()
+        for result, worker in zip(results, workers):
+            result.update(marker_line(worker.stdout, '__MEMORY__'))
+    finally:
+        for worker in workers:
+            worker.kill() if worker.poll() is None else None
+            worker.wait()
+    return results
+
+
+def standin_checkpoint(path, megabytes):
+    """Save a stand-in model with about the given size of float32 weights"""
+    import torch
+    import torch.nn as nn
+
+    layer_mb = 256 * 256 * 9 * 4 / 1e6
+    model = nn.Sequential(*[nn.Conv2d(256, 256, 3, padding=1) for _ in range(max(1, round(megabytes / layer_mb)))])
+    torch.save(model.eval(), path)
+
+
+def bench_weights(args, workdir, env):
+    import inference
+    import weights
+
+    checkpoint = args.checkpoint or inference.model_path
+    if not os.path.exists(checkpoint):
+        checkpoint = os.path.join(workdir, 'standin.pt')
+        standin_checkpoint(checkpoint, args.weights_mb)
+    mapped, size = weights.convert(checkpoint, os.path.join(workdir, 'model' + weights.EXTENSION))
+    print(f"Weights: {checkpoint} ({size / 1e6:.1f} MB), {os.cpu_count()} CPU(s)")
+    print(f"{'format':<8} {'workers':>7} {'load':>8} {'ready':>8} {'RSS/worker':>11} "
+          f"{'PSS/worker':>11} {'private':>9} {'total PSS':>10}")
+
+    results = {}
+    for name, path in (('pickle', checkpoint), ('mmap', mapped)):
+        results[name] = {}
+        for count in args.workers:
+            runs = run_workers(path, count, env)
+            summary = {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+            summary['total_pss_mb'] = round(sum(run['pss_mb'] for run in runs), 1)
+            results[name][count] = summary
+            print(f"{name:<8} {count:>7} {summary['load_s']:>7.3f}s {summary['ready_s']:>7.3f}s "
+                  f"{summary['rss_mb']:>8.1f} MB {summary['pss_mb']:>8.1f} MB {summary['private_mb']:>6.1f} MB "
+                  f"{summary['total_pss_mb']:>7.1f} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app startup and import time')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='Max seconds allowed for web-only startup')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--weights', action='store_true',
+                        help='Benchmark model loading per worker, pickled vs memory-mapped')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='Concurrent worker counts for --weights')
+    parser.add_argument('--checkpoint', help='Checkpoint for --weights (default: the app model)')
+    parser.add_argument('--weights-mb', type=float, default=100,
+                        help='Stand-in weight size when the checkpoint is missing')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='wars-startup-') as workdir:
+        env = dict(os.environ,
+                   WARS_DATABASE_URI='sqlite:///' + os.path.join(workdir, 'startup.db'),
+                   WARS_UPLOAD_FOLDER=os.path.join(workdir, 'uploads'))
+        if args.weights:
+            results = bench_weights(args, workdir, env)
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump({'python': sys.version.split()[0], 'weights': results}, f, indent=2)
+            return
+        results = {}
+        for name in args.cases:
+            timings, modules = [], []
+            for _ in range(args.repeat):
+                elapsed, modules = run_case(CASES[name], env)
+                timings.append(elapsed)
+            results[name] = {
+                'median_s': round(statistics.median(timings), 3),
+                'min_s': round(min(timings), 3),
+                'max_s': round(max(timings), 3),
+                'heavy_modules': modules,
+            }
+            print(f"{name:<24} median {results[name]['median_s']:.3f}s  "
+                  f"(min {results[name]['min_s']:.3f}s)  heavy imports: {', '.join(modules) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+    failures = []
+    for name in ('import_app', 'web_only_first_request', 'admin_cli_import'):
+        if name in results:
+            if results[name]['heavy_modules']:
+                failures.append(f"{name} imported {', '.join(results[name]['heavy_modules'])}")
+            if results[name]['median_s'] > args.budget:
+                failures.append(f"{name} took {results[name]['median_s']:.3f}s (budget {args.budget:.1f}s)")
+    if failures:
+        print("\nStartup budget exceeded:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,11 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function initializeDashboard() {
+    // Follow acknowledgements made in other open dashboards
+    if (document.body.dataset.ackCursor !== undefined) {
+        setInterval(pollAcknowledgements, 5000);
+    }
+    
     setupImageUpload();
     setupAlertSystem();
     setupModal();
@@ -177,7 +182,8 @@ function showDetectionResults(data, type) {
         document.getElementById('resultImage');
     
     if (resultImg) {
-        resultImg.src = 'data:image/jpeg;base64,' + data.annotated_image;
+        // Annotated images are rendered by the server on request
+        resultImg.src = data.annotated_image ? 'data:image/jpeg;base64,' + data.annotated_image : data.image_url;
     }
 }
 
@@ -377,11 +383,12 @@ function acknowledgeAlert(alertId) {
         button.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Accepting...';
     }
     
-    fetch(`/api/acknowledge_alert/${alertId}`, {
+    fetch('/api/alerts/acknowledge', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
-        }
+        },
+        body: JSON.stringify({ ids: [alertId] })
     })
     .then(response => response.json())
     .then(data => {
@@ -393,25 +400,8 @@ function acknowledgeAlert(alertId) {
                 button.classList.add('btn-success');
             }
             
-            // Add fade out animation
             if (alertCard) {
-                alertCard.style.transition = 'all 0.5s ease';
-                alertCard.style.opacity = '0';
-                alertCard.style.transform = 'translateX(-100%)';
-                
-                // Remove from DOM after animation
-                setTimeout(() => {
-                    alertCard.remove();
-                    
-                    // Update alert badge count
-                    updateAlertBadge();
-                    
-                    // Check if no alerts left
-                    const remainingAlerts = document.querySelectorAll('.alert-card');
-                    if (remainingAlerts.length === 0) {
-                        showNoAlertsMessage();
-                    }
-                }, 500);
+                removeAlertCard(alertCard);
             }
         } else {
             // Show error state
@@ -436,6 +426,129 @@ function acknowledgeAlert(alertId) {
     });
 }
 
+function removeAlertCard(alertCard) {
+    // Add fade out animation
+    alertCard.style.transition = 'all 0.5s ease';
+    alertCard.style.opacity = '0';
+    alertCard.style.transform = 'translateX(-100%)';
+    
+    // Remove from DOM after animation
+    setTimeout(() => {
+        alertCard.remove();
+        
+        // Update alert badge count
+        updateAlertBadge();
+        
+        // Check if no alerts left
+        const remainingAlerts = document.querySelectorAll('.alert-card');
+        if (remainingAlerts.length === 0) {
+            showNoAlertsMessage();
+        }
+    }, 500);
+}
+
+// Bulk Acknowledgement
+function acknowledgeAlerts(scope) {
+    // One request and one UPDATE on the server, however many alerts match
+    const status = document.getElementById('bulkAckStatus');
+    if (status) {
+        status.textContent = 'Accepting...';
+    }
+    
+    return fetch('/api/alerts/acknowledge', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(scope)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.error || 'Acknowledgement failed');
+        }
+        applyAcknowledgement(data.scope);
+        if (status) {
+            status.textContent = `${data.acknowledged} alert(s) accepted`;
+        }
+        return data.acknowledged;
+    })
+    .catch(error => {
+        console.error('Error acknowledging alerts:', error);
+        if (status) {
+            status.textContent = '';
+        }
+        showError(error.message);
+    });
+}
+
+function acknowledgeSelected() {
+    const ids = Array.from(document.querySelectorAll('.alert-checkbox:checked')).map(box => parseInt(box.value, 10));
+    if (ids.length === 0) {
+        showError('Select the alerts to accept first.');
+        return;
+    }
+    acknowledgeAlerts({ ids: ids });
+}
+
+function acknowledgeVisible() {
+    // Everything the page shows for the current filter, but not alerts that arrived since it loaded
+    const cards = Array.from(document.querySelectorAll('.alert-card[data-alert-id]'));
+    if (cards.length === 0) {
+        return;
+    }
+    const scope = { all: true, max_id: Math.max(...cards.map(card => parseInt(card.dataset.alertId, 10))) };
+    const type = document.getElementById('alertTypeFilter');
+    if (type && type.value) {
+        scope.type = type.value;
+    }
+    acknowledgeAlerts(scope);
+}
+
+function selectAllAlerts(checked) {
+    document.querySelectorAll('.alert-card:not([hidden]) .alert-checkbox').forEach(box => {
+        box.checked = checked;
+    });
+}
+
+function filterAlerts(type) {
+    document.querySelectorAll('.alert-card[data-alert-id]').forEach(card => {
+        card.hidden = Boolean(type) && card.dataset.alertType !== type;
+    });
+}
+
+function alertInScope(card, scope) {
+    const id = parseInt(card.dataset.alertId, 10);
+    if (scope.ids) {
+        return scope.ids.includes(id);
+    }
+    return (!scope.type || card.dataset.alertType === scope.type) &&
+        (scope.detection_id === undefined || parseInt(card.dataset.detectionId, 10) === scope.detection_id) &&
+        (!scope.since || card.dataset.timestamp >= scope.since) &&
+        (!scope.until || card.dataset.timestamp <= scope.until) &&
+        (scope.max_id === undefined || id <= scope.max_id);
+}
+
+function applyAcknowledgement(scope) {
+    document.querySelectorAll('[data-alert-id]').forEach(card => {
+        if (!card.classList.contains('acknowledged') && alertInScope(card, scope)) {
+            removeAlertCard(card);
+        }
+    });
+}
+
+function pollAcknowledgements() {
+    fetch(`/api/alerts/acknowledgements?after=${document.body.dataset.ackCursor}`)
+    .then(response => response.json())
+    .then(data => {
+        document.body.dataset.ackCursor = data.cursor;
+        (data.events || []).forEach(event => applyAcknowledgement(event.scope));
+    })
+    .catch(error => {
+        console.error('Error loading acknowledgements:', error);
+    });
+}
+
 function updateAlertBadge() {
     const alertBadge = document.getElementById('alertBadge');
     if (alertBadge) {
@@ -258,7 +258,7 @@ function showResults(data) {
     
     // Show result image with fade effect
     resultImage.style.opacity = '0';
-    resultImage.src = 'data:image/jpeg;base64,' + data.annotated_image;
+    resultImage.src = data.annotated_image ? 'data:image/jpeg;base64,' + data.annotated_image : data.image_url;
     resultImage.onload = () => {
         resultImage.style.transition = 'opacity 0.5s ease';
         resultImage.style.opacity = '1';
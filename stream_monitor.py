@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Live stream monitoring for RTSP/MJPEG cameras
+
+Each stream gets a reader thread that pulls frames through OpenCV and
+keeps only the most recent one, overwriting any frame inference has not
+picked up yet. A single inference loop takes the latest frame of every
+stream that has something new, runs them as one batch, and records a
+Detection for frames with weapons. Detections are tracked per stream, so
+each object raises one alert (through the existing Alert model) that is
+updated while it stays in view. Because stale frames are dropped instead
+of queued, the delay from capture to alert stays around one inference
+cycle even when inference cannot keep up with the cameras.
+
+Frames go through the motion gate (motion.py) first: a frame that barely
+differs from the last frame of its stream that the model saw reuses that
+frame's detections, so only changed frames (and every
+WARS_MOTION_FORCE_EVERY-th frame) take a place in the batch. Streams with
+regions of interest only have those parts of the frame analysed (roi.py).
+
+A local video file can stand in for a camera: it is played back at its
+native frame rate (and looped with --loop), like a live source.
+
+Usage:
+    python stream_monitor.py --stream gate=rtsp://10.0.0.5/stream1 --stream lobby=http://cam2/mjpeg
+    python stream_monitor.py --stream test=./sample.mp4 --loop --user admin
+"""
+
+import argparse
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import dedup
+import motion
+
+
+class LatestFrame:
+    """Single-slot buffer holding only the newest frame of a stream"""
+
+    def __init__(self):
+        self._frame = None
+        self._captured_at = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, frame, captured_at):
+        with self._lock:
+            if self._frame is not None:
+                self.dropped += 1  # previous frame was never consumed
+            self._frame = frame
+            self._captured_at = captured_at
+            self._seq += 1
+
+    def take(self):
+        """Return (frame, captured_at, seq) and empty the slot, or None"""
+        with self._lock:
+            if self._frame is None:
+                return None
+            item = (self._frame, self._captured_at, self._seq)
+            self._frame = None
+            return item
+
+
+class StreamReader(threading.Thread):
+    """Reads one camera (or file played back as a camera) into a LatestFrame"""
+
+    def __init__(self, name, url, loop=False, reconnect_delay=2.0):
+        super().__init__(name=f"stream-{name}", daemon=True)
+        self.stream_name = name
+        self.url = url
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.latest = LatestFrame()
+        self.frames_read = 0
+        self.connected = False
+        self.stop_event = threading.Event()
+
+    def _is_file(self):
+        return '://' not in self.url
+
+    def run(self):
+        import cv2
+
+        while not self.stop_event.is_set():
+            capture = cv2.VideoCapture(self.url)
+            if not capture.isOpened():
+                print(f"⚠️ [{self.stream_name}] cannot open {self.url}, retrying in {self.reconnect_delay}s")
+                self.stop_event.wait(self.reconnect_delay)
+                continue
+
+            # Live sources should not buffer frames inside the backend either
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.connected = True
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+            frame_interval = 1.0 / fps if self._is_file() else 0.0
+            next_frame_at = time.monotonic()
+            print(f"📹 [{self.stream_name}] connected ({fps:.0f} fps)")
+
+            while not self.stop_event.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.frames_read += 1
+                self.latest.put(frame, time.monotonic())
+                if frame_interval:
+                    # Play files back in real time, like a camera would deliver them
+                    next_frame_at += frame_interval
+                    delay = next_frame_at - time.monotonic()
+                    if delay > 0:
+                        self.stop_event.wait(delay)
+                    else:
+                        next_frame_at = time.monotonic()
+
+            capture.release()
+            self.connected = False
+            if self._is_file() and not self.loop:
+                print(f"⏹️ [{self.stream_name}] end of file")
+                return
+            if not self.stop_event.is_set():
+                print(f"⚠️ [{self.stream_name}] stream lost, reconnecting")
+                self.stop_event.wait(0 if self._is_file() else self.reconnect_delay)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class StreamMonitor:
+    """Batched inference over the latest frame of every stream"""
+
+    def __init__(self, wars, inference, user_id, readers, args):
+        self.wars = wars
+        self.inference = inference
+        self.user_id = user_id
+        self.readers = readers
+        self.args = args
+        self.latencies = deque(maxlen=1000)  # capture-to-alert seconds of the latest alerting frames
+        self.frames_inferred = 0
+        self.frames_gated = 0
+        self.frames_stale = 0
+        self.frames_failed = 0
+        self.alerts_raised = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        last_report = time.monotonic()
+        with self.wars.app.app_context():
+            while not self.stop_event.is_set():
+                batch = []
+                now = time.monotonic()
+                for reader in self.readers:
+                    item = reader.latest.take()
+                    if item is None:
+                        continue
+                    frame, captured_at, seq = item
+                    if now - captured_at > self.args.max_frame_age:
+                        self.frames_stale += 1
+                        continue
+                    batch.append((reader, frame, captured_at))
+
+                if not batch:
+                    if not any(reader.is_alive() for reader in self.readers):
+                        break
+                    time.sleep(0.005)
+                    continue
+
+                active = self.wait_for_model()
+                if active is None:
+                    break
+                try:
+                    self.process(batch, active)
+                except Exception as e:
+                    # A database or inference error costs these frames, not the monitor
+                    self.wars.db.session.rollback()
+                    self.frames_failed += len(batch)
+                    print(f"❌ Inference failed for batch of {len(batch)}: {e}")
+
+                if time.monotonic() - last_report >= self.args.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+        self.report()
+
+    def wait_for_model(self):
+        """The active model version, waiting while none is loaded (startup, a model swap)
+
+        Returns None only if the monitor is stopping and there is still no model.
+        """
+        delay = 1.0
+        while True:
+            try:
+                active = self.wars.active_model(self.inference)
+            except Exception as e:
+                self.wars.db.session.rollback()
+                print(f"⚠️ Could not get the active model: {e}")
+                active = None
+            if active is not None:
+                return active
+            if self.stop_event.is_set():
+                return None
+            print(f"⏳ No model loaded, retrying in {delay:.0f}s")
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, 30.0)
+
+    def process(self, batch, active):
+        gate = motion.MOTION_GATE
+        alerting = []
+        pending = []
+        for reader, frame, captured_at in batch:
+            key = (reader.stream_name, active.version)
+            detections, thumbnail = gate.check(key, frame)
+            if detections is None:
+                pending.append((reader, frame, captured_at, key, thumbnail))
+                continue
+            self.frames_gated += 1
+            if detections:
+                alerting.append((reader, frame, detections, captured_at))
+
+        if pending:
+            frames = [frame for _, frame, _, _, _ in pending]
+            keys = [(self.user_id, reader.stream_name) for reader, _, _, _, _ in pending]
+            per_frame = self.wars.detect_frames(self.inference, active, frames, keys)
+            self.frames_inferred += len(frames)
+            for (reader, frame, captured_at, key, thumbnail), detections in zip(pending, per_frame):
+                gate.record(key, thumbnail, detections)
+                if detections:
+                    alerting.append((reader, frame, detections, captured_at))
+
+        if not alerting:
+            return
+
+        db = self.wars.db
+        raised = []
+        try:
+            for reader, frame, detections, captured_at in alerting:
+                # The plain frame is stored; boxes are drawn when the image is viewed
+                filename = self.wars.save_detection_image(self.inference.encode_jpeg(frame))
+                _, new_alerts = self.wars.record_detection(self.user_id, filename, detections,
+                                                           source=reader.stream_name,
+                                                           model_version=active.version,
+                                                           image_is_original=True,
+                                                           image_hash=dedup.dhash(frame))
+                raised.extend((reader, alert, captured_at) for alert in new_alerts)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Failed to record alerts: {e}")
+            return
+
+        committed_at = time.monotonic()
+        for reader, _, _, captured_at in alerting:
+            self.latencies.append(committed_at - captured_at)
+        for reader, alert, captured_at in raised:
+            self.alerts_raised += 1
+            print(f"{alert['message']} (capture-to-alert {(committed_at - captured_at) * 1000:.0f}ms)")
+
+    def report(self):
+        latency = ''
+        if self.latencies:
+            values = np.asarray(self.latencies) * 1000
+            latency = f" alert latency p50={np.percentile(values, 50):.0f}ms p95={np.percentile(values, 95):.0f}ms"
+        streams = ' '.join(f"{r.stream_name}(read={r.frames_read} dropped={r.latest.dropped})"
+                           for r in self.readers)
+        print(f"📊 inferred={self.frames_inferred} gated={self.frames_gated} stale={self.frames_stale} "
+              f"failed={self.frames_failed} alerts={self.alerts_raised}{latency} | {streams}")
+
+
+def parse_stream(value):
+    if '=' not in value:
+        raise argparse.ArgumentTypeError("Streams are given as NAME=URL")
+    name, url = value.split('=', 1)
+    return name, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monitor live camera streams for weapons')
+    parser.add_argument('--stream', action='append', type=parse_stream, required=True,
+                        help='NAME=URL (rtsp://, http:// MJPEG, or a local video file)')
+    parser.add_argument('--user', default='admin', help='Username alerts are recorded for')
+    parser.add_argument('--loop', action='store_true', help='Loop local files')
+    parser.add_argument('--max-frame-age', type=float, default=2.0,
+                        help='Drop frames older than this many seconds instead of analysing them')
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    args = parser.parse_args()
+
+    import app as wars
+
+    wars.create_app()
+    inference = wars.get_inference()
+    if inference.model is None:
+        sys.exit("❌ Model could not be loaded")
+
+    with wars.app.app_context():
+        user = wars.User.query.filter_by(username=args.user).first()
+    if user is None:
+        sys.exit(f"❌ User not found: {args.user}")
+
+    readers = [StreamReader(name, url, loop=args.loop) for name, url in args.stream]
+    for reader in readers:
+        reader.start()
+
+    monitor = StreamMonitor(wars, inference, user.id, readers, args)
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        print("\nStopping streams...")
+    finally:
+        for reader in readers:
+            reader.stop()
+
+
+if __name__ == '__main__':
+    main()
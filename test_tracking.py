@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tracked alerts must stay with the account that raised them
+
+Two users send the same frame with the same source name; each must keep
+its own track and alerts. Runs against a scratch database, either with
+pytest or as a script:
+
+    python test_tracking.py
+"""
+
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix='wars-tracking-')
+os.environ.setdefault('WARS_DATABASE_URI', 'sqlite:///' + os.path.join(WORKDIR, 'tracking.db'))
+os.environ.setdefault('WARS_UPLOAD_FOLDER', os.path.join(WORKDIR, 'uploads'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as wars  # noqa: E402
+
+FRAME = [{'class': 'weapon', 'confidence': 0.9, 'bbox': [100, 100, 200, 220]},
+         {'class': 'weapon', 'confidence': 0.6, 'bbox': [400, 120, 460, 200]}]
+
+
+def make_user(username):
+    with wars.app.app_context():
+        user = wars.User.query.filter_by(username=username).first()
+        if user is None:
+            user = wars.User(username=username, email=f'{username}@example.com',
+                             password_hash=wars.generate_password_hash(username))
+            wars.db.session.add(user)
+            wars.db.session.commit()
+        return user.id
+
+
+def client_for(username):
+    client = wars.app.test_client()
+    client.post('/login', data={'username': username, 'password': username})
+    return client
+
+
+def record(user_id, source):
+    with wars.app.app_context():
+        detection, created = wars.record_detection(user_id, 'frame.jpg', FRAME, source=source)
+        wars.db.session.commit()
+        return detection.id, created
+
+
+def test_same_source_name_is_tracked_per_user():
+    wars.create_app(load_model_on_start=False)
+    u, v = make_user('track_u'), make_user('track_v')
+
+    _, created_u = record(u, 'cam1')
+    alerts_u = client_for('track_u').get('/api/alerts').get_json()
+    assert len(created_u) == 3 and len(alerts_u) == 3
+
+    # Same camera name, same boxes, different account: a new track, not u's
+    detection_v, created_v = record(v, 'cam1')
+    assert len(created_v) == 3
+    assert client_for('track_u').get('/api/alerts').get_json() == alerts_u
+    alerts_v = client_for('track_v').get('/api/alerts').get_json()
+    assert len(alerts_v) == 3
+    assert not {alert['id'] for alert in alerts_u} & {alert['id'] for alert in alerts_v}
+    with wars.app.app_context():
+        assert {alert.detection_id for alert in wars.Alert.query.filter(
+            wars.Alert.id.in_([alert['id'] for alert in alerts_v]))} == {detection_v}
+
+    # u's next frame still updates u's own alerts in place
+    _, created_again = record(u, 'cam1')
+    assert created_again == []
+    assert {alert['frame_count'] for alert in client_for('track_u').get('/api/alerts').get_json()} == {2}
+
+
+if __name__ == '__main__':
+    test_same_source_name_is_tracked_per_user()
+    print("✅ Tracks and alerts stay per user")
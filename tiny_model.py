@@ -0,0 +1,108 @@
+"""
+Stand-in tiny detector with the ultralytics YOLO predict() interface
+
+Used by the benchmark and load tools when the real checkpoint
+(improved_weapon_detection_10_epochs.pt) is not available. It runs a
+small, randomly initialised conv net on a letterboxed input so timings
+scale with image size and batch size like a real model, and turns the
+hottest cells of its output map into boxes. The detections are
+meaningless, but deterministic for a given image.
+"""
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class Boxes:
+    """Minimal stand-in for ultralytics.engine.results.Boxes"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Boxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+class Result:
+    """Minimal stand-in for ultralytics.engine.results.Results"""
+
+    def __init__(self, boxes, names, orig_shape):
+        self.boxes = boxes
+        self.names = names
+        self.orig_shape = orig_shape
+
+
+class TinyDetector:
+    """Randomly initialised conv net exposing predict(source, verbose=False)"""
+
+    names = {0: 'weapon'}
+
+    def __init__(self, imgsz=320, max_det=3, conf=0.25, seed=0):
+        self.imgsz = imgsz
+        self.max_det = max_det
+        self.conf = conf
+        generator = torch.Generator().manual_seed(seed)
+        self.net = nn.Sequential(
+            nn.Conv2d(3, 16, 3, stride=2, padding=1), nn.ReLU(),
+            nn.Conv2d(16, 32, 3, stride=2, padding=1), nn.ReLU(),
+            nn.Conv2d(32, 32, 3, stride=2, padding=1), nn.ReLU(),
+            nn.Conv2d(32, 1, 1),
+        )
+        with torch.no_grad():
+            for param in self.net.parameters():
+                param.copy_(torch.randn(param.shape, generator=generator) * 0.1)
+        self.net.eval()
+
+    def eval(self):
+        return self
+
+    def _letterbox(self, image, imgsz):
+        h, w = image.shape[:2]
+        scale = imgsz / max(h, w)
+        resized = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))))
+        canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        canvas[:resized.shape[0], :resized.shape[1]] = resized
+        return canvas, scale
+
+    def predict(self, source, verbose=False, imgsz=None, conf=None, **kwargs):
+        imgsz = imgsz or self.imgsz
+        conf = self.conf if conf is None else conf
+        images = source if isinstance(source, (list, tuple)) else [source]
+
+        letterboxed, scales = [], []
+        for image in images:
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            canvas, scale = self._letterbox(image, imgsz)
+            letterboxed.append(canvas)
+            scales.append(scale)
+
+        batch = torch.from_numpy(np.stack(letterboxed)).permute(0, 3, 1, 2).float() / 255.0
+        with torch.no_grad():
+            heatmaps = torch.sigmoid(self.net(batch))[:, 0]
+
+        stride = imgsz / heatmaps.shape[-1]
+        results = []
+        for image, scale, heatmap in zip(images, scales, heatmaps):
+            flat = heatmap.flatten()
+            scores, indices = torch.topk(flat, min(self.max_det, flat.numel()))
+            keep = scores >= conf
+            scores, indices = scores[keep], indices[keep]
+            rows = (indices // heatmap.shape[1]).float()
+            cols = (indices % heatmap.shape[1]).float()
+            xyxy = torch.stack([cols * stride, rows * stride,
+                                (cols + 2) * stride, (rows + 2) * stride], dim=1) / scale
+            h, w = image.shape[:2]
+            xyxy[:, 0::2] = xyxy[:, 0::2].clamp(0, w)
+            xyxy[:, 1::2] = xyxy[:, 1::2].clamp(0, h)
+            boxes = Boxes(xyxy, scores, torch.zeros_like(scores))
+            results.append(Result(boxes, self.names, (h, w)))
+        return results
@@ -0,0 +1,152 @@
+"""
+Lightweight multi-object tracking for alert deduplication
+
+Detections from consecutive frames of the same source (camera, stream,
+upload channel) are linked into tracks by IoU, falling back to centroid
+distance for fast-moving or shrinking boxes. Association is computed on
+vectorized cost matrices and resolved greedily, lowest cost first. The
+app raises one alert per track and updates it while the track lives,
+instead of one alert per frame.
+
+Tracks live in process memory; each server or monitor process tracks the
+sources it sees, so a camera whose frames are spread over several gunicorn
+workers is tracked once per worker. The app keys trackers by (user id,
+source): accounts that use the same camera name never share tracks.
+"""
+
+import threading
+import time
+import uuid
+
+import numpy as np
+
+
+class Track:
+    """One object followed across frames"""
+
+    def __init__(self, detection, timestamp):
+        self.track_id = uuid.uuid4().hex[:16]
+        self.class_name = detection['class']
+        self.bbox = np.asarray(detection['bbox'], dtype=np.float32)
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.max_confidence = detection['confidence']
+        # Alert rows owned by this track, filled in by the caller
+        self.alert_id = None
+        self.high_confidence_alert_id = None
+
+    def update(self, detection, timestamp):
+        self.bbox = np.asarray(detection['bbox'], dtype=np.float32)
+        self.last_seen = timestamp
+        self.hits += 1
+        self.max_confidence = max(self.max_confidence, detection['confidence'])
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy arrays"""
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def centroid_distance_matrix(boxes_a, boxes_b):
+    """Pairwise centroid distance normalised by the larger box diagonal"""
+    centers_a = (boxes_a[:, :2] + boxes_a[:, 2:]) / 2
+    centers_b = (boxes_b[:, :2] + boxes_b[:, 2:]) / 2
+    distance = np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2)
+    diag_a = np.linalg.norm(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    diag_b = np.linalg.norm(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    scale = np.maximum(np.maximum(diag_a[:, None], diag_b[None, :]), 1e-9)
+    return distance / scale
+
+
+class IoUTracker:
+    """Tracks detections of a single source"""
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=0.5, max_age=5.0):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_age = max_age
+        self.tracks = []
+
+    def cost_matrix(self, detections):
+        """Association cost between live tracks (rows) and detections (columns)
+
+        Cost is 1 - IoU for overlapping pairs; pairs that only pass the
+        centroid gate cost 1 + normalised distance, so any overlap wins.
+        Pairs with different classes or outside both gates are infinite.
+        """
+        track_boxes = np.stack([track.bbox for track in self.tracks])
+        det_boxes = np.asarray([d['bbox'] for d in detections], dtype=np.float32)
+        iou = iou_matrix(track_boxes, det_boxes)
+        centroid = centroid_distance_matrix(track_boxes, det_boxes)
+
+        cost = np.where(iou >= self.iou_threshold, 1.0 - iou,
+                        np.where(centroid <= self.centroid_threshold, 1.0 + centroid, np.inf))
+        track_classes = np.asarray([track.class_name for track in self.tracks], dtype=object)
+        det_classes = np.asarray([d['class'] for d in detections], dtype=object)
+        cost[track_classes[:, None] != det_classes[None, :]] = np.inf
+        return cost
+
+    def update(self, detections, timestamp=None):
+        """Associate a frame's detections with tracks
+
+        Returns a list of (track, detection, is_new) in detection order.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self.tracks = [t for t in self.tracks if timestamp - t.last_seen <= self.max_age]
+
+        assigned = [None] * len(detections)
+        if self.tracks and detections:
+            cost = self.cost_matrix(detections)
+            # Greedy assignment, cheapest finite pair first
+            order = np.argsort(cost, axis=None)
+            used_tracks, used_dets = set(), set()
+            for flat_index in order:
+                track_index, det_index = np.unravel_index(flat_index, cost.shape)
+                if not np.isfinite(cost[track_index, det_index]):
+                    break
+                if track_index in used_tracks or det_index in used_dets:
+                    continue
+                used_tracks.add(track_index)
+                used_dets.add(det_index)
+                track = self.tracks[track_index]
+                track.update(detections[det_index], timestamp)
+                assigned[det_index] = (track, detections[det_index], False)
+
+        for index, detection in enumerate(detections):
+            if assigned[index] is None:
+                track = Track(detection, timestamp)
+                self.tracks.append(track)
+                assigned[index] = (track, detection, True)
+        return assigned
+
+
+class TrackerRegistry:
+    """One tracker per key, (user id, source) in the app; safe to share between request threads"""
+
+    def __init__(self, **tracker_options):
+        self.tracker_options = tracker_options
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, detections, timestamp=None):
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = IoUTracker(**self.tracker_options)
+            return tracker.update(detections, timestamp)
+
+    def active_tracks(self):
+        with self._lock:
+            return {key: len(tracker.tracks) for key, tracker in self._trackers.items()}
+
+
+TRACKERS = TrackerRegistry()
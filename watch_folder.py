@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion for camera frame drops
+
+Picks up image files written to a directory (for example a network share
+the cameras write to), runs them through batched inference and records
+Detection/Alert rows for a configured user, then moves each source file
+into an archive directory.
+
+New files are discovered with inotify through the optional `watchdog`
+package, with a periodic directory scan as fallback and safety net
+(network shares often do not deliver inotify events). A file is only
+processed once its size and mtime have been stable for --debounce
+seconds, so partially written frames are never read.
+
+The pipeline is scanner -> decode pool -> batched inference -> writer,
+connected by bounded queues. When inference falls behind the queues fill
+up and the scanner stops admitting files; they stay on disk and are picked
+up later, so memory stays bounded and nothing is lost.
+
+Each camera subdirectory is a source for the motion gate (motion.py):
+frames that barely differ from the last analysed frame of the same camera
+reuse its detections instead of taking a place in the model batch, and
+cameras with regions of interest (roi.py) only have those regions analysed.
+
+Usage:
+    python watch_folder.py --watch /mnt/cameras --archive /mnt/archive --user admin
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import dedup
+import motion
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+_STOP = object()
+
+
+class StableFileTracker:
+    """Tracks candidate files until their size and mtime stop changing"""
+
+    def __init__(self, debounce):
+        self.debounce = debounce
+        self._candidates = {}  # path -> (size, mtime, stable_since)
+        self._lock = threading.Lock()
+
+    def touch(self, path):
+        with self._lock:
+            self._candidates.setdefault(path, None)
+
+    def ready(self, exclude):
+        """Return candidate paths that have been stable long enough"""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, state in list(self._candidates.items()):
+                if path in exclude:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self._candidates[path]  # moved or deleted
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if state is None or state[:2] != signature:
+                    self._candidates[path] = signature + (now,)
+                elif stat.st_size > 0 and now - state[2] >= self.debounce:
+                    ready.append(path)
+        return ready
+
+    def forget(self, path):
+        with self._lock:
+            self._candidates.pop(path, None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._candidates)
+
+
+def is_inside(path, directory):
+    """Whether path is directory or lies below it"""
+    path, directory = os.path.realpath(path), os.path.realpath(directory)
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+def start_inotify(watch_dir, tracker, extensions, skip_dir=None):
+    """Feed create/modify/move events into the tracker; None if watchdog is unavailable"""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            path = getattr(event, 'dest_path', None) or event.src_path
+            if path.lower().endswith(extensions) and not (skip_dir and is_inside(path, skip_dir)):
+                tracker.touch(path)
+
+    observer = Observer()
+    observer.schedule(Handler(), watch_dir, recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+def scan_directory(watch_dir, tracker, extensions, skip_dir=None):
+    """Polling fallback: register every image file under watch_dir, except below skip_dir"""
+    for root, dirs, files in os.walk(watch_dir):
+        if skip_dir:
+            # An archive inside the watch folder must not be ingested again
+            dirs[:] = [name for name in dirs if not is_inside(os.path.join(root, name), skip_dir)]
+        for name in files:
+            if name.lower().endswith(extensions):
+                tracker.touch(os.path.join(root, name))
+
+
+class Ingestor:
+    """Bounded scanner -> decode -> batched inference -> writer pipeline"""
+
+    def __init__(self, wars, inference, user, args):
+        self.wars = wars
+        self.inference = inference
+        self.user_id = user.id
+        self.args = args
+        self.extensions = tuple(args.extensions)
+        self.tracker = StableFileTracker(args.debounce)
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+        # Bounded queues provide backpressure between stages
+        self.decoded = queue.Queue(maxsize=args.batch_size * 4)
+        self.to_write = queue.Queue(maxsize=4)
+        self.decode_pool = ThreadPoolExecutor(max_workers=args.workers)
+        self.decode_slots = threading.Semaphore(args.max_pending)
+        self.stop_event = threading.Event()
+        self.scanned = threading.Event()
+        self.processed = 0
+        self.failed = 0  # incremented by the decode, inference and writer threads
+        self.failed_lock = threading.Lock()
+        self.gated = 0
+        self.started = time.monotonic()
+
+    # Scanner -----------------------------------------------------------
+
+    def scan_loop(self):
+        next_scan = 0.0
+        while not self.stop_event.is_set():
+            if time.monotonic() >= next_scan:
+                scan_directory(self.args.watch, self.tracker, self.extensions, skip_dir=self.args.archive)
+                next_scan = time.monotonic() + self.args.poll_interval
+                self.scanned.set()
+
+            with self.in_flight_lock:
+                exclude = set(self.in_flight)
+            for path in sorted(self.tracker.ready(exclude)):
+                # Blocks when max_pending files are already in the pipeline
+                while not self.decode_slots.acquire(timeout=0.5):
+                    if self.stop_event.is_set():
+                        return
+                with self.in_flight_lock:
+                    self.in_flight.add(path)
+                self.decode_pool.submit(self.decode, path)
+            time.sleep(min(0.2, self.args.debounce / 2 or 0.2))
+
+    # Decode ------------------------------------------------------------
+
+    def decode(self, path):
+        # Keep the file's bytes: they are stored as the detection's original image
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        image = self.inference.decode_bytes(data) if data else None
+        if image is None:
+            print(f"⚠️ Unreadable image skipped: {path}")
+            self.count_failed(1)
+            self.finish(path, archive_subdir='failed')
+            return
+        self.decoded.put((path, data, image))
+
+    # Inference ---------------------------------------------------------
+
+    def inference_loop(self):
+        with self.wars.app.app_context():  # to follow model switches made by admins
+            self._inference_loop()
+
+    def _inference_loop(self):
+        while True:
+            batch = []
+            item = self.decoded.get()
+            if item is _STOP:
+                self.to_write.put(_STOP)
+                return
+            batch.append(item)
+            deadline = time.monotonic() + self.args.batch_timeout
+            while len(batch) < self.args.batch_size:
+                try:
+                    item = self.decoded.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.decoded.put(_STOP)
+                    break
+                batch.append(item)
+
+            paths = [path for path, _, _ in batch]
+            originals = [data for _, data, _ in batch]
+            images = [image for _, _, image in batch]
+            active = self.wait_for_model()
+            if active is None:
+                # Stopping without a model: leave the files in place for the next run
+                for path in paths:
+                    self.release(path)
+                continue
+            try:
+                detections = self.detect(images, [(self.source_of(path), active.version) for path in paths], active)
+                hashes = [dedup.dhash(image) for image in images]
+            except Exception as e:
+                print(f"❌ Inference failed for batch of {len(batch)}: {e}")
+                self.count_failed(len(batch))
+                for path in paths:
+                    self.finish(path, archive_subdir='failed')
+                continue
+            self.to_write.put((active.version, list(zip(paths, originals, hashes, detections))))
+
+    def wait_for_model(self):
+        """The active model version, waiting while none is loaded (startup, a model swap)
+
+        Returns None only if the ingestor is stopping and there is still no model.
+        """
+        delay = 1.0
+        while True:
+            try:
+                active = self.wars.active_model(self.inference)
+            except Exception as e:
+                self.wars.db.session.rollback()
+                print(f"⚠️ Could not get the active model: {e}")
+                active = None
+            if active is not None:
+                return active
+            if self.stop_event.is_set():
+                return None
+            print(f"⏳ No model loaded, retrying in {delay:.0f}s")
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, 30.0)
+
+    def detect(self, images, keys, active):
+        """Detections per image; frames the motion gate passes skip the model"""
+        gate = motion.MOTION_GATE
+        detections = [None] * len(images)
+        pending = []
+        for i, (image, key) in enumerate(zip(images, keys)):
+            detections[i], thumbnail = gate.check(key, image)
+            if detections[i] is None:
+                pending.append((i, thumbnail))
+        if pending:
+            found = self.wars.detect_frames(self.inference, active, [images[i] for i, _ in pending],
+                                            [(self.user_id, keys[i][0]) for i, _ in pending])
+            for (i, thumbnail), frame_detections in zip(pending, found):
+                detections[i] = frame_detections
+                gate.record(keys[i], thumbnail, frame_detections)
+        self.gated += len(images) - len(pending)
+        return detections
+
+    # Writer ------------------------------------------------------------
+
+    def write_loop(self):
+        wars = self.wars
+        with wars.app.app_context():
+            while True:
+                item = self.to_write.get()
+                if item is _STOP:
+                    return
+                model_version, batch = item
+                try:
+                    for path, data, image_hash, detections in batch:
+                        filename = wars.save_detection_image(data, os.path.splitext(path)[1].lower())
+                        wars.record_detection(self.user_id, filename, detections,
+                                              source=self.source_of(path), model_version=model_version,
+                                              image_is_original=True, image_hash=image_hash)
+                    wars.db.session.commit()  # one transaction per batch
+                except Exception as e:
+                    wars.db.session.rollback()
+                    print(f"❌ Failed to record batch of {len(batch)}: {e}")
+                    self.count_failed(len(batch))
+                    for path, *_ in batch:
+                        self.finish(path, archive_subdir='failed')
+                    continue
+                for path, *_ in batch:
+                    self.finish(path)
+                self.processed += len(batch)
+
+    # Bookkeeping -------------------------------------------------------
+
+    def source_of(self, path):
+        """Camera name for a file: its subdirectory under the watch folder"""
+        subdir = os.path.dirname(os.path.relpath(path, self.args.watch))
+        return subdir or os.path.basename(os.path.normpath(self.args.watch))
+
+    def finish(self, path, archive_subdir=None):
+        """Move a source file to the archive and release its pipeline slot"""
+        relative = os.path.relpath(path, self.args.watch)
+        target_dir = os.path.join(self.args.archive, archive_subdir or datetime.now().strftime('%Y-%m-%d'),
+                                  os.path.dirname(relative))
+        try:
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, os.path.basename(path))
+            if os.path.exists(target):
+                base, ext = os.path.splitext(target)
+                target = f"{base}_{int(time.time() * 1000)}{ext}"
+            shutil.move(path, target)
+        except OSError as e:
+            print(f"⚠️ Could not archive {path}: {e}")
+        self.release(path)
+
+    def release(self, path):
+        """Drop a file from the pipeline and free its slot"""
+        self.tracker.forget(path)
+        with self.in_flight_lock:
+            self.in_flight.discard(path)
+        self.decode_slots.release()
+
+    def count_failed(self, count):
+        with self.failed_lock:
+            self.failed += count
+
+    def report_loop(self):
+        while not self.stop_event.wait(self.args.report_interval):
+            elapsed = time.monotonic() - self.started
+            print(f"📊 processed={self.processed} failed={self.failed} gated={self.gated} "
+                  f"rate={self.processed / elapsed * 60:.0f}/min in_flight={len(self.in_flight)} "
+                  f"decoded_queue={self.decoded.qsize()}")
+
+    def run(self):
+        observer = start_inotify(self.args.watch, self.tracker, self.extensions, skip_dir=self.args.archive)
+        print(f"👀 Watching {self.args.watch} "
+              f"({'inotify + polling' if observer else 'polling'} every {self.args.poll_interval}s)")
+
+        threads = [threading.Thread(target=self.scan_loop, daemon=True),
+                   threading.Thread(target=self.inference_loop, daemon=True),
+                   threading.Thread(target=self.write_loop, daemon=True),
+                   threading.Thread(target=self.report_loop, daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self.stop_event.is_set():
+                if self.args.once and self.scanned.is_set() and not self.tracker.pending():
+                    break
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            print("\nStopping, finishing in-flight files...")
+        self.stop_event.set()
+        threads[0].join()
+        self.decode_pool.shutdown(wait=True)
+        self.decoded.put(_STOP)
+        threads[1].join()
+        threads[2].join()
+        if observer is not None:
+            observer.stop()
+        print(f"✅ Done: processed={self.processed} failed={self.failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest camera frames dropped into a directory')
+    parser.add_argument('--watch', required=True, help='Directory the cameras write frames to')
+    parser.add_argument('--archive', required=True, help='Directory processed frames are moved to')
+    parser.add_argument('--user', default='admin', help='Username the detections are recorded for')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--batch-timeout', type=float, default=0.05,
+                        help='Max seconds to wait to fill a batch')
+    parser.add_argument('--workers', type=int, default=4, help='Decode threads')
+    parser.add_argument('--max-pending', type=int, default=256,
+                        help='Max files admitted into the pipeline at once')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='Seconds a file must be unchanged before it is read')
+    parser.add_argument('--poll-interval', type=float, default=2.0)
+    parser.add_argument('--report-interval', type=float, default=30.0)
+    parser.add_argument('--extensions', nargs='+', default=list(IMAGE_EXTENSIONS))
+    parser.add_argument('--once', action='store_true',
+                        help='Exit when the directory has been drained')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.watch):
+        sys.exit(f"Watch directory not found: {args.watch}")
+    os.makedirs(args.archive, exist_ok=True)
+
+    import app as wars
+
+    wars.create_app()
+    inference = wars.get_inference()
+    if inference.model is None:
+        sys.exit("❌ Model could not be loaded")
+
+    with wars.app.app_context():
+        user = wars.User.query.filter_by(username=args.user).first()
+    if user is None:
+        sys.exit(f"❌ User not found: {args.user}")
+
+    Ingestor(wars, inference, user, args).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+weapon-detect: offline batch detection over archived frames
+
+Runs the model directly (no HTTP, no database) over a directory tree or a
+glob pattern, using the same model loading and postprocessing as the app
+(inference.py). Frames are decoded on a thread pool, run through batched
+inference, and their detections written as CSV or Parquet. Annotated
+images can optionally be written too; JPEG encoding happens on the same
+pool.
+
+Output is flushed in chunks. After each chunk a line is appended to a
+progress journal next to the output (<output>.progress) recording which
+frames are done and where the output ended. An interrupted run started
+again with the same arguments truncates anything written after the last
+journaled chunk and continues with the remaining frames, so no frame is
+reported twice or skipped.
+
+Every frame produces at least one row: one per detection, or a single row
+with num_detections=0 (or an error) so re-scans can tell "nothing found"
+from "not scanned".
+
+With --cascade, each batch is screened first with the same model at
+--screen-imgsz (or a smaller --screen-model checkpoint), and only frames
+with a box above --screen-conf go through the full model. Archives are
+mostly empty frames, so this usually cuts inference time the most.
+
+Usage:
+    python weapon_detect.py run /mnt/archive --output detections.csv
+    python weapon_detect.py run "/mnt/archive/2024-*/**/*.jpg" --output scan.parquet --annotated-dir annotated
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from watch_folder import IMAGE_EXTENSIONS
+
+COLUMNS = ('path', 'width', 'height', 'num_detections', 'detection_index', 'class',
+           'confidence', 'x1', 'y1', 'x2', 'y2', 'annotated_path', 'model_version', 'error')
+
+
+def find_images(target, extensions):
+    """Image files under a directory, or matching a glob pattern, sorted"""
+    if os.path.isdir(target):
+        paths = []
+        for root, dirs, files in os.walk(target):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in files
+                         if name.lower().endswith(extensions))
+    else:
+        paths = [path for path in glob.iglob(target, recursive=True)
+                 if os.path.isfile(path) and path.lower().endswith(extensions)]
+    return sorted(paths)
+
+
+def rows_for(path, image_shape, detections, model_version=None, error=None):
+    """Output rows for one frame: one per detection, at least one"""
+    height, width = image_shape[:2] if image_shape is not None else (None, None)
+    base = {'path': path, 'width': width, 'height': height, 'num_detections': len(detections),
+            'annotated_path': None, 'model_version': model_version, 'error': error}
+    if not detections:
+        return [dict(base, detection_index=None, **{'class': None, 'confidence': None,
+                                                    'x1': None, 'y1': None, 'x2': None, 'y2': None})]
+    rows = []
+    for index, detection in enumerate(detections):
+        x1, y1, x2, y2 = detection['bbox']
+        rows.append(dict(base, detection_index=index, confidence=round(detection['confidence'], 4),
+                         x1=x1, y1=y1, x2=x2, y2=y2, **{'class': detection['class']}))
+    return rows
+
+
+class CsvSink:
+    """Appends rows to a CSV file; the journal position is the byte offset"""
+
+    def __init__(self, path, resume_from=None):
+        self.path = path
+        exists = os.path.exists(path)
+        self.file = open(path, 'r+' if exists else 'w', newline='', encoding='utf-8')
+        if resume_from is not None:
+            self.file.seek(resume_from)
+            self.file.truncate()
+        elif exists:
+            self.file.truncate(0)
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'offset': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """Writes each chunk as a part file of a Parquet dataset directory"""
+
+    def __init__(self, path, committed_parts=()):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("❌ Parquet output requires pyarrow (pip install pyarrow), or write CSV instead")
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.schema = pa.schema([
+            ('path', pa.string()), ('width', pa.int32()), ('height', pa.int32()),
+            ('num_detections', pa.int32()), ('detection_index', pa.int32()), ('class', pa.string()),
+            ('confidence', pa.float32()), ('x1', pa.int32()), ('y1', pa.int32()),
+            ('x2', pa.int32()), ('y2', pa.int32()), ('annotated_path', pa.string()),
+            ('model_version', pa.string()), ('error', pa.string()),
+        ])
+        os.makedirs(path, exist_ok=True)
+        committed = set(committed_parts)
+        for name in os.listdir(path):
+            if name.endswith('.parquet') and name not in committed:
+                os.remove(os.path.join(path, name))  # written after the last journaled chunk
+        self.next_part = len(committed)
+
+    def write(self, rows):
+        name = f"part-{self.next_part:06d}.parquet"
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        tmp_path = os.path.join(self.path, name + '.tmp')
+        self.pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        self.next_part += 1
+        return {'part': name}
+
+    def close(self):
+        pass
+
+
+class ProgressJournal:
+    """Append-only record of completed chunks, used to resume"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.last = None
+        self.parts = []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn final line from a crash mid-write
+                    self.done.update(entry['paths'])
+                    self.last = entry
+                    if 'part' in entry:
+                        self.parts.append(entry['part'])
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def record(self, paths, position):
+        self.file.write(json.dumps(dict(position, paths=paths)) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.done.update(paths)
+
+    def close(self):
+        self.file.close()
+
+
+def output_format(args):
+    if args.format:
+        return args.format
+    return 'parquet' if args.output.lower().endswith(('.parquet', '.pq')) else 'csv'
+
+
+def load_model(args):
+    import inference
+
+    if args.standin:
+        from tiny_model import TinyDetector
+        inference.REGISTRY.register('standin', TinyDetector(), activate=True)
+    else:
+        if args.model:
+            inference.model_path = args.model
+        if not inference.load_model():
+            sys.exit("❌ Model could not be loaded")
+    if args.screen_model:
+        try:
+            args.screen = inference.load_checkpoint(args.screen_model)
+        except Exception as e:
+            sys.exit(f"❌ Screening model could not be loaded: {e}")
+    return inference, inference.REGISTRY.active()
+
+
+class BatchRunner:
+    """Decode pool -> batched inference -> chunked, journaled output"""
+
+    def __init__(self, inference, active, args, sink, journal):
+        self.inference = inference
+        self.active = active
+        self.args = args
+        self.sink = sink
+        self.journal = journal
+        self.pool = ThreadPoolExecutor(max_workers=args.workers)
+        self.pending_rows = []   # (path, [rows] or future of [rows]) in input order
+        self.processed = 0
+        self.detections = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def annotated_path(self, path):
+        relative = os.path.relpath(path, self.args.root) if self.args.root else os.path.basename(path)
+        if relative.startswith('..'):
+            relative = path.lstrip(os.sep)
+        base, _ = os.path.splitext(relative)
+        return os.path.join(self.args.annotated_dir, base + '.jpg')
+
+    def write_annotated(self, path, annotated_img, rows):
+        target = self.annotated_path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(self.inference.encode_jpeg(annotated_img))
+        for row in rows:
+            row['annotated_path'] = target
+        return rows
+
+    def run(self, paths):
+        # Keep a bounded window of decodes in flight ahead of inference
+        window = deque()
+        max_window = self.args.batch_size * (self.args.workers + 2)
+        paths = iter(paths)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(window) < max_window:
+                    path = next(paths, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    window.append((path, self.pool.submit(self.inference.read_image, path)))
+                if not window:
+                    break
+
+                batch = []
+                while window and len(batch) < self.args.batch_size:
+                    path, future = window.popleft()
+                    image = future.result()
+                    if image is None:
+                        self.failed += 1
+                        self.pending_rows.append((path, rows_for(path, None, [], error='unreadable')))
+                        continue
+                    batch.append((path, image))
+                if batch:
+                    self.infer(batch)
+                if len(self.pending_rows) >= self.args.flush_every:
+                    self.flush()
+                self.report()
+        finally:
+            # On interruption, keep whatever finished; the rest is redone on resume
+            for _, future in window:
+                future.cancel()
+            self.flush()
+            self.pool.shutdown(wait=True)
+            self.report(final=True)
+
+    def infer(self, batch):
+        images = [image for _, image in batch]
+        try:
+            if self.args.cascade:
+                results = self.inference.run_cascade_batch(images, model=self.active.model,
+                                                           screen_model=self.args.screen,
+                                                           screen_imgsz=self.args.screen_imgsz,
+                                                           screen_conf=self.args.screen_conf)
+            else:
+                results = self.inference.run_model_batch(images, model=self.active.model)
+        except Exception as e:
+            print(f"❌ Inference failed for batch of {len(batch)}: {e}")
+            self.failed += len(batch)
+            for path, image in batch:
+                self.pending_rows.append((path, rows_for(path, image.shape, [], error=str(e))))
+            return
+
+        for (path, image), result in zip(batch, results):
+            annotated_img, detections = self.inference.postprocess(result, image, model=self.active.model,
+                                                                   annotate=bool(self.args.annotated_dir))
+            self.detections += len(detections)
+            rows = rows_for(path, image.shape, detections, model_version=self.active.version)
+            if self.args.annotated_dir and (detections or self.args.annotate_all):
+                self.pending_rows.append((path, self.pool.submit(self.write_annotated,
+                                                                 path, annotated_img, rows)))
+            else:
+                self.pending_rows.append((path, rows))
+
+    def flush(self):
+        if not self.pending_rows:
+            return
+        chunk_paths, rows = [], []
+        for path, item in self.pending_rows:
+            chunk_paths.append(path)
+            rows.extend(item if isinstance(item, list) else item.result())
+        position = self.sink.write(rows)
+        self.journal.record(chunk_paths, position)
+        self.processed += len(chunk_paths)
+        self.pending_rows = []
+
+    def report(self, final=False):
+        now = time.monotonic()
+        if not final and now - self.last_report < self.args.report_interval:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        cascade = ''
+        if self.args.cascade:
+            import metrics
+            summary = metrics.cascade_summary()
+            if summary:
+                cascade = (f" escalated={summary['escalated']}/{summary['frames']}"
+                           f" screen={summary['screen_latency']} full={summary['full_latency']}")
+                if summary['saved_fraction'] is not None:
+                    cascade += f" saved={summary['saved_fraction']:.0%}"
+        print(f"{'✅ Done:' if final else '📊'} processed={self.processed} detections={self.detections} "
+              f"failed={self.failed} rate={rate:.1f} frames/s{cascade}")
+
+
+def run(args):
+    extensions = tuple(ext.lower() for ext in args.extensions)
+    args.root = args.target if os.path.isdir(args.target) else None
+    paths = find_images(args.target, extensions)
+    if not paths:
+        sys.exit(f"No images found for {args.target}")
+
+    fmt = output_format(args)
+    journal_path = args.output.rstrip(os.sep) + '.progress'
+    if args.restart and os.path.exists(journal_path):
+        os.remove(journal_path)
+    journal = ProgressJournal(journal_path)
+    if fmt == 'csv':
+        sink = CsvSink(args.output, resume_from=journal.last['offset'] if journal.last else None)
+    else:
+        sink = ParquetSink(args.output, committed_parts=journal.parts)
+
+    remaining = [path for path in paths if path not in journal.done]
+    if journal.done:
+        print(f"↩️ Resuming: {len(paths) - len(remaining)} of {len(paths)} frames already done")
+    if not remaining:
+        print("✅ Nothing left to do")
+        return
+
+    inference, active = load_model(args)
+    print(f"🔍 {len(remaining)} frames, model={active.version}, batch={args.batch_size}, "
+          f"workers={args.workers}, output={args.output} ({fmt})")
+
+    runner = BatchRunner(inference, active, args, sink, journal)
+    try:
+        runner.run(remaining)
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume")
+    finally:
+        sink.close()
+        journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='weapon-detect',
+                                     description='Offline weapon detection over image archives')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Detect weapons in a directory or glob of images')
+    run_parser.add_argument('target', help='Directory (scanned recursively) or glob pattern, e.g. "frames/**/*.jpg"')
+    run_parser.add_argument('--output', '-o', default='detections.csv',
+                            help='CSV file, or Parquet dataset directory (*.parquet)')
+    run_parser.add_argument('--format', choices=('csv', 'parquet'),
+                            help='Output format (default: from the --output extension)')
+    run_parser.add_argument('--annotated-dir', help='Also write annotated JPEGs under this directory')
+    run_parser.add_argument('--annotate-all', action='store_true',
+                            help='Write annotated images for frames without detections too')
+    run_parser.add_argument('--batch-size', type=int, default=16)
+    run_parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                            help='Decode/encode threads')
+    run_parser.add_argument('--flush-every', type=int, default=1000,
+                            help='Frames per output chunk (and resume granularity)')
+    run_parser.add_argument('--model', help='Checkpoint to load instead of the default')
+    run_parser.add_argument('--standin', action='store_true',
+                            help='Use the stand-in TinyDetector (for trying the pipeline without weights)')
+    run_parser.add_argument('--cascade', action='store_true',
+                            help='Screen frames cheaply and run the full model only on candidates')
+    run_parser.add_argument('--screen-imgsz', type=int, default=320, help='Input size of the screening pass')
+    run_parser.add_argument('--screen-conf', type=float, default=0.1,
+                            help='Confidence at which the screen sends a frame to the full model')
+    run_parser.add_argument('--screen-model', help='Smaller checkpoint to screen with (default: the main model)')
+    run_parser.add_argument('--restart', action='store_true',
+                            help='Ignore the progress journal and start over')
+    run_parser.add_argument('--report-interval', type=float, default=30.0)
+    run_parser.add_argument('--extensions', nargs='+', default=list(IMAGE_EXTENSIONS))
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        args.screen = None
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
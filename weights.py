@@ -0,0 +1,222 @@
+"""
+Memory-mapped model weights shared between worker processes
+
+torch.load() unpickles a checkpoint into private memory, so every worker
+process pays for its own copy of the weights and for reading them. This
+module stores a model as one file in the safetensors layout:
+
+    8-byte little-endian header length
+    JSON header: {name: {"dtype", "shape", "data_offsets"}, "__metadata__": {...}}
+    raw little-endian tensor data
+
+The model object itself (architecture, class names, settings) is pickled
+with every tensor replaced by a reference to its entry, and kept in the
+header metadata. Loading maps the file copy-on-write and builds each
+tensor directly on the mapped bytes, so there is no copy and no
+deserialisation of the weights: pages are read on first use and shared
+through the OS page cache by every process that maps the same file.
+Adding a worker adds almost no memory, and a worker is ready as soon as
+the skeleton is unpickled.
+
+Tensors are stored largest item size first after a 64-byte aligned
+header, so every tensor is naturally aligned. Tensors that are views of
+one another are stored separately. The skeleton is a pickle, so, like
+torch.load(), only load files you trust.
+
+Usage:
+    python weights.py convert improved_weapon_detection_10_epochs.pt
+    python weights.py info improved_weapon_detection_10_epochs.safetensors
+"""
+
+import argparse
+import base64
+import io
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+import torch
+import torch.nn as nn
+
+EXTENSION = '.safetensors'
+FORMAT = 'wars-mmap'
+ALIGN = 64
+
+DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8,
+    'U8': torch.uint8, 'BOOL': torch.bool,
+}
+DTYPE_NAMES = {dtype: name for name, dtype in DTYPES.items()}
+
+
+def mapped_path(path):
+    """The memory-mapped weights file that belongs to a checkpoint"""
+    return os.path.splitext(path)[0] + EXTENSION
+
+
+def is_current(mapped, source):
+    """Whether a mapped file exists and is at least as new as its source checkpoint"""
+    return os.path.exists(mapped) and (not os.path.exists(source)
+                                       or os.path.getmtime(mapped) >= os.path.getmtime(source))
+
+
+def _tensor_names(model):
+    """id(tensor) -> state-dict style name for the modules a model object holds"""
+    if isinstance(model, nn.Module):
+        modules = [('', model)]
+    else:
+        # Wrappers such as ultralytics YOLO or the stand-in keep their network in an attribute
+        modules = [(f'{key}.', value) for key, value in vars(model).items() if isinstance(value, nn.Module)]
+    names = {}
+    for prefix, module in modules:
+        for key, tensor in module.state_dict(keep_vars=True).items():
+            names.setdefault(id(tensor), prefix + key)
+    return names
+
+
+class _SkeletonPickler(pickle.Pickler):
+    """Pickles a model with each tensor replaced by a named reference"""
+
+    def __init__(self, file, names):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.names = names
+        self.tensors = {}  # name -> contiguous CPU tensor
+        self._seen = {}    # id(tensor) -> name, so shared tensors stay shared
+        self._keep = []    # originals, so their ids stay valid while pickling
+
+    def persistent_id(self, obj):
+        if not isinstance(obj, torch.Tensor):
+            return None
+        name = self._seen.get(id(obj))
+        if name is None:
+            if obj.dtype not in DTYPE_NAMES:
+                raise ValueError(f"Unsupported tensor dtype {obj.dtype}")
+            name = self.names.get(id(obj)) or f'tensor.{len(self.tensors)}'
+            while name in self.tensors:
+                name += '_'
+            self._seen[id(obj)] = name
+            self._keep.append(obj)
+            self.tensors[name] = obj.detach().cpu().contiguous()
+        return ('tensor', name, isinstance(obj, nn.Parameter), obj.requires_grad)
+
+
+def save(model, path):
+    """Write a model object as a memory-mappable weights file"""
+    skeleton = io.BytesIO()
+    pickler = _SkeletonPickler(skeleton, _tensor_names(model))
+    pickler.dump(model)
+
+    order = sorted(pickler.tensors, key=lambda name: -pickler.tensors[name].element_size())
+    header, offset = {}, 0
+    for name in order:
+        tensor = pickler.tensors[name]
+        size = tensor.numel() * tensor.element_size()
+        header[name] = {'dtype': DTYPE_NAMES[tensor.dtype], 'shape': list(tensor.shape),
+                        'data_offsets': [offset, offset + size]}
+        offset += size
+    header['__metadata__'] = {'format': FORMAT, 'torch': torch.__version__,
+                              'skeleton': base64.b64encode(skeleton.getvalue()).decode('ascii')}
+
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    encoded += b' ' * (-(8 + len(encoded)) % ALIGN)
+    # Write next to the target and swap it in, so processes mapping the old file keep it intact
+    partial = path + '.partial'
+    with open(partial, 'wb') as f:
+        f.write(struct.pack('<Q', len(encoded)))
+        f.write(encoded)
+        for name in order:
+            tensor = pickler.tensors[name]
+            if tensor.numel():
+                f.write(memoryview(tensor.reshape(-1).view(torch.uint8).numpy()))
+    os.replace(partial, path)
+    return offset
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        length, = struct.unpack('<Q', f.read(8))
+        return json.loads(f.read(length))
+
+
+def load(path):
+    """Map a weights file and rebuild its model on the mapped tensors"""
+    with open(path, 'rb') as f:
+        # Copy-on-write: pages are shared with other processes until someone writes to them
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    length, = struct.unpack('<Q', mapped[:8])
+    header = json.loads(mapped[8:8 + length])
+    metadata = header.pop('__metadata__', {})
+    if metadata.get('format') != FORMAT or 'skeleton' not in metadata:
+        raise ValueError(f"{path} holds tensors only, without a model to load them into")
+
+    base = 8 + length
+    tensors = {}
+    for name, entry in header.items():
+        dtype = DTYPES[entry['dtype']]
+        start, end = entry['data_offsets']
+        count = (end - start) // torch.empty(0, dtype=dtype).element_size()
+        if count:
+            tensors[name] = torch.frombuffer(mapped, dtype=dtype, count=count,
+                                             offset=base + start).reshape(entry['shape'])
+        else:
+            tensors[name] = torch.empty(entry['shape'], dtype=dtype)
+
+    parameters = {}
+
+    def persistent_load(pid):
+        _, name, is_parameter, requires_grad = pid
+        if not is_parameter:
+            return tensors[name]
+        if name not in parameters:
+            parameters[name] = nn.Parameter(tensors[name], requires_grad=requires_grad)
+        return parameters[name]
+
+    unpickler = pickle.Unpickler(io.BytesIO(base64.b64decode(metadata['skeleton'])))
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+
+def convert(source, target=None):
+    """Convert a torch checkpoint into a mapped weights file next to it"""
+    import inference
+
+    target = target or mapped_path(source)
+    model = inference.load_checkpoint(source, mapped=False)
+    if hasattr(model, 'fuse'):
+        # Store the fused layers that inference uses, or each process would fuse into private memory
+        model.fuse()
+    size = save(model, target)
+    return target, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory-mapped model weights')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='Convert a .pt checkpoint')
+    convert_parser.add_argument('checkpoint')
+    convert_parser.add_argument('--output', help=f'Target file (default: checkpoint name with {EXTENSION})')
+    info_parser = commands.add_parser('info', help='Show the tensors of a weights file')
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        target, size = convert(args.checkpoint, args.output)
+        print(f"✅ Wrote {target} ({size / 1e6:.1f} MB of weights)")
+        return
+
+    header = read_header(args.path)
+    metadata = header.pop('__metadata__', {})
+    total = sum(entry['data_offsets'][1] - entry['data_offsets'][0] for entry in header.values())
+    print(f"{args.path}: {len(header)} tensors, {total / 1e6:.1f} MB, format {metadata.get('format', 'plain')}")
+    for name, entry in header.items():
+        print(f"  {name:<60} {entry['dtype']:<5} {entry['shape']}")
+    if metadata.get('format') != FORMAT:
+        sys.exit("❌ No model skeleton; this file cannot be loaded by the app")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Compact wire format of the raw-body prediction API (/api/detect)
+
+Requests carry the frame as the whole body, with no multipart wrapping:
+
+- Content-Type image/jpeg or image/png: an encoded image.
+- Content-Type application/octet-stream: raw pixels, row-major, with
+  X-Frame-Shape: HEIGHT,WIDTH or HEIGHT,WIDTH,CHANNELS (1 or 3, BGR) and
+  X-Frame-Dtype: uint8 (default) or uint16, little-endian.
+
+Responses are columnar: one array per field instead of a dict per box.
+The Accept header picks the encoding:
+
+- application/octet-stream (default), a fixed layout, little-endian:
+
+      offset  type        field
+      0       4 bytes     magic b'WDR1'
+      4       uint32      N, number of detections
+      8       int64       detection id (-1 when nothing was stored)
+      16      int64       id of the detection this frame duplicates, or -1
+      24      uint16      flags: 1 motion-gated, 2 duplicate
+      26      uint16      degradation level
+      28      uint32      reserved
+      32      int32[N*4]  boxes x1, y1, x2, y2
+      32+16N  float32[N]  confidences
+      32+20N  uint16[N]   class ids into the X-Class-Names header
+
+  A NumPy client reads it with np.frombuffer at those offsets.
+- application/x-msgpack: a map with the same fields, the three arrays as
+  bin values in the same little-endian layout. Needs the optional msgpack
+  package on the server.
+- application/json: the same map with plain lists.
+
+The class names (percent-encoded, comma separated, in id order) and the
+model version are sent as X-Class-Names and X-Model-Version headers.
+"""
+
+import json
+import struct
+from urllib.parse import quote
+
+MAGIC = b'WDR1'
+HEADER = struct.Struct('<4sIqqHHI')
+MOTION_GATED, DUPLICATE = 1, 2
+
+RAW = 'application/octet-stream'
+MSGPACK = 'application/x-msgpack'
+JSON = 'application/json'
+IMAGE_TYPES = {'image/jpeg': '.jpg', 'image/png': '.png'}
+DTYPES = ('uint8', 'uint16')
+
+
+def parse_shape(value):
+    """(height, width[, channels]) from an X-Frame-Shape header; raises ValueError"""
+    try:
+        shape = tuple(int(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError('X-Frame-Shape must be HEIGHT,WIDTH or HEIGHT,WIDTH,CHANNELS')
+    if len(shape) not in (2, 3) or min(shape) <= 0 or (len(shape) == 3 and shape[2] not in (1, 3)):
+        raise ValueError('X-Frame-Shape must be HEIGHT,WIDTH or HEIGHT,WIDTH,CHANNELS with 1 or 3 channels')
+    return shape
+
+
+def parse_raw(body, shape, dtype='uint8'):
+    """Zero-copy array view of a raw pixel body; raises ValueError"""
+    import numpy as np
+
+    if dtype not in DTYPES:
+        raise ValueError(f"X-Frame-Dtype must be one of {', '.join(DTYPES)}")
+    dtype = np.dtype(dtype).newbyteorder('<')
+    expected = dtype.itemsize
+    for size in shape:
+        expected *= size
+    if len(body) != expected:
+        raise ValueError(f'Body has {len(body)} bytes, X-Frame-Shape and X-Frame-Dtype need {expected}')
+    return np.frombuffer(body, dtype=dtype).reshape(shape)
+
+
+def response_type(accept):
+    """Response encoding for an Accept header, or None if none can be produced"""
+    if not accept or accept == '*/*':
+        return RAW
+    for part in accept.split(','):
+        mimetype = part.split(';')[0].strip()
+        if mimetype in (RAW, '*/*'):
+            return RAW
+        if mimetype == MSGPACK:
+            try:
+                import msgpack  # noqa: F401
+            except ImportError:
+                continue
+            return MSGPACK
+        if mimetype in (JSON, 'application/*'):
+            return JSON
+    return None
+
+
+def class_table(names, detections):
+    """Class names in id order (model names first, then any others seen) and a name -> id map"""
+    if isinstance(names, dict):
+        classes = [names[key] for key in sorted(names)]
+    else:
+        classes = list(names or [])
+    ids = {name: index for index, name in enumerate(classes)}
+    for detection in detections:
+        if detection['class'] not in ids:
+            ids[detection['class']] = len(classes)
+            classes.append(detection['class'])
+    return classes, ids
+
+
+def class_header(classes):
+    """X-Class-Names value: each name percent-encoded, then comma separated"""
+    return ','.join(quote(name, safe='') for name in classes)
+
+
+def encode(detections, mimetype, ids, detection_id=None, duplicate_of=None, motion_gated=False, level=0):
+    """Response body for a frame's detections in the given encoding"""
+    count = len(detections)
+    boxes = [value for detection in detections for value in detection['bbox']]
+    confidences = [detection['confidence'] for detection in detections]
+    classes = [ids[detection['class']] for detection in detections]
+    flags = (MOTION_GATED if motion_gated else 0) | (DUPLICATE if duplicate_of is not None else 0)
+
+    if mimetype == RAW:
+        return b''.join((
+            HEADER.pack(MAGIC, count, -1 if detection_id is None else detection_id,
+                        -1 if duplicate_of is None else duplicate_of, flags, level, 0),
+            struct.pack(f'<{4 * count}i', *boxes),
+            struct.pack(f'<{count}f', *confidences),
+            struct.pack(f'<{count}H', *classes),
+        ))
+
+    fields = {'n': count, 'detection_id': detection_id, 'duplicate_of': duplicate_of,
+              'flags': flags, 'level': level}
+    if mimetype == MSGPACK:
+        import msgpack
+        fields.update(box=struct.pack(f'<{4 * count}i', *boxes), conf=struct.pack(f'<{count}f', *confidences),
+                      cls=struct.pack(f'<{count}H', *classes))
+        return msgpack.packb(fields)
+    fields.update(box=boxes, conf=confidences, cls=classes)
+    return json.dumps(fields, separators=(',', ':')).encode('utf-8')
+
+
+def decode(body):
+    """Parse a WDR1 response body (for clients and tests) into a dict of lists"""
+    magic, count, detection_id, duplicate_of, flags, level, _ = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError('Not a WDR1 response')
+    offset = HEADER.size
+    boxes = struct.unpack_from(f'<{4 * count}i', body, offset)
+    confidences = struct.unpack_from(f'<{count}f', body, offset + 16 * count)
+    classes = struct.unpack_from(f'<{count}H', body, offset + 20 * count)
+    return {'n': count, 'detection_id': None if detection_id < 0 else detection_id,
+            'duplicate_of': None if duplicate_of < 0 else duplicate_of, 'flags': flags, 'level': level,
+            'box': [list(boxes[i:i + 4]) for i in range(0, 4 * count, 4)],
+            'conf': list(confidences), 'cls': list(classes)}
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Statistics are not reset on startup here, unlike `python app.py`.
+"""
+
+from app import create_app
+
+app = create_app()